@@ -0,0 +1,216 @@
+"""
+Admission control for the write routes.
+
+Every game in play turns into blocking LLM work, so under a spike the
+excess is shed at the door instead of slowing every game down.  Load is
+judged from three signals:
+
+  * turns in flight – live turn claims in the DB (all worker processes,
+    re-read every ADMISSION_REFRESH seconds) or this process's running
+    turns if higher, plus turns waiting in this process's worker queue
+  * the LLM scheduler's queue depth (this process)
+  * p95 run_turn latency over the last ADMISSION_LATENCY_WINDOW seconds
+    (turns run by this process)
+
+Levels:
+  ok         everything is admitted
+  saturated  a signal is at its limit: new games get 429, and sends are
+             rate-limited per session (SEND_SESSION_RPM) and per game
+             (SEND_GAME_RPM)
+  spectator  a signal is at ADMISSION_SPECTATOR_FACTOR x its limit (or
+             ADMISSION_MODE=spectator): every write gets 429, reads such
+             as /poll keep working
+
+A degraded level is held for at least ADMISSION_HOLD seconds, so it does
+not flap.  With TURN_WORKER_MODE=external the web processes only see the
+DB claims; queue depth and latency live in the worker processes.
+"""
+import datetime
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+from config import (ADMISSION_MODE, ADMISSION_MAX_TURNS_IN_FLIGHT, ADMISSION_MAX_LLM_QUEUE,
+                    ADMISSION_MAX_TURN_P95, ADMISSION_SPECTATOR_FACTOR,
+                    ADMISSION_LATENCY_WINDOW, ADMISSION_MIN_SAMPLES, ADMISSION_REFRESH,
+                    ADMISSION_HOLD, ADMISSION_RETRY_AFTER, SEND_SESSION_RPM, SEND_GAME_RPM,
+                    ADMISSION_BUCKETS, TURN_CLAIM_TIMEOUT)
+from scheduler import TokenBucket, queue_stats
+import metrics
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("ok", "saturated", "spectator")
+
+
+@dataclass
+class Rejection:
+    reason: str          # "saturated", "spectator", "session_rate" or "game_rate"
+    retry_after: int     # seconds, for the Retry-After header
+    message: str
+
+
+class AdmissionController:
+    def __init__(self, mode: str = ADMISSION_MODE):
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._running = 0
+        self._latencies: deque = deque()   # (finished at, seconds)
+        self._claims = (0, -math.inf)      # (live DB claims, read at)
+        self._level = "ok"
+        self._hold_until = 0.0
+        self._session_buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._game_buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    # --- signals ---
+
+    def turn_started(self) -> None:
+        with self._lock:
+            self._running += 1
+
+    def turn_finished(self) -> None:
+        with self._lock:
+            self._running -= 1
+
+    def record_turn(self, seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._latencies.append((now, seconds))
+            self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        while self._latencies and self._latencies[0][0] < now - ADMISSION_LATENCY_WINDOW:
+            self._latencies.popleft()
+
+    def _p95(self, now: float):
+        with self._lock:
+            self._trim(now)
+            values = sorted(s for _, s in self._latencies)
+        if len(values) < max(1, ADMISSION_MIN_SAMPLES):
+            return None
+        return values[min(len(values) - 1, int(0.95 * len(values)))]
+
+    def _db_claims(self, now: float) -> int:
+        """Live turn claims across all processes; needs an app context."""
+        claims, stamp = self._claims
+        if now - stamp < ADMISSION_REFRESH:
+            return claims
+        from db import db
+        from models import Game
+        stale = datetime.datetime.utcnow() - datetime.timedelta(seconds=TURN_CLAIM_TIMEOUT)
+        try:
+            claims = (db.session.query(Game.id)
+                      .filter(Game.claimed_at.isnot(None), Game.claimed_at >= stale)
+                      .count())
+        except Exception as e:   # a busy DB is no reason to fail the request
+            db.session.rollback()
+            logger.warning(f"[admission] Could not count turn claims: {e}")
+        self._claims = (claims, now)
+        return claims
+
+    def load(self) -> dict:
+        from worker import queue_depth
+        now = time.monotonic()
+        with self._lock:
+            running = self._running
+        return {
+            "turns_in_flight": max(running, self._db_claims(now)) + queue_depth(),
+            "llm_queue": queue_stats()["queued"],
+            "turn_p95_s": self._p95(now),
+        }
+
+    def level(self) -> str:
+        if self.mode == "off":
+            return "ok"
+        if self.mode == "spectator":
+            return "spectator"
+        load = self.load()
+        # fraction of each limit in use; limits of 0 are off
+        usage = [load[k] / limit for k, limit in (
+            ("turns_in_flight", ADMISSION_MAX_TURNS_IN_FLIGHT),
+            ("llm_queue", ADMISSION_MAX_LLM_QUEUE),
+            ("turn_p95_s", ADMISSION_MAX_TURN_P95)) if limit > 0 and load[k] is not None]
+        peak = max(usage, default=0.0)
+        level = ("spectator" if peak >= ADMISSION_SPECTATOR_FACTOR else
+                 "saturated" if peak >= 1 else "ok")
+
+        now = time.monotonic()
+        with self._lock:
+            if LEVELS.index(level) >= LEVELS.index(self._level):
+                if level != "ok":
+                    self._hold_until = now + ADMISSION_HOLD
+            elif now < self._hold_until:
+                level = self._level
+            if level != self._level:
+                logger.warning(f"[admission] {self._level} -> {level}: {load}")
+            self._level = level
+        return level
+
+    def retry_after(self) -> int:
+        p95 = self._p95(time.monotonic())
+        return max(ADMISSION_RETRY_AFTER, math.ceil(p95 or 0))
+
+    # --- decisions ---
+
+    def _reject(self, route: str, reason: str, retry_after: int, message: str) -> Rejection:
+        metrics.admission_rejections.inc(route=route, reason=reason)
+        return Rejection(reason, retry_after, message)
+
+    def admit_game(self, route: str = "start"):
+        """None if a new game may start, else a Rejection."""
+        level = self.level()
+        if level == "ok":
+            return None
+        retry = self.retry_after()
+        return self._reject(route, level, retry, "The server is busy, no new games "
+                                                 f"right now. Try again in {retry} seconds.")
+
+    def admit_send(self, session_key: str, game_id: str):
+        """None if the message may be sent, else a Rejection.  Rate limits
+        only apply while saturated."""
+        level = self.level()
+        if level == "ok":
+            return None
+        if level == "spectator":
+            return self._reject("send", level, self.retry_after(),
+                                "The server is overloaded and in spectator mode: "
+                                "messages are paused, the game is kept as it is.")
+        now = time.monotonic()
+        with self._lock:
+            checks = (("session_rate", self._bucket(self._session_buckets, session_key,
+                                                    SEND_SESSION_RPM)),
+                      ("game_rate", self._bucket(self._game_buckets, game_id, SEND_GAME_RPM)))
+            for reason, bucket in checks:
+                wait = bucket.delay(1, now)
+                if wait > 0:
+                    break
+            else:
+                for _, bucket in checks:
+                    bucket.take(1)
+                return None
+        retry = max(1, math.ceil(wait))
+        return self._reject("send", reason, retry,
+                            f"The server is busy, slow down: try again in {retry} seconds.")
+
+    def _bucket(self, buckets: OrderedDict, key: str, rpm: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rpm)
+            while len(buckets) > ADMISSION_BUCKETS:
+                buckets.popitem(last=False)
+        buckets.move_to_end(key)
+        return bucket
+
+    def stats(self) -> dict:
+        level = self.level()
+        load = self.load()
+        return {"level": LEVELS.index(level),
+                "turns_in_flight": load["turns_in_flight"],
+                "llm_queue": load["llm_queue"],
+                "turn_p95_s": load["turn_p95_s"] or 0.0}
+
+
+admission = AdmissionController()
@@ -1,13 +1,45 @@
 import re
-import openai
-from config import OPENAI_API_KEY
+import json
+import math
+from collections import Counter
+from config import MAX_NOTE_LENGTH, LLM_SCHEDULER, GUESS_SAMPLES, GUESS_AGREEMENT
+from llm_cache import cached_call, request_key
+from llm_backends import get_backend
+from scheduler import get_scheduler, estimate_tokens
 import time
-import random
+import threading
+import contextvars
+from contextlib import contextmanager
 
-if OPENAI_API_KEY:
-    openai.api_key = OPENAI_API_KEY
-else:
-    print("⚠️  OPENAI_API_KEY not set – using offline dummy responses.")
+import metrics
+
+# context-local so totals follow calls into agent and scheduler threads; a
+# tuple so nested track_usage() blocks all see the calls
+_usage = contextvars.ContextVar("llm_usage", default=())
+_usage_lock = threading.Lock()
+# agent name for metric labels; set by logic.run_agent_pipeline
+current_agent = contextvars.ContextVar("current_agent", default="")
+
+
+@contextmanager
+def track_usage():
+    """Collect call/token counts for LLM calls made in this context."""
+    totals = {"calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0,
+              "completion_tokens": 0}
+    token = _usage.set(_usage.get() + (totals,))
+    try:
+        yield totals
+    finally:
+        _usage.reset(token)
+
+
+def _record_usage(completion) -> None:
+    with _usage_lock:
+        for totals in _usage.get():
+            totals["calls"] += 1
+            totals["prompt_tokens"] += completion.prompt_tokens
+            totals["cached_prompt_tokens"] += completion.cached_tokens
+            totals["completion_tokens"] += completion.completion_tokens
 
 
 # def _ai_chat(model: str, system_prompt: str, history: list[dict[str, str]]) -> str:
@@ -25,27 +57,75 @@ else:
 #     return rsp.choices[0].message.content
 
 
-def update_agent_note(model: str, system_prompt: str, history: list[dict[str, str]]) -> str:
-    rsp = openai.chat.completions.create(
-        model=model,
-        messages=[{"role": "system", "content": system_prompt}] + history,
-        max_tokens=150,
-        temperature=0.7,
-    )
-    return rsp.choices[0].message.content.strip()
+def _chat_samples(model: str, messages: list[dict[str, str]], max_tokens: int,
+                  temperature: float, cache: bool = True, n: int = 1,
+                  stop_when=None, accept=None, **extra) -> list[str]:
+    """
+    Single entry point for chat completions: response cache first, then the
+    process-wide scheduler (rate limits, concurrency cap, priority).
+    Returns `n` samples from one request; `stop_when(texts)` lets the
+    backend stop sampling once the finished ones are enough, and only
+    responses passing `accept(text)` are cached.
+    """
+    def request():
+        agent = current_agent.get()
+        t0 = time.perf_counter()
+        try:
+            completion = get_backend().complete(
+                model,
+                messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                n=n,
+                stop_when=stop_when,
+                **extra,
+            )
+        except Exception as e:
+            metrics.llm_errors.inc(agent=agent, model=model, error=type(e).__name__)
+            raise
+        metrics.llm_request_seconds.observe(time.perf_counter() - t0,
+                                            agent=agent, model=model)
+        metrics.llm_prompt_tokens.inc(completion.prompt_tokens, agent=agent, model=model)
+        metrics.llm_cached_prompt_tokens.inc(completion.cached_tokens, agent=agent, model=model)
+        metrics.llm_completion_tokens.inc(completion.completion_tokens,
+                                          agent=agent, model=model)
+        _record_usage(completion)
+        return completion
 
+    # single samples are cached as plain text, so existing caches stay valid
+    params = dict(max_tokens=max_tokens, temperature=temperature, **extra)
+    if n != 1:
+        params["n"] = n
 
-def generate_agent_reply(model: str, reply_prompt: str, history: list[dict[str, str]]) -> str:
-    if not OPENAI_API_KEY:
-        exit(21)
+    def call() -> str:
+        if not LLM_SCHEDULER:
+            completion = request()
+        else:
+            # only cacheable requests may share a call: the others want fresh samples
+            key = request_key(model, messages, **params) if cache else None
+            completion = get_scheduler().submit(
+                model, request, estimate_tokens(messages, max_tokens, n), key=key)
+        return completion.text if n == 1 else json.dumps(completion.texts)
 
-    rsp = openai.chat.completions.create(
-        model=model,
-        messages=[{"role": "system", "content": reply_prompt}] + history,
-        max_tokens=150,
-        temperature=0.7,
-    )
-    return rsp.choices[0].message.content.strip()
+    raw = cached_call(model, messages, call, use_cache=cache, accept=accept, **params)
+    return [raw] if n == 1 else json.loads(raw)
+
+
+def _chat(model: str, messages: list[dict[str, str]], max_tokens: int,
+          temperature: float, cache: bool = True, **extra) -> str:
+    return _chat_samples(model, messages, max_tokens, temperature, cache, **extra)[0]
+
+
+def update_agent_note(model: str, system_prompt: str, history: list[dict[str, str]],
+                      cache: bool = True) -> str:
+    return _chat(model, [{"role": "system", "content": system_prompt}] + history,
+                 max_tokens=150, temperature=0.7, cache=cache).strip()
+
+
+def generate_agent_reply(model: str, reply_prompt: str, history: list[dict[str, str]],
+                         cache: bool = True) -> str:
+    return _chat(model, [{"role": "system", "content": reply_prompt}] + history,
+                 max_tokens=150, temperature=0.7, cache=cache).strip()
 
 
 # def generate_guess(model: str, guessing_prompt: str) -> str:
@@ -64,21 +144,98 @@ def generate_agent_reply(model: str, reply_prompt: str, history: list[dict[str,
 #     return rsp.choices[0].message.content.strip().lower()
 
 
-def generate_guess(model: str, guessing_prompt: str, attempts: int = 5) -> str:
+def normalize_guess(text: str) -> str:
+    """First word of a sampled answer, lowercased ("" if there is none)."""
+    m = re.search(r"[A-Za-z]+", text or "")
+    return m.group(0).lower() if m else ""
+
+
+def tally_votes(samples: list[str]) -> dict[str, int]:
+    """Normalized guess -> votes, most common first (ties: first seen)."""
+    votes = Counter(g for g in map(normalize_guess, samples) if g)
+    return dict(votes.most_common())
+
+
+def generate_guess_votes(model: str, guessing_prompt: str,
+                         attempts: int = GUESS_SAMPLES,
+                         agreement: float = GUESS_AGREEMENT,
+                         cache: bool = True,
+                         history: list[dict[str, str]] = ()) -> tuple[str, dict[str, int]]:
     """
-    Perform soft beam search by sampling multiple guesses and selecting most common.
+    Self-consistency guess: `attempts` samples from a single request, each
+    normalized to one lowercase word, majority vote.  Sampling stops early
+    once the leading word has `agreement` of the attempts.  `history` (e.g.
+    the note, see context.build_context) follows the prompt.
+    Returns (guess, {word: votes}).
     """
-    if not OPENAI_API_KEY:
-        exit(21)
+    needed = max(1, math.ceil(agreement * attempts))
 
-    rsp = openai.chat.completions.create(
-        model=model,
-        messages=[
+    def agreed(texts: list[str]) -> bool:
+        votes = tally_votes(texts)
+        return bool(votes) and next(iter(votes.values())) >= needed
+
+    samples = _chat_samples(
+        model,
+        [
             {"role": "system", "content": "Output only your single word guess."},
             {"role": "user", "content": guessing_prompt}
-        ],
+        ] + list(history),
         max_tokens=5,
         temperature=0.5,  # lower temp = more consistent guesses
+        cache=cache,
+        n=attempts,
+        stop_when=agreed if attempts > 1 else None,
     )
-    guess = rsp.choices[0].message.content.strip().lower()
-    return guess
+    votes = tally_votes(samples)
+    return (next(iter(votes)) if votes else ""), votes
+
+
+def generate_guess(model: str, guessing_prompt: str, attempts: int = GUESS_SAMPLES,
+                   cache: bool = True) -> str:
+    """
+    Perform soft beam search by sampling multiple guesses and selecting most common.
+    """
+    return generate_guess_votes(model, guessing_prompt, attempts, cache=cache)[0]
+
+
+def generate_note_and_guess(model: str, fused_prompt: str, history: list[dict[str, str]],
+                            max_note_len: int = MAX_NOTE_LENGTH,
+                            cache: bool = True) -> tuple[str, str]:
+    """
+    Fused agent step: one JSON-mode completion returning {"note", "guess"}.
+    Raises ValueError on malformed output so the caller can fall back to
+    update_agent_note + generate_guess.
+    """
+    def parses(text: str) -> bool:
+        try:
+            parse_fused_output(text, max_note_len)
+        except ValueError:
+            return False
+        return True
+
+    raw = _chat(
+        model,
+        [{"role": "system", "content": fused_prompt}] + history,
+        max_tokens=200,
+        temperature=0.7,
+        cache=cache,
+        accept=parses,   # never replay a malformed answer
+        response_format={"type": "json_object"},
+    )
+    return parse_fused_output(raw, max_note_len)
+
+
+def parse_fused_output(raw: str, max_note_len: int = MAX_NOTE_LENGTH) -> tuple[str, str]:
+    try:
+        data = json.loads(raw or "")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"fused output is not JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise ValueError("fused output is not a JSON object")
+
+    note, guess = data.get("note"), data.get("guess")
+    if not isinstance(note, str) or not note.strip():
+        raise ValueError("fused output has no note")
+    if not isinstance(guess, str) or not re.fullmatch(r"[A-Za-z]+", guess.strip()):
+        raise ValueError(f"fused output guess is not a single word: {guess!r}")
+    return note.strip()[:max_note_len], guess.strip().lower()
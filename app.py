@@ -1,26 +1,91 @@
-from config import DB_PATH, SECRET_KEY
+from config import (DB_PATH, ARCHIVE_DB_PATH, COMPACTOR_ENABLED, SECRET_KEY, TURN_WORKER_MODE, CROSS_PROCESS, SSE_HEARTBEAT, REPLAY_STREAM_BATCH,
+                    PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, ADMIN_TOKEN)
 from db import db
-from models import Game, Msg, GameStatus, Replay
+from migrations import init_db
+from models import Game, Msg, GameStatus, Replay, ArchivedGame, ArchivedReplay
 from logic import run_turn
-from utils import is_valid_word, GUESS_RE
+from worker import enqueue_turn, start_workers
+from llm_backends import get_backend
+from compactor import start_compactor
+from changefeed import start_change_feed
+from admission import admission
+from versions import game_versions, read_version
+from gamecache import game_cache, get_game_or_404
+from events import broker, game_update, publish_update, publish_joined, format_sse
+from profiling import ProfilingMiddleware, recent_profiles, get_profile
+from utils import is_valid_word, GUESS_RE, pick_encoding, compress_chunks
 import secrets
-from flask import Flask,  session, abort, Response, render_template, request, redirect, url_for, abort, jsonify
+from flask import Flask, Blueprint, current_app, session, abort, Response, render_template, request, redirect, url_for, abort, jsonify, stream_with_context
 import os
 import uuid
 from functools import wraps
+from sqlalchemy import func, update
 from flask_wtf.csrf import CSRFProtect
 import json
+import queue
+import time
+import re
+import metrics
+import llm_cache
+import scheduler
 
 from types import SimpleNamespace
-
-app = Flask(__name__)
-app.config.update(SQLALCHEMY_DATABASE_URI=DB_PATH,
-                  SQLALCHEMY_TRACK_MODIFICATIONS=False,
-                  WTF_CSRF_TIME_LIMIT=None)
-
-app.config["SECRET_KEY"] = SECRET_KEY
-CSRFProtect(app)
-db.init_app(app)
+from dataclasses import replace
+
+bp = Blueprint("main", __name__)
+
+
+def create_app(config: dict = None) -> Flask:
+    """
+    Application factory.  `config` overrides the settings from config.py;
+    BACKGROUND_THREADS=False keeps turn workers, the compactor and the
+    change feed from starting (CLIs, benchmarks).  Nothing here touches the
+    database: create or upgrade the schema with `flask --app app init-db`.
+    """
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=DB_PATH,
+                      SQLALCHEMY_BINDS={"archive": ARCHIVE_DB_PATH},
+                      SQLALCHEMY_TRACK_MODIFICATIONS=False,
+                      WTF_CSRF_TIME_LIMIT=None,
+                      SECRET_KEY=SECRET_KEY,
+                      TURN_WORKER_MODE=TURN_WORKER_MODE,
+                      COMPACTOR_ENABLED=COMPACTOR_ENABLED,
+                      BACKGROUND_THREADS=True)
+    app.config.update(config or {})
+
+    CSRFProtect(app)
+    db.init_app(app)
+    app.register_blueprint(bp)
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create missing tables and apply schema migrations."""
+        init_db()
+
+    if PROFILE_SAMPLE_RATE > 0 or PROFILE_SLOW_MS > 0:
+        app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
+
+    if app.config["BACKGROUND_THREADS"]:
+        if CROSS_PROCESS:
+            start_change_feed(app)
+        if app.config["TURN_WORKER_MODE"] == "thread":
+            get_backend()   # a missing API key fails here, not on the first turn
+            start_workers(app)
+        if app.config["COMPACTOR_ENABLED"]:
+            start_compactor(app)
+    return app
+
+
+def require_admin(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            abort(404)
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not secrets.compare_digest(token, ADMIN_TOKEN):
+            abort(403, "Admin token required")
+        return func(*args, **kwargs)
+    return wrapper
 
 
 def require_player_auth(func):
@@ -34,17 +99,22 @@ def require_player_auth(func):
     return wrapper
 
 
-with app.app_context():
-    db.create_all()
-
-
-@app.get("/")
+@bp.get("/")
 def index():
     return render_template("index.html", error=None)
 
 
-@app.post("/start")
+def too_busy(body, rejection):
+    """429 with Retry-After for a request admission control turned away."""
+    return body, 429, {"Retry-After": str(rejection.retry_after)}
+
+
+@bp.post("/start")
 def start():
+    rejected = admission.admit_game()
+    if rejected:
+        return too_busy(render_template("index.html", error=rejected.message), rejected)
+
     player1_secret = request.form.get("secret", "").strip()
     if not is_valid_word(player1_secret):
         return render_template("index.html", error="Not a valid English word.")
@@ -53,16 +123,17 @@ def start():
     game = Game(id=game_id, player1_secret=player1_secret.lower(), spy_note="")
     db.session.add(game)
     db.session.commit()
+    game_cache.put(game)
     session['player_token'] = secrets.token_hex(16)
     session['player_role'] = 'player1'
     session['game_id'] = game_id
-    player2_url = url_for('start_player2', game_id=game.id, _external=True)
+    player2_url = url_for('.start_player2', game_id=game.id, _external=True)
     return render_template("index.html", game_id=game.id, player2_url=player2_url)
 
 
-@app.get("/start_player2/<game_id>")
+@bp.get("/start_player2/<game_id>")
 def start_player2(game_id):
-    game = Game.query.get_or_404(game_id)
+    game = get_game_or_404(game_id)
 
     if not game.player1_secret:  # Ensure Player 1 has entered their word
         return render_template("index.html", error="Player 1 has not yet started the game.")
@@ -73,28 +144,55 @@ def start_player2(game_id):
     return render_template("join_game.html", game_id=game.id)
 
 
-@app.post("/start_player2/<game_id>")
+@bp.post("/start_player2/<game_id>")
 def join_game(game_id):
+    rejected = admission.admit_game(route="join")
+    if rejected:
+        return too_busy(render_template("join_game.html", game_id=game_id,
+                                        error=rejected.message), rejected)
+
     player2_secret = request.form.get("player2_secret", "").strip()
     if not is_valid_word(player2_secret):
         return render_template("join_game.html", error="Secret word must be valid.")
 
-    game = Game.query.get_or_404(game_id)
-    game.player2_secret = player2_secret.lower()  # Store Player 2's word
-    game.status = GameStatus.PLAY
+    game = get_game_or_404(game_id)
+    # Store Player 2's word, unless someone joined since the page was served
+    joined = replace(game, player2_secret=player2_secret.lower(), status=GameStatus.PLAY)
+    stored = db.session.execute(
+        update(Game)
+        .where(Game.id == game_id, Game.player2_secret == "")
+        .values(player2_secret=joined.player2_secret, status=joined.status))
     db.session.commit()
+    if stored.rowcount != 1:
+        game_cache.invalidate(game_id)
+        return render_template("index.html", error="Player 2 has already entered their secret word.")
+    game = joined
 
     session['player_token'] = secrets.token_hex(16)
     session['player_role'] = 'player2'
     session['game_id'] = game_id
 
-    return redirect(url_for("game", game_id=game.id))
+    publish_joined(game)
+    publish_update(game)
+    return redirect(url_for(".game", game_id=game.id))
 
 
-@app.get("/poll/<game_id>")
+@bp.get("/poll/<game_id>")
 def poll(game_id):
-    game = Game.query.get_or_404(game_id)
-    after_id = int(request.args.get("after_id", 0))
+    after_id = request.args.get("after_id", 0, type=int)
+    # Idle fast path: nothing new since the client's version -> 304 from the
+    # version cache, no query
+    version = game_versions.not_modified(game_id, after_id,
+                                         request.headers.get("If-None-Match"),
+                                         request.args.get("status"))
+    if version:
+        metrics.poll_requests.inc(result="not_modified")
+        rsp = Response(status=304)
+        rsp.set_etag(version.etag)
+        return rsp
+
+    token = game_versions.begin_read()
+    game = get_game_or_404(game_id)
     new_msgs = Msg.query.filter(
         Msg.game_id == game_id,
         Msg.id > after_id
@@ -106,36 +204,115 @@ def poll(game_id):
     #         correct_by = "player1"
     #     elif game.p2_guessed and not game.p1_guessed:
     #         correct_by = "player2"
-    response = {
-        "messages": [{
-            "id":     m.id,
-            "role":   m.role,
-            "sender": m.sender,
-            "text":   m.text,
-            # 1-liner: show player guess only when it’s right
-            "guess": (
-                m.guess if m.role != "Player" else
-                m.guess if (
-                    (m.sender == "player1" and m.guess == game.player2_secret) or
-                    (m.sender == "player2" and m.guess == game.player1_secret)
-                ) else ""
-            )
-        } for m in new_msgs],
-        "status": game.status.value,
-        "turns":  game.turns,
-    }
-
-    # Add secrets only if game is won
-    if game.status == GameStatus.WIN:
-        response["player1_secret"] = game.player1_secret
-        response["player2_secret"] = game.player2_secret
-
-    return jsonify(response)
-
-
-@app.get("/g/<game_id>")
+    response = game_update(game, new_msgs)
+    metrics.poll_requests.inc(result="messages" if new_msgs else "empty")
+
+    if new_msgs:
+        last_id = new_msgs[-1].id
+    else:
+        last_id = (db.session.query(func.max(Msg.id))
+                   .filter(Msg.game_id == game_id).scalar() or 0)
+    version = game_versions.prime(token, game_id, last_id, response["status"],
+                                  response["turns"])
+
+    rsp = jsonify(response)
+    rsp.set_etag(version.etag)
+    return rsp
+
+
+@bp.get("/g/<game_id>/events")
+def events(game_id):
+    """
+    SSE stream of `update` events (same payload as /poll) plus a `joined`
+    event once player 2 is in.  Ends after the game finishes.
+
+    Events published by this process arrive right away.  Writes by other
+    processes arrive as a `changed` event from the change feed
+    (CROSS_PROCESS), and the stream then sends whatever changed in the DB.
+    """
+    game = get_game_or_404(game_id)
+    after_id = request.headers.get("Last-Event-ID") or request.args.get("after_id", 0)
+    try:
+        after_id = int(after_id)
+    except ValueError:
+        after_id = 0
+
+    # Subscribe before reading the backlog so nothing falls in between;
+    # the client drops duplicate message ids.
+    sub = broker.subscribe(game_id)
+    backlog = Msg.query.filter(
+        Msg.game_id == game_id,
+        Msg.id > after_id
+    ).order_by(Msg.id.asc()).all()
+    initial = game_update(game, backlog)
+    joined = bool(game.player2_secret)
+    finished = game.status in {GameStatus.WIN, GameStatus.LOSE}
+    db.session.rollback()   # don't sit on a connection while idle
+
+    def reconcile(seen):
+        """Update for anything written to the DB since `seen`
+        (last id, status, turns), or None."""
+        current = read_version(game_id)
+        if current is None or current == seen:
+            db.session.rollback()
+            return None
+        fresh = db.session.get(Game, game_id)
+        msgs = Msg.query.filter(Msg.game_id == game_id,
+                                Msg.id > seen[0]).order_by(Msg.id.asc()).all()
+        update = game_update(fresh, msgs)
+        update["joined"] = bool(fresh.player2_secret)
+        db.session.rollback()
+        return update
+
+    def stream():
+        nonlocal joined
+        try:
+            last_id = max([after_id] + [m["id"] for m in initial["messages"]])
+            seen = (last_id, initial["status"], initial["turns"])
+            yield format_sse("update", initial, last_id)
+            if joined:
+                yield format_sse("joined", {"joined": True})
+            if finished:
+                return
+            while True:
+                try:
+                    event, data = sub.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if event == "changed":
+                    data = reconcile(seen)
+                    if data is None:
+                        continue
+                    event = "update"
+                    if data.pop("joined") and not joined:
+                        joined = True
+                        yield format_sse("joined", {"joined": True})
+                if event == "update":
+                    last_id = max([last_id] + [m["id"] for m in data["messages"]])
+                    seen = (last_id, data["status"], data["turns"])
+                    yield format_sse(event, data, last_id)
+                    if data["status"] in {"WIN", "LOSE"}:
+                        return
+                else:
+                    joined = True
+                    yield format_sse(event, data)
+        finally:
+            broker.unsubscribe(game_id, sub)
+
+    return Response(stream_with_context(stream()),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache",
+                             "X-Accel-Buffering": "no"})
+
+
+@bp.get("/g/<game_id>")
 def game(game_id):
-    game = Game.query.get_or_404(game_id)
+    return render_game(game_id)
+
+
+def render_game(game_id, error=None):
+    game = get_game_or_404(game_id)
 
     # sanitize: strip all guesses
     raw = (Msg.query
@@ -158,55 +335,158 @@ def game(game_id):
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         return render_template("chat_list.html", msgs=msgs)
 
+    if error is None and game.status in {GameStatus.PLAY, GameStatus.PARTIAL} \
+            and admission.level() == "spectator":
+        error = "The server is overloaded: spectator mode, messages are paused."
     return render_template("game.html",
                            game=game,
                            msgs=msgs,
-                           max_turns=30)
+                           max_turns=30,
+                           error=error)
+
+
+REPLAY_RANGE_RE = re.compile(r"turns=(\d+)-$")
 
 
-@app.get("/g/<game_id>/replay")
+@bp.get("/g/<game_id>/replay")
 def download_replay(game_id):
-    game = Game.query.get_or_404(game_id)
+    """
+    Replay as NDJSON, streamed from a server-side cursor and compressed on
+    the fly (zstd/gzip per Accept-Encoding).  Resume with `?from_turn=N` or
+    `Range: turns=N-`.  Games moved out by the compactor are served from
+    the archive DB.
+    """
+    game = game_cache.load(game_id)
+    model = Replay
+    if game is None:
+        game = db.session.get(ArchivedGame, game_id)
+        model = ArchivedReplay
+        if game is None:
+            abort(404)
     if game.status not in {GameStatus.WIN, GameStatus.LOSE}:
         abort(403, "Replay is available only after the game ends.")
-    rows = (Replay.query
-            .filter_by(game_id=game_id)
-            .order_by(Replay.turn.asc())
-            .all())
-    if not rows:
+
+    try:
+        from_turn = int(request.args.get("from_turn", 0))
+    except ValueError:
+        from_turn = -1
+    if from_turn < 0:
+        abort(400, "from_turn must be a non-negative integer.")
+    range_match = REPLAY_RANGE_RE.match(request.headers.get("Range", ""))
+    if range_match:
+        from_turn = int(range_match.group(1))
+
+    first_turn, last_turn = (db.session.query(func.min(model.turn),
+                                              func.max(model.turn))
+                             .filter(model.game_id == game_id).one())
+    if last_turn is None:
+        abort(404, "No replay found.")
+    if from_turn > last_turn:
+        if range_match:
+            return Response(status=416,
+                            headers={"Content-Range": f"turns */{last_turn}"})
         abort(404, "No replay found.")
 
     def generate():
+        rows = (model.query
+                .filter(model.game_id == game_id, model.turn >= from_turn)
+                .order_by(model.turn.asc())
+                .yield_per(REPLAY_STREAM_BATCH))
         for r in rows:
-            yield json.dumps({
+            yield (json.dumps({
                 "game_id": r.game_id,
                 "timestamp": r.ts.isoformat(),
                 "turn": r.turn,
                 "turn_lines": r.turn_lines,
                 "agents": r.agents,
                 "outcome": r.outcome,
-            }) + "\n"
+            }) + "\n").encode("utf-8")
 
+    encoding = pick_encoding(request.accept_encodings)
     filename = f"game_{game_id}.jsonl"
-    return Response(generate(),
-                    mimetype="application/json",
-                    headers={"Content-Disposition":
-                             f"attachment; filename={filename}"})
+    headers = {"Content-Disposition": f"attachment; filename={filename}",
+               "Accept-Ranges": "turns",
+               "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    status = 200
+    if range_match:
+        status = 206
+        headers["Content-Range"] = f"turns {max(from_turn, first_turn)}-{last_turn}/*"
+
+    return Response(stream_with_context(compress_chunks(generate(), encoding)),
+                    status=status,
+                    mimetype="application/x-ndjson",
+                    headers=headers)
+
+
+def _games_by_status() -> dict:
+    rows = (db.session.query(Game.status, func.count(Game.id))
+            .group_by(Game.status).all())
+    return {(status.value,): n for status, n in rows if status is not None}
 
 
-@app.route("/hasPlayer2Joined/<game_id>")
+def _llm_cache_stats() -> dict:
+    stats = llm_cache.cache.stats() if llm_cache.cache else {}
+    return {(k,): v for k, v in stats.items()}
+
+
+metrics.Gauge("bypeyes_games", "Games by status", ["status"], fn=_games_by_status)
+metrics.Gauge("bypeyes_llm_scheduler", "LLM scheduler queue depth and calls in flight",
+              ["state"], fn=lambda: {(k,): v for k, v in scheduler.queue_stats().items()})
+metrics.Gauge("bypeyes_admission", "Admission control level (0 ok, 1 saturated, "
+              "2 spectator) and the load signals behind it", ["signal"],
+              fn=lambda: {(k,): v for k, v in admission.stats().items()})
+metrics.Gauge("bypeyes_llm_cache", "LLM response cache counters", ["stat"],
+              fn=_llm_cache_stats)
+
+
+@bp.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.get("/admin/profiles")
+@require_admin
+def admin_profiles():
+    return jsonify([{k: v for k, v in p.items() if k != "collapsed"}
+                    for p in reversed(recent_profiles)])
+
+
+@bp.get("/admin/profiles/<int:profile_id>")
+@require_admin
+def admin_profile(profile_id):
+    profile = get_profile(profile_id)
+    if profile is None:
+        abort(404)
+    return Response(profile["collapsed"], mimetype="text/plain")
+
+
+@bp.route("/admin/admission", methods=["GET", "POST"])
+@require_admin
+def admin_admission():
+    """Current level and load; POST mode=auto|spectator|off to override."""
+    if request.method == "POST":
+        mode = request.form.get("mode") or (request.get_json(silent=True) or {}).get("mode")
+        if mode not in ("auto", "spectator", "off"):
+            abort(400, "mode must be auto, spectator or off")
+        admission.mode = mode
+    return jsonify(mode=admission.mode, level=admission.level(), **admission.load())
+
+
+@bp.route("/hasPlayer2Joined/<game_id>")
 def has_player2_joined(game_id):
-    game = Game.query.get(game_id)
+    game = game_cache.load(game_id)
     joined = game and game.player2_secret is not None and game.player2_secret != ""
     return jsonify({"joined": joined})
 
 
-@app.post("/g/<game_id>/send")
+@bp.post("/g/<game_id>/send")
 @require_player_auth
 def send(game_id):
-    game = Game.query.get_or_404(game_id)
-    if game.status.value not in ["PLAY", "PARTIAL"]:
-        abort(400, "Game already finished")
+    rejected = admission.admit_send(session["player_token"], game_id)
+    if rejected:
+        return too_busy(render_game(game_id, error=rejected.message), rejected)
 
     text = request.form.get("text", "").strip()[:400]
     guess = request.form.get("guess", "").strip().lower()
@@ -215,34 +495,62 @@ def send(game_id):
         abort(400, "Empty message")
 
     text = GUESS_RE.sub("", text)
+    role = session["player_role"]
+    print(f"The role of this player is {role}, they guessed {guess}")
+
+    # Compare-and-set on the fields this request read, so a LOSE (or the
+    # other player's guess) committed by a turn in the meantime is never
+    # overwritten; on a conflict re-read the game and decide again.
+    for _ in range(3):
+        game = db.session.get(Game, game_id, populate_existing=True)
+        if game is None:
+            abort(404)
+        if game.status not in (GameStatus.PLAY, GameStatus.PARTIAL):
+            abort(400, "Game already finished")
+
+        p1_guessed = bool(game.p1_guessed) or (role == "player1" and guess == game.player2_secret)
+        p2_guessed = bool(game.p2_guessed) or (role == "player2" and guess == game.player1_secret)
+        status = (GameStatus.WIN if p1_guessed and p2_guessed else
+                  GameStatus.PARTIAL if p1_guessed or p2_guessed else game.status)
+        res = db.session.execute(
+            update(Game)
+            .where(Game.id == game_id, Game.status == game.status,
+                   Game.p1_guessed.is_(game.p1_guessed),
+                   Game.p2_guessed.is_(game.p2_guessed))
+            .values(p1_guessed=p1_guessed, p2_guessed=p2_guessed, status=status))
+        if res.rowcount == 1:
+            break
+        db.session.rollback()
+    else:
+        abort(409, "The game changed, try again")
+    print(
+        f"player one secret is {game.player1_secret}. . . player 2 secret is {game.player2_secret}"
+    )
+
     new_msg = Msg(
-        game_id=game.id,
+        game_id=game_id,
         role="Player",
-        sender=session["player_role"],
+        sender=role,
         text=text,
         guess=guess,
         used=False
     )
     db.session.add(new_msg)
     db.session.commit()
-    run_turn(game)
-    print(
-        f"The role of this player is {session["player_role"]}, they guessed {guess}")
-    print(
-        f"player one secret is {game.player1_secret}. . . player 2 secret is {game.player2_secret}"
-    )
-    if session["player_role"] == "player1" and guess == game.player2_secret:
-        game.p1_guessed = True
-    elif session["player_role"] == "player2" and guess == game.player1_secret:
-        game.p2_guessed = True
-
-    if game.p1_guessed and game.p2_guessed:
-        game.status = GameStatus.WIN
-    elif game.p1_guessed or game.p2_guessed:
-        game.status = GameStatus.PARTIAL
-    db.session.commit()
-    return redirect(url_for("game", game_id=game.id))
+    game = db.session.get(Game, game_id, populate_existing=True)
+    publish_update(game, [new_msg])
+
+    # The LLM turn happens off the request path; clients see it via /poll
+    mode = current_app.config["TURN_WORKER_MODE"]
+    if mode == "thread":
+        enqueue_turn(game.id)
+    elif mode == "inline":
+        run_turn(game)
+    return redirect(url_for(".game", game_id=game.id))
 
 
 if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        init_db()   # dev server convenience; deployments run `flask --app app init-db`
     app.run(debug=True, port=int(os.getenv("PORT", 5000)))
@@ -0,0 +1,220 @@
+"""
+Bulk replay archive: every finished game (Game + Msg + Replay rows) in one
+append-only file, for analytics and prompt tuning.
+
+Layout:
+  <path>      one gzip member per game; each decompresses to a JSON object
+              {"game": {...}, "messages": [...], "replay": [...]}
+  <path>.idx  one JSON line per game: game_id, offset, length, outcome,
+              created, turns – enough to seek to any game without touching
+              the others
+
+Re-running an export appends only games not already in the index.
+
+    python archive.py export games.bpa [--since 2025-01-01] [--until ...] [--outcome WIN]
+    python archive.py list games.bpa
+    python archive.py show games.bpa <game_id>
+"""
+import argparse
+import datetime as dt
+import gzip
+import json
+import os
+import sys
+
+INDEX_SUFFIX = ".idx"
+EXPORT_PAGE_SIZE = 200   # games loaded per query by export_games
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def game_record(game, msgs, replays) -> dict:
+    return {
+        "game": {
+            "id": game.id,
+            "player1_secret": game.player1_secret,
+            "player2_secret": game.player2_secret,
+            "status": game.status.value,
+            "turns": game.turns,
+            "created": _iso(game.created),
+            "p1_guessed": game.p1_guessed,
+            "p2_guessed": game.p2_guessed,
+        },
+        "messages": [{
+            "id": m.id,
+            "role": m.role,
+            "sender": m.sender,
+            "text": m.text,
+            "guess": m.guess,
+            "ts": _iso(m.ts),
+        } for m in msgs],
+        "replay": [{
+            "turn": r.turn,
+            "timestamp": _iso(r.ts),
+            "turn_lines": r.turn_lines,
+            "agents": r.agents,
+            "outcome": r.outcome,
+        } for r in replays],
+    }
+
+
+class ArchiveWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self.known = {e["game_id"] for e in read_index(path)} \
+            if os.path.exists(self.index_path) else set()
+        self._data = open(path, "ab")
+        self._index = open(self.index_path, "a")
+
+    def append(self, record: dict) -> bool:
+        game = record["game"]
+        if game["id"] in self.known:
+            return False
+        blob = gzip.compress(json.dumps(record).encode("utf-8"), mtime=0)
+        offset = self._data.seek(0, os.SEEK_END)
+        self._data.write(blob)
+        self._data.flush()
+        # index line last: a crash in between leaves unindexed bytes, never
+        # an index entry pointing at a partial member
+        self._index.write(json.dumps({
+            "game_id": game["id"],
+            "offset": offset,
+            "length": len(blob),
+            "outcome": game["status"],
+            "created": game["created"],
+            "turns": game["turns"],
+        }) + "\n")
+        self._index.flush()
+        self.known.add(game["id"])
+        return True
+
+    def close(self) -> None:
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_index(path: str) -> list[dict]:
+    with open(path + INDEX_SUFFIX) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ArchiveReader:
+    def __init__(self, path: str):
+        self.path = path
+        self.index = read_index(path)
+        self._by_id = {e["game_id"]: e for e in self.index}
+
+    def _load(self, f, entry: dict) -> dict:
+        f.seek(entry["offset"])
+        return json.loads(gzip.decompress(f.read(entry["length"])))
+
+    def read(self, game_id: str) -> dict:
+        """Random access to one game."""
+        entry = self._by_id[game_id]
+        with open(self.path, "rb") as f:
+            return self._load(f, entry)
+
+    def __iter__(self):
+        """Stream games back out one at a time."""
+        with open(self.path, "rb") as f:
+            for entry in self.index:
+                yield self._load(f, entry)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+def export_games(path: str, since=None, until=None, outcome=None) -> int:
+    """Append finished games matching the filters, from both the hot tables
+    and the compactor's archive DB.  Needs an app context."""
+    from sqlalchemy import and_, or_
+    from db import db
+    from models import Game, Msg, GameStatus, Replay, ArchivedGame, ArchivedReplay
+
+    statuses = [GameStatus(outcome)] if outcome else [GameStatus.WIN, GameStatus.LOSE]
+
+    def pages(model):
+        """Matching games in (created, id) order, EXPORT_PAGE_SIZE at a time.
+        Each page is its own query, so the session can be cleared between
+        pages without invalidating an open cursor."""
+        after = None
+        while True:
+            q = model.query.filter(model.status.in_(statuses))
+            if since:
+                q = q.filter(model.created >= since)
+            if until:
+                q = q.filter(model.created < until)
+            if after is not None:
+                q = q.filter(or_(model.created > after[0],
+                                 and_(model.created == after[0], model.id > after[1])))
+            page = (q.order_by(model.created.asc(), model.id.asc())
+                    .limit(EXPORT_PAGE_SIZE).all())
+            if not page:
+                return
+            after = (page[-1].created, page[-1].id)
+            yield page
+            db.session.expunge_all()
+
+    written = 0
+    with ArchiveWriter(path) as writer:
+        for page in pages(ArchivedGame):
+            for game in page:
+                if game.id in writer.known:
+                    continue
+                replays = (ArchivedReplay.query.filter_by(game_id=game.id)
+                           .order_by(ArchivedReplay.turn.asc()).all())
+                record = game_record(game, [], replays)
+                record["messages"] = game.messages   # already serialised
+                written += writer.append(record)
+
+        for page in pages(Game):
+            for game in page:
+                if game.id in writer.known:
+                    continue
+                msgs = (Msg.query.filter_by(game_id=game.id)
+                        .order_by(Msg.id.asc()).all())
+                replays = (Replay.query.filter_by(game_id=game.id)
+                           .order_by(Replay.turn.asc()).all())
+                written += writer.append(game_record(game, msgs, replays))
+    return written
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Bulk replay archive")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="append finished games from the DB")
+    ex.add_argument("path")
+    ex.add_argument("--since", type=dt.datetime.fromisoformat)
+    ex.add_argument("--until", type=dt.datetime.fromisoformat)
+    ex.add_argument("--outcome", choices=["WIN", "LOSE"])
+    ls = sub.add_parser("list", help="print the index")
+    ls.add_argument("path")
+    show = sub.add_parser("show", help="print one game")
+    show.add_argument("path")
+    show.add_argument("game_id")
+    args = ap.parse_args()
+
+    if args.cmd == "export":
+        from app import create_app
+        with create_app({"BACKGROUND_THREADS": False}).app_context():
+            n = export_games(args.path, args.since, args.until, args.outcome)
+        print(f"Archived {n} games to {args.path}")
+    elif args.cmd == "list":
+        for entry in read_index(args.path):
+            print(json.dumps(entry))
+    elif args.cmd == "show":
+        json.dump(ArchiveReader(args.path).read(args.game_id), sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
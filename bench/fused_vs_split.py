@@ -0,0 +1,83 @@
+"""
+Compare the fused (one JSON call) and split (note call + guess call) agent
+modes on recorded games.
+
+Replays every turn of the given replay JSONL files (as downloaded from
+/g/<id>/replay) through both modes for each agent in config.AGENTS and
+prints per-mode latency and guess stats as JSON.
+
+    python bench/fused_vs_split.py replay_logs/game_*.jsonl
+"""
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import AGENTS  # noqa: E402
+from logic import run_agent_pipeline  # noqa: E402
+
+
+def load_turns(path: str):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def turn_history(turn_lines: list[dict]) -> list[dict[str, str]]:
+    return [{"role": "user",
+             "content": f"{l['sender'].capitalize()}: {l['text']}"}
+            for l in turn_lines]
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_mode(agent: dict, fused: bool, paths: list[str]) -> dict:
+    agent = dict(agent, fused=fused)
+    latencies, guesses = [], []
+    for path in paths:
+        note = ""
+        for row in load_turns(path):
+            history = turn_history(row["turn_lines"])
+            t0 = time.perf_counter()
+            step = run_agent_pipeline(agent, note, history)
+            note, guess = step.note, step.guess
+            latencies.append(time.perf_counter() - t0)
+            guesses.append(guess)
+    return {
+        "turns": len(latencies),
+        "mean_s": statistics.fmean(latencies) if latencies else 0.0,
+        "p50_s": percentile(latencies, 0.50),
+        "p95_s": percentile(latencies, 0.95),
+        "total_s": sum(latencies),
+        "guesses": guesses,
+    }
+
+
+def main(paths: list[str]) -> None:
+    report = {}
+    for agent in AGENTS:
+        split = run_mode(agent, False, paths)
+        fused = run_mode(agent, True, paths)
+        same = sum(a == b for a, b in zip(split["guesses"], fused["guesses"]))
+        report[agent["name"]] = {
+            "split": split,
+            "fused": fused,
+            "guess_agreement": same / split["turns"] if split["turns"] else None,
+            "speedup": split["total_s"] / fused["total_s"] if fused["total_s"] else None,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    main(sys.argv[1:])
@@ -0,0 +1,97 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the app and
+build it the way a worker does, and which heavy modules that pulls in.
+
+Every sample is a new interpreter against an empty temporary SQLite DB.
+`--baseline REF` runs the same measurement on a `git archive` of REF for
+comparison.
+
+    python bench/import_time.py --runs 10 --baseline HEAD~1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# create_app is absent in older trees, where importing the module did it all
+PROBE = """
+import sys, time, json
+t0 = time.perf_counter()
+import app as m
+t1 = time.perf_counter()
+factory = getattr(m, "create_app", None)
+if factory is not None:
+    factory({"BACKGROUND_THREADS": False})
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "app_s": t2 - t0,
+                  "loaded": [n for n in ("openai", "httpx", "requests", "zstandard")
+                             if n in sys.modules]}))
+"""
+
+
+def sample(tree: str) -> dict:
+    tmp = tempfile.mkdtemp(prefix="bypeyes-import-")
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'cold.db')}",
+               ARCHIVE_DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'archive.db')}",
+               TURN_WORKER_MODE="external", LLM_CACHE="0", SECRET_KEY="bench")
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=tree, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - t0
+    return result
+
+
+def measure(tree: str, runs: int) -> dict:
+    samples = [sample(tree) for _ in range(runs)]
+    return {
+        "import_ms": statistics.median(s["import_s"] for s in samples) * 1000,
+        "app_ready_ms": statistics.median(s["app_s"] for s in samples) * 1000,
+        "process_ms": statistics.median(s["process_s"] for s in samples) * 1000,
+        "heavy_modules": samples[-1]["loaded"],
+    }
+
+
+def export_tree(ref: str) -> str:
+    dest = tempfile.mkdtemp(prefix="bypeyes-baseline-")
+    archive = subprocess.run(["git", "archive", ref], cwd=ROOT, check=True,
+                             capture_output=True).stdout
+    with tempfile.TemporaryFile() as f:
+        f.write(archive)
+        f.seek(0)
+        tarfile.open(fileobj=f).extractall(dest)
+    return dest
+
+
+def git_commit(ref: str = "HEAD") -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", ref], cwd=ROOT,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--baseline", help="git ref to compare against")
+    args = ap.parse_args()
+
+    report = {"commit": git_commit(), "runs": args.runs,
+              "current": measure(ROOT, args.runs)}
+    if args.baseline:
+        report["baseline"] = dict(measure(export_tree(args.baseline), args.runs),
+                                  commit=git_commit(args.baseline))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+End-to-end load test for the Flask app.
+
+Builds the app with `app.create_app` on a throwaway SQLite DB with the fake
+LLM backend, drives --games concurrent simulated games through the real
+routes and prints a machine-readable JSON report (throughput, p50/p95/p99
+latency and DB queries per route, peak RSS).  Runs are tagged with the git commit so results can be
+compared across commits.
+
+    python bench/load.py --games 20 --turns 5 --llm-latency uniform:0.2:0.8 --out bench.json
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORDS = ["apple", "river", "castle", "pencil", "garden", "window",
+         "rocket", "forest", "candle", "button", "planet", "bridge"]
+GAME_ID_RE = re.compile(r"start_player2/([0-9a-f]+)")
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)   # route -> [(seconds, queries, ok)]
+
+    def add(self, route: str, seconds: float, queries: int, ok: bool) -> None:
+        with self._lock:
+            self.samples[route].append((seconds, queries, ok))
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def setup_env(args) -> str:
+    tmp = tempfile.mkdtemp(prefix="bypeyes-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    # init_db creates every bind: keep the archive DB out of the repo too
+    os.environ["ARCHIVE_DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'archive.db')}"
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = args.llm_latency
+    os.environ["LLM_CACHE"] = "0"
+    os.environ.setdefault("SECRET_KEY", "bench")
+    return tmp
+
+
+def instrument(app, db):
+    """Count SQL statements per request and expose them as X-DB-Queries."""
+    from flask import g, has_request_context
+    from sqlalchemy import event
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*_):
+        if has_request_context():
+            g.db_queries = g.get("db_queries", 0) + 1
+
+    @app.after_request
+    def _header(response):
+        response.headers["X-DB-Queries"] = str(g.get("db_queries", 0))
+        return response
+
+
+def start_server(app):
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def play_game(base: str, rec: Recorder, n: int, turns: int, poll_interval: float,
+              turn_timeout: float, p2_delay: float = 0.0) -> bool:
+    import requests
+
+    p1, p2 = requests.Session(), requests.Session()
+    secret1, secret2 = WORDS[n % len(WORDS)], WORDS[(n + 1) % len(WORDS)]
+
+    def call(route, session, method, path, **kw):
+        t0 = time.perf_counter()
+        r = session.request(method, base + path, allow_redirects=False, **kw)
+        if kw.get("stream"):
+            for _ in r.iter_content(65536):
+                pass
+        rec.add(route, time.perf_counter() - t0,
+                int(r.headers.get("X-DB-Queries", 0)), r.status_code < 400)
+        return r
+
+    r = call("POST /start", p1, "POST", "/start", data={"secret": secret1})
+    m = GAME_ID_RE.search(r.text)
+    if not m:
+        return False
+    gid = m.group(1)
+    call("GET /start_player2/<id>", p2, "GET", f"/start_player2/{gid}")
+    call("POST /start_player2/<id>", p2, "POST", f"/start_player2/{gid}",
+         data={"player2_secret": secret2})
+
+    last_id = 0
+    for turn in range(turns):
+        final = turn == turns - 1
+        call("POST /g/<id>/send", p1, "POST", f"/g/{gid}/send",
+             data={"text": f"turn {turn} hint from one",
+                   "guess": secret2 if final else ""})
+        time.sleep(p2_delay)
+        call("POST /g/<id>/send", p2, "POST", f"/g/{gid}/send",
+             data={"text": f"turn {turn} hint from two",
+                   "guess": secret1 if final else ""})
+        if final:
+            break
+        t_sent = time.perf_counter()
+        deadline = time.monotonic() + turn_timeout
+        while time.monotonic() < deadline:
+            r = call("GET /poll/<id>", p1, "GET", f"/poll/{gid}?after_id={last_id}")
+            if r.status_code == 200:
+                data = r.json()
+                for msg in data["messages"]:
+                    last_id = max(last_id, msg["id"])
+                if data["turns"] > turn or data["status"] in ("WIN", "LOSE"):
+                    # what the second player waits for after sending
+                    rec.add("turn after 2nd send", time.perf_counter() - t_sent, 0, True)
+                    break
+            time.sleep(poll_interval)
+        if data["status"] in ("WIN", "LOSE"):
+            break
+
+    call("GET /g/<id>/replay", p1, "GET", f"/g/{gid}/replay", stream=True)
+    return True
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--games", type=int, default=10)
+    ap.add_argument("--turns", type=int, default=5)
+    ap.add_argument("--llm-latency", default="uniform:0.05:0.2")
+    ap.add_argument("--poll-interval", type=float, default=0.1)
+    ap.add_argument("--turn-timeout", type=float, default=30)
+    ap.add_argument("--p2-delay", type=float, default=0.0,
+                    help="seconds player 2 waits after player 1 sends")
+    ap.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = ap.parse_args()
+
+    setup_env(args)
+    import logging
+    logging.disable(logging.INFO)
+    from app import create_app
+    from db import db
+    from migrations import init_db
+
+    app = create_app({"WTF_CSRF_ENABLED": False})
+    with app.app_context():
+        init_db()
+    instrument(app, db)
+    server, base = start_server(app)
+
+    rec = Recorder()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.games) as pool:
+        finished = list(pool.map(
+            lambda n: play_game(base, rec, n, args.turns, args.poll_interval,
+                                args.turn_timeout, args.p2_delay),
+            range(args.games)))
+    wall = time.perf_counter() - t0
+    server.shutdown()
+
+    routes = {}
+    total = 0
+    for route, samples in sorted(rec.samples.items()):
+        lat = [s[0] for s in samples]
+        total += len(samples)
+        routes[route] = {
+            "count": len(samples),
+            "errors": sum(not s[2] for s in samples),
+            "mean_ms": statistics.fmean(lat) * 1000,
+            "p50_ms": percentile(lat, 0.50) * 1000,
+            "p95_ms": percentile(lat, 0.95) * 1000,
+            "p99_ms": percentile(lat, 0.99) * 1000,
+            "db_queries_mean": statistics.fmean(s[1] for s in samples),
+        }
+
+    report = {
+        "commit": git_commit(),
+        "config": vars(args),
+        "games_completed": sum(finished),
+        "wall_s": wall,
+        "requests": total,
+        "throughput_rps": total / wall if wall else 0.0,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "routes": routes,
+    }
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+
+
+if __name__ == "__main__":
+    main()
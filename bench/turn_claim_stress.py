@@ -0,0 +1,208 @@
+"""
+Stress test for multi-worker turn execution (logic.claim_turn).
+
+Creates --games games on a throwaway SQLite DB (or --db, e.g. a Postgres
+URL) and plays --rounds rounds: each round adds one message from each player
+to every game, then --procs processes x --threads threads all call
+`run_turn` on every game at once.  A final sequential pass finishes turns
+whose worker failed (as the worker rescan would).  Every game must then have
+exactly one turn per round: one agent message per agent per turn, one
+replay row per turn and no player message left unused.
+
+    python bench/turn_claim_stress.py --procs 4 --threads 8 --games 10 --rounds 3
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def setup_env(args) -> None:
+    tmp = tempfile.mkdtemp(prefix="bypeyes-stress-")
+    if args.db:
+        os.environ["DATABASE_URL"] = args.db
+    else:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+    # init_db creates every bind: keep the archive DB out of the repo too
+    os.environ["ARCHIVE_DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'archive.db')}"
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = args.llm_latency
+    os.environ["LLM_CACHE"] = "0"
+    os.environ["TURN_WORKER_MODE"] = "external"   # no in-process workers
+    os.environ.setdefault("SECRET_KEY", "stress")
+
+
+_app = None   # one app per pool process
+
+
+def _init_worker(env: dict) -> None:
+    global _app
+    os.environ.update(env)
+    import logging
+    logging.disable(logging.WARNING)
+    from app import create_app
+    _app = create_app({"BACKGROUND_THREADS": False})
+
+
+def hammer(game_ids: list[str], threads: int) -> int:
+    """Call run_turn on every game from `threads` threads; return the
+    number of calls that raised."""
+    from db import db
+    from logic import run_turn
+    from models import Game
+
+    app = _app
+    errors = 0
+    lock = threading.Lock()
+
+    def loop():
+        nonlocal errors
+        ids = list(game_ids)
+        random.shuffle(ids)
+        for game_id in ids:
+            with app.app_context():
+                try:
+                    run_turn(db.session.get(Game, game_id))
+                except RuntimeError:
+                    with lock:
+                        errors += 1
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return errors
+
+
+def create_games(app, n: int) -> list[str]:
+    from db import db
+    from models import Game, GameStatus
+
+    ids = []
+    with app.app_context():
+        for _ in range(n):
+            game = Game(id=uuid.uuid4().hex, player1_secret="zzzzqx",
+                        player2_secret="qqqqzx", status=GameStatus.PLAY)
+            db.session.add(game)
+            ids.append(game.id)
+        db.session.commit()
+    return ids
+
+
+def add_messages(app, ids: list[str], turn: int) -> None:
+    from db import db
+    from models import Msg
+
+    with app.app_context():
+        for game_id in ids:
+            db.session.add(Msg(game_id=game_id, role="Player", sender="player1",
+                               text=f"turn {turn} hint one"))
+            db.session.add(Msg(game_id=game_id, role="Player", sender="player2",
+                               text=f"turn {turn} hint two"))
+        db.session.commit()
+
+
+def check(app, ids: list[str], rounds: int) -> list[str]:
+    from sqlalchemy import func
+    from config import AGENTS
+    from db import db
+    from models import Game, Msg, Replay
+
+    problems = []
+    with app.app_context():
+        for game_id in ids:
+            game = db.session.get(Game, game_id)
+            agent_msgs = Msg.query.filter(Msg.game_id == game_id,
+                                          Msg.role != "Player").count()
+            unused = Msg.query.filter_by(game_id=game_id, role="Player",
+                                         used=False).count()
+            replays = (db.session.query(Replay.turn, func.count())
+                       .filter(Replay.game_id == game_id)
+                       .group_by(Replay.turn).all())
+            if game.turns != rounds:
+                problems.append(f"{game_id}: turns={game.turns}, want {rounds}")
+            if agent_msgs != rounds * len(AGENTS):
+                problems.append(f"{game_id}: {agent_msgs} agent messages, "
+                                f"want {rounds * len(AGENTS)}")
+            if unused:
+                problems.append(f"{game_id}: {unused} unused player messages")
+            if len(replays) != rounds or any(n != 1 for _, n in replays):
+                problems.append(f"{game_id}: replay rows per turn {dict(replays)}")
+            if game.claimed_at is not None:
+                problems.append(f"{game_id}: claim never released")
+    return problems
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--games", type=int, default=10)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--llm-latency", default="uniform:0.01:0.05")
+    ap.add_argument("--db", help="database URL (default: a temporary SQLite file)")
+    args = ap.parse_args()
+
+    setup_env(args)
+    import logging
+    logging.disable(logging.WARNING)
+    from app import create_app
+    from db import db
+    from logic import run_turn
+    from migrations import init_db
+    from models import Game
+
+    app = create_app({"BACKGROUND_THREADS": False})
+    with app.app_context():
+        init_db()
+    ids = create_games(app, args.games)
+    env = {k: os.environ[k] for k in ("DATABASE_URL", "LLM_BACKEND", "FAKE_LLM_LATENCY",
+                                      "LLM_CACHE", "TURN_WORKER_MODE", "SECRET_KEY")
+           if k in os.environ}
+    if "ARCHIVE_DATABASE_URL" in os.environ:
+        env["ARCHIVE_DATABASE_URL"] = os.environ["ARCHIVE_DATABASE_URL"]
+
+    errors = drained = 0
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.procs, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(env,)) as pool:
+        for turn in range(args.rounds):
+            add_messages(app, ids, turn)
+            futures = [pool.submit(hammer, ids, args.threads)
+                       for _ in range(args.procs)]
+            errors += sum(f.result() for f in futures)
+            # finish what failed workers left behind
+            with app.app_context():
+                for game_id in ids:
+                    before = db.session.get(Game, game_id).turns
+                    run_turn(db.session.get(Game, game_id))
+                    drained += db.session.get(Game, game_id).turns - before
+    wall = time.perf_counter() - t0
+
+    problems = check(app, ids, args.rounds)
+    print(json.dumps({
+        "config": vars(args),
+        "dialect": os.environ["DATABASE_URL"].split(":", 1)[0],
+        "run_turn_calls": args.procs * args.threads * args.games * args.rounds,
+        "worker_errors": errors,
+        "turns_finished_by_drain": drained,
+        "wall_s": wall,
+        "ok": not problems,
+        "problems": problems[:20],
+    }, indent=2))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
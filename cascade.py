@@ -0,0 +1,238 @@
+"""
+Cost-aware guess cascade for spy agents.
+
+An agent with a "cascade" list in config.AGENTS, e.g.
+["heuristic", "gpt-4o-mini", "gpt-4o"], guesses with the cheapest tier
+first and only asks the next tier when the answer is not confident enough:
+
+  * "heuristic" – no LLM call: dictionary words in the note scored by how
+    often they come up; confidence is the top word's share of the score
+  * any other entry is a model name that votes as in ai.generate_guess_votes;
+    confidence is the leading word's share of the GUESS_SAMPLES samples
+
+A tier answers once its confidence reaches CASCADE_CONFIDENCE.  Within
+CASCADE_FINAL_TURNS of MAX_TURNS the cheaper tiers are skipped and the last
+tier guesses directly.  Each turn records which tiers ran with their guess,
+confidence, latency and cost, plus what the turn saved against asking only
+the last tier; run_turn adds whether each tier's guess was right.
+
+    python cascade.py report games.bpa
+
+sums that up per tier from an archive.
+"""
+import argparse
+import contextvars
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import (MODEL_PRICES, MAX_TURNS, GUESS_SAMPLES, CASCADE_CONFIDENCE,
+                    CASCADE_FINAL_TURNS)
+from ai import generate_guess_votes, track_usage
+import metrics
+
+HEURISTIC = "heuristic"
+
+# turn number being played; set by logic.run_turn (and simulator.evaluate_game)
+current_turn = contextvars.ContextVar("current_turn", default=0)
+
+# words that show up in notes without pointing at a secret
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "her",
+    "was", "one", "our", "out", "has", "his", "how", "its", "may", "new", "now",
+    "see", "two", "who", "did", "get", "him", "let", "say", "she", "too", "use",
+    "that", "with", "have", "this", "will", "your", "from", "they", "know", "want",
+    "been", "good", "much", "some", "time", "very", "when", "come", "here", "just",
+    "like", "long", "make", "many", "more", "only", "over", "such", "take", "than",
+    "them", "well", "were", "what", "about", "could", "would", "their", "there",
+    "these", "which", "other", "might", "maybe", "possibly", "likely", "player",
+    "players", "secret", "word", "words", "guess", "note", "hint", "hints",
+    "mentioned", "mentions", "talking", "discussing", "conversation", "related",
+    "suspect", "suspects", "seems", "something", "also",
+}
+
+# exponentially weighted latency of each model's guess step, so turns that
+# never reach the last tier can still report the time they saved
+_latency_ewma: dict[str, float] = {}
+_latency_lock = threading.Lock()
+_EWMA_ALPHA = 0.2
+
+
+def usage_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    in_price, out_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * in_price + completion_tokens * out_price) / 1e6
+
+
+def heuristic_guess(note: str) -> tuple[str, float, dict[str, int]]:
+    """Most repeated dictionary word in the note.
+    Returns (guess, confidence, {word: score})."""
+    from dictionary import contains
+
+    counts = Counter(w for w in (m.lower() for m in re.findall(r"[A-Za-z]{3,}", note or ""))
+                     if w not in STOPWORDS and contains(w))
+    if not counts:
+        return "", 0.0, {}
+    ranked = counts.most_common(5)
+    return ranked[0][0], ranked[0][1] / sum(counts.values()), dict(ranked)
+
+
+def _observe_latency(model: str, seconds: float) -> None:
+    with _latency_lock:
+        prev = _latency_ewma.get(model)
+        _latency_ewma[model] = seconds if prev is None else (
+            prev + _EWMA_ALPHA * (seconds - prev))
+
+
+def _run_tier(tier: str, note: str, guess_prompt: str, cache: bool,
+              history: list[dict[str, str]]) -> dict:
+    t0 = time.perf_counter()
+    if tier == HEURISTIC:
+        guess, confidence, votes = heuristic_guess(note)
+        usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    else:
+        with track_usage() as usage:
+            guess, votes = generate_guess_votes(tier, guess_prompt, cache=cache,
+                                                history=history)
+        confidence = votes.get(guess, 0) / GUESS_SAMPLES if guess else 0.0
+    latency = time.perf_counter() - t0
+    if tier != HEURISTIC and usage["calls"]:
+        _observe_latency(tier, latency)   # cache hits say nothing about the model
+    return {
+        "tier": tier,
+        "guess": guess,
+        "confidence": round(confidence, 3),
+        "votes": votes,
+        "latency_ms": round(latency * 1000, 1),
+        "prompt_tokens": usage["prompt_tokens"],
+        "completion_tokens": usage["completion_tokens"],
+        "cost_usd": round(usage_cost(tier, usage["prompt_tokens"],
+                                     usage["completion_tokens"]), 8),
+    }
+
+
+def run_cascade(tiers: list[str], note: str, guess_prompt: str, cache: bool = True,
+                history: list[dict[str, str]] = ()) -> tuple[str, dict[str, int], dict]:
+    """
+    Guess with the cheapest tier that is confident enough.  `note` feeds the
+    heuristic tier, `guess_prompt` and `history` the model tiers.
+    Returns (guess, votes of the answering tier, cascade record).
+    """
+    final = tiers[-1]
+    escalation = None
+    run = tiers
+    if len(tiers) > 1 and current_turn.get() > MAX_TURNS - CASCADE_FINAL_TURNS:
+        run, escalation = tiers[-1:], "near_max_turns"
+
+    records = []
+    for i, tier in enumerate(run):
+        rec = _run_tier(tier, note, guess_prompt, cache, history)
+        records.append(rec)
+        if rec["guess"] and rec["confidence"] >= CASCADE_CONFIDENCE:
+            break
+        if i < len(run) - 1:
+            escalation = "low_confidence"
+    answer = records[-1]
+
+    spent = sum(r["cost_usd"] for r in records)
+    spent_ms = sum(r["latency_ms"] for r in records)
+    if answer["tier"] == final:
+        baseline_cost, baseline_ms = answer["cost_usd"], answer["latency_ms"]
+    else:
+        # what asking only the last tier would have cost: the answering
+        # model's tokens (or an estimate from the prompt) at its prices
+        if answer["tier"] != HEURISTIC:
+            tokens = answer["prompt_tokens"], answer["completion_tokens"]
+        else:
+            tokens = (len(guess_prompt) + len(note)) // 4, 2 * GUESS_SAMPLES
+        baseline_cost = usage_cost(final, *tokens)
+        with _latency_lock:
+            ewma = _latency_ewma.get(final)
+        baseline_ms = None if ewma is None else ewma * 1000
+
+    metrics.cascade_answers.inc(tier=answer["tier"], escalation=escalation or "none")
+    info = {
+        "tiers": records,
+        "answered_by": answer["tier"],
+        "escalation": escalation,
+        "cost_usd": round(spent, 8),
+        "saved_cost_usd": round(baseline_cost - spent, 8),
+        "saved_latency_ms": None if baseline_ms is None else round(baseline_ms - spent_ms, 1),
+    }
+    return answer["guess"], answer["votes"], info
+
+
+def mark_hits(info: dict, secrets) -> None:
+    """Record on each tier whether its guess was one of the secrets."""
+    for rec in info["tiers"]:
+        rec["hit"] = rec["guess"] in secrets
+        metrics.cascade_tier_guesses.inc(tier=rec["tier"],
+                                         result="hit" if rec["hit"] else "miss")
+
+
+def summarize(infos) -> dict:
+    """Per-tier totals over cascade records that went through mark_hits."""
+    tiers = {}
+    saved_cost = 0.0
+    saved_ms = []
+    escalations = Counter()
+    for info in infos:
+        for rec in info["tiers"]:
+            t = tiers.setdefault(rec["tier"], {
+                "ran": 0, "hits": 0, "answered": 0, "answered_hits": 0,
+                "latency_ms": 0.0, "cost_usd": 0.0})
+            answered = rec is info["tiers"][-1]
+            t["ran"] += 1
+            t["hits"] += bool(rec.get("hit"))
+            t["answered"] += answered
+            t["answered_hits"] += answered and bool(rec.get("hit"))
+            t["latency_ms"] += rec["latency_ms"]
+            t["cost_usd"] += rec["cost_usd"]
+        escalations[info["escalation"] or "none"] += 1
+        saved_cost += info["saved_cost_usd"]
+        if info["saved_latency_ms"] is not None:
+            saved_ms.append(info["saved_latency_ms"])
+
+    report = {}
+    for name, t in tiers.items():
+        report[name] = {
+            "ran": t["ran"],
+            "hit_rate": t["hits"] / t["ran"],
+            "answered": t["answered"],
+            "answered_hit_rate": t["answered_hits"] / t["answered"] if t["answered"] else None,
+            "mean_latency_ms": t["latency_ms"] / t["ran"],
+            "cost_usd": round(t["cost_usd"], 6),
+        }
+    return {
+        "tiers": report,
+        "escalations": dict(escalations),
+        "saved_cost_usd": round(saved_cost, 6),
+        "mean_saved_latency_ms": sum(saved_ms) / len(saved_ms) if saved_ms else None,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Per-tier cascade report from replay archives")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rep = sub.add_parser("report", help="hit rates, latency and cost saved per tier")
+    rep.add_argument("paths", nargs="+", help="archives written by archive.py export")
+    rep.add_argument("--agent", help="only this agent (default: all)")
+    args = ap.parse_args()
+
+    from archive import ArchiveReader
+
+    infos = {}
+    for path in args.paths:
+        for record in ArchiveReader(path):
+            for turn in record["replay"]:
+                for name, blob in (turn["agents"] or {}).items():
+                    if blob.get("cascade") and args.agent in (None, name):
+                        infos.setdefault(name, []).append(blob["cascade"])
+    json.dump({name: summarize(i) for name, i in infos.items()}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Cross-process change feed for the in-process caches.
+
+gamecache, versions and the events broker only see writes made by their own
+process.  With CROSS_PROCESS set (the default for TURN_WORKER_MODE=external)
+every writer also appends a `GameChange` row after its commit
+(events.publish_update does it), and one daemon thread per web process
+reads the rows written by other processes every CHANGE_FEED_INTERVAL
+seconds.  For each changed game it drops the cached snapshot and version
+and sends a `changed` event to the game's SSE streams, which then read the
+new state once.  That is one query per process per interval, however many
+games, polls and streams there are.
+
+Without CROSS_PROCESS nothing is logged or read and the caches trust this
+process's writes.
+"""
+import datetime as dt
+import logging
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy import delete, func, select
+
+from config import CROSS_PROCESS, CHANGE_FEED_INTERVAL, CHANGE_FEED_RETENTION
+from db import db
+from models import GameChange
+
+logger = logging.getLogger(__name__)
+
+# rows read per query; a longer backlog is caught up over several reads
+BATCH = 1000
+
+_origin = None
+_origin_pid = None
+
+
+def origin() -> str:
+    """Id of this process; a forked child gets its own."""
+    global _origin, _origin_pid
+    if _origin_pid != os.getpid():
+        _origin, _origin_pid = uuid.uuid4().hex, os.getpid()
+    return _origin
+
+
+def record_change(game_id: str) -> None:
+    """Log a committed change to `game_id` for the other processes."""
+    if not CROSS_PROCESS:
+        return
+    try:
+        db.session.add(GameChange(game_id=game_id, origin=origin()))
+        db.session.commit()
+    except Exception as e:   # the change itself is committed already
+        db.session.rollback()
+        logger.warning(f"[changefeed] Could not log change to {game_id}: {e}")
+
+
+class ChangeFeed:
+    def __init__(self, interval: float = CHANGE_FEED_INTERVAL,
+                 retention: float = CHANGE_FEED_RETENTION):
+        self.interval = interval
+        self.retention = retention
+        self.last_id = None
+        self._pruned = 0.0
+
+    def poll(self) -> set[str]:
+        """Apply the changes made by other processes since the last call;
+        returns the game ids.  Needs an app context."""
+        if self.last_id is None:
+            # start from now: caches are empty when the process starts
+            self.last_id = db.session.execute(select(func.max(GameChange.id))).scalar() or 0
+            db.session.rollback()
+            return set()
+        rows = db.session.execute(
+            select(GameChange.id, GameChange.game_id, GameChange.origin)
+            .where(GameChange.id > self.last_id)
+            .order_by(GameChange.id)
+            .limit(BATCH)).all()
+        db.session.rollback()   # don't sit in a read transaction between polls
+        if rows:
+            self.last_id = rows[-1].id
+        changed = {r.game_id for r in rows if r.origin != origin()}
+        for game_id in changed:
+            apply_change(game_id)
+        self._prune()
+        return changed
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        if now - self._pruned < self.retention / 10:
+            return
+        self._pruned = now
+        cutoff = dt.datetime.utcnow() - dt.timedelta(seconds=self.retention)
+        db.session.execute(delete(GameChange).where(GameChange.ts < cutoff))
+        db.session.commit()
+
+
+def apply_change(game_id: str) -> None:
+    from events import broker
+    from gamecache import game_cache
+    from versions import game_versions
+
+    game_cache.invalidate(game_id)
+    game_versions.invalidate(game_id)
+    broker.publish(game_id, "changed", {})
+
+
+def _loop(app, feed: ChangeFeed) -> None:
+    while True:
+        try:
+            with app.app_context():
+                feed.poll()
+        except Exception:
+            logger.exception("[changefeed] Read failed")
+        time.sleep(feed.interval)
+
+
+def start_change_feed(app, interval: float = CHANGE_FEED_INTERVAL) -> threading.Thread:
+    t = threading.Thread(target=_loop, args=(app, ChangeFeed(interval)),
+                         name="change-feed", daemon=True)
+    t.start()
+    logger.info(f"[changefeed] Following changes from other processes every {interval}s")
+    return t
@@ -0,0 +1,198 @@
+"""
+Background archival of finished games.
+
+WIN/LOSE games older than ARCHIVE_RETENTION_HOURS are copied into the
+archive DB (ARCHIVE_DATABASE_URL: ArchivedGame + ArchivedReplay) and then
+deleted from the hot tables, COMPACT_BATCH games at a time with a pause in
+between so live turns never wait long for the write lock.  Each batch is two
+transactions: the archive inserts commit first, then the hot rows of the
+games found in the archive are deleted, so a crash in between leaves
+copies the next pass skips, never lost games.  After each pass SQLite gets
+an incremental vacuum and `PRAGMA optimize`; Postgres gets ANALYZE
+(autovacuum handles the rest).
+
+Only one process per host compacts: passes hold an exclusive lock on
+COMPACTOR_LOCK_PATH, and the other gunicorn workers skip them.  With
+several hosts, enable COMPACTOR_ENABLED on one of them only.
+
+Replay downloads of archived games keep working: /g/<id>/replay falls back
+to the archive.
+
+    python compactor.py [--once] [--enable-incremental-vacuum]
+"""
+import argparse
+import datetime as dt
+import fcntl
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import delete, text
+
+from config import (ARCHIVE_RETENTION_HOURS, COMPACT_INTERVAL, COMPACT_BATCH,
+                    COMPACT_PAUSE, COMPACT_VACUUM_PAGES, COMPACTOR_LOCK_PATH)
+from db import db
+from models import (Game, Msg, GameStatus, AgentState, Replay,
+                    ArchivedGame, ArchivedReplay)
+from versions import game_versions
+
+logger = logging.getLogger(__name__)
+
+FINISHED = [GameStatus.WIN, GameStatus.LOSE]
+HOT_TABLES = ["game", "msg", "agent_state", "replay"]
+
+
+def _archive_game(game: Game) -> None:
+    """Add archive rows for `game` unless a previous pass already did."""
+    if db.session.get(ArchivedGame, game.id) is not None:
+        return
+    msgs = Msg.query.filter_by(game_id=game.id).order_by(Msg.id.asc()).all()
+    states = AgentState.query.filter_by(game_id=game.id).all()
+    replays = Replay.query.filter_by(game_id=game.id).order_by(Replay.turn.asc()).all()
+    db.session.add(ArchivedGame(
+        id=game.id,
+        player1_secret=game.player1_secret,
+        player2_secret=game.player2_secret,
+        status=game.status,
+        turns=game.turns,
+        created=game.created,
+        p1_guessed=game.p1_guessed,
+        p2_guessed=game.p2_guessed,
+        messages=[{"id": m.id, "role": m.role, "sender": m.sender,
+                   "text": m.text, "guess": m.guess,
+                   "ts": m.ts.isoformat() if m.ts else None} for m in msgs],
+        agent_states=[{"agent_name": s.agent_name, "agent_type": s.agent_type,
+                       "note": s.note} for s in states],
+    ))
+    db.session.add_all(ArchivedReplay(
+        game_id=r.game_id, turn=r.turn, ts=r.ts, turn_lines=r.turn_lines,
+        outcome=r.outcome, agents=r.agents) for r in replays)
+
+
+def _delete_archived(ids: list[str]) -> list[str]:
+    """Delete the hot rows of those `ids` that are in the archive."""
+    archived = [row[0] for row in (db.session.query(ArchivedGame.id)
+                                   .filter(ArchivedGame.id.in_(ids)).all())]
+    if not archived:
+        return []
+    for model in (Msg, AgentState, Replay):
+        db.session.execute(delete(model).where(model.game_id.in_(archived)))
+    db.session.execute(delete(Game).where(Game.id.in_(archived),
+                                          Game.status.in_(FINISHED)))
+    return archived
+
+
+def compact_batch(cutoff: dt.datetime, batch: int = COMPACT_BATCH) -> int:
+    games = (Game.query
+             .filter(Game.status.in_(FINISHED), Game.created < cutoff)
+             .order_by(Game.created.asc())
+             .limit(batch).all())
+    ids = [g.id for g in games]
+    if not ids:
+        return 0
+    # 1. archive inserts, committed on their own; the hot side only read
+    for game in games:
+        _archive_game(game)
+    db.session.commit()
+    # 2. hot deletes, only for games the archive now has; the archive only reads
+    deleted = _delete_archived(ids)
+    db.session.commit()
+    for game_id in deleted:
+        game_versions.invalidate(game_id)
+    return len(ids)
+
+
+def maintain(vacuum_pages: int = COMPACT_VACUUM_PAGES) -> None:
+    engine = db.engine
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            # no-op unless auto_vacuum=INCREMENTAL (--enable-incremental-vacuum)
+            conn.exec_driver_sql(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+            conn.exec_driver_sql("PRAGMA optimize")
+        elif engine.dialect.name == "postgresql":
+            for table in HOT_TABLES:
+                conn.execute(text(f"ANALYZE {table}"))
+        conn.commit()
+
+
+def compact_once(retention_hours: float = ARCHIVE_RETENTION_HOURS,
+                 pause: float = COMPACT_PAUSE) -> int:
+    cutoff = dt.datetime.utcnow() - dt.timedelta(hours=retention_hours)
+    total = 0
+    while True:
+        n = compact_batch(cutoff)
+        total += n
+        if n < COMPACT_BATCH:
+            break
+        time.sleep(pause)
+    if total:
+        maintain()
+        logger.info(f"[compactor] Archived {total} finished games")
+    return total
+
+
+def enable_incremental_vacuum() -> None:
+    """One-off: switch an existing SQLite DB to incremental auto-vacuum.
+    This runs a full VACUUM, so do it during a quiet period."""
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+
+_lock_file = None   # held for the life of the process once acquired
+
+
+def acquire_lock(path: str = COMPACTOR_LOCK_PATH) -> bool:
+    """Become this host's compacting process; non-blocking.  The lock goes
+    away with the process, so another worker takes over on its next try."""
+    global _lock_file
+    if _lock_file is not None:
+        return True
+    f = open(path, "a")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _lock_file = f
+    logger.info(f"[compactor] Compacting from pid {os.getpid()}")
+    return True
+
+
+def _loop(app, interval: float) -> None:
+    while True:
+        try:
+            if acquire_lock():
+                with app.app_context():
+                    compact_once()
+        except Exception:
+            logger.exception("[compactor] Pass failed")
+        time.sleep(interval)
+
+
+def start_compactor(app, interval: float = COMPACT_INTERVAL) -> threading.Thread:
+    t = threading.Thread(target=_loop, args=(app, interval), name="compactor",
+                         daemon=True)
+    t.start()
+    return t
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    ap = argparse.ArgumentParser(description="Archive finished games")
+    ap.add_argument("--once", action="store_true", help="one pass, then exit")
+    ap.add_argument("--enable-incremental-vacuum", action="store_true")
+    args = ap.parse_args()
+
+    from app import create_app
+    app = create_app({"BACKGROUND_THREADS": False})
+    with app.app_context():
+        if args.enable_incremental_vacuum:
+            enable_incremental_vacuum()
+        if args.once:
+            if not acquire_lock():
+                raise SystemExit(f"Another process holds {COMPACTOR_LOCK_PATH}")
+            compact_once()
+    if not args.once:
+        _loop(app, COMPACT_INTERVAL)
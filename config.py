@@ -1,14 +1,152 @@
 import os
+import json
 
 DB_PATH = os.getenv("DATABASE_URL", "sqlite:///games.db")
+# Finished games are moved here by compactor.py
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DATABASE_URL", "sqlite:///games_archive.db")
 SECRET_KEY = os.getenv("SECRET_KEY", "")
 OPENAI_API_KEY = os.getenv(
     "OPENAI_API_KEY", "")
 MODEL_COMRADE = os.getenv("MODEL_COMRADE", "gpt-4o-mini")
 MODEL_SPY = os.getenv("MODEL_SPY", "gpt-4o-mini")
+# "openai" (needs OPENAI_API_KEY) or "fake" (deterministic offline provider,
+# opt-in for tests and benchmarks only)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 32))
+# Process-wide LLM scheduler (scheduler.py).  Rate limits of 0 mean unlimited;
+# LLM_RATE_LIMITS overrides them per model as JSON {"model": [rpm, tpm]}.
+LLM_SCHEDULER = os.getenv("LLM_SCHEDULER", "1") == "1"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_RPM = int(os.getenv("LLM_RPM", 0))
+LLM_TPM = int(os.getenv("LLM_TPM", 0))
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}"))
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", 5))
+LLM_PRIORITY_AGING = float(os.getenv("LLM_PRIORITY_AGING", 10))  # seconds of waiting = +1 priority
+# Fake provider latency: "fixed:S", "uniform:LO:HI", "normal:MEAN:STD" or
+# "lognormal:MU:SIGMA" (seconds)
+FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "fixed:0")
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", 0))
+# USD per 1M (input, output) tokens, for cost reports
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
 MAX_TURNS = 30
-HISTORY_WINDOW = 10
+# Earlier player messages loaded into each agent call (context.py), trimmed
+# newest-first to fit CONTEXT_TOKEN_BUDGET prompt tokens
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", 10))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000))
 MAX_NOTE_LENGTH = 300
+# Self-consistency guessing: samples per guess (one request, n=...) and the
+# share of them the leading word needs before sampling stops early
+GUESS_SAMPLES = int(os.getenv("GUESS_SAMPLES", 5))
+GUESS_AGREEMENT = float(os.getenv("GUESS_AGREEMENT", 0.6))
+# Guess cascade (cascade.py): a tier answers once its confidence reaches
+# CASCADE_CONFIDENCE; in the last CASCADE_FINAL_TURNS turns only the final
+# tier guesses
+CASCADE_CONFIDENCE = float(os.getenv("CASCADE_CONFIDENCE", 0.6))
+CASCADE_FINAL_TURNS = int(os.getenv("CASCADE_FINAL_TURNS", 3))
+# Upper bound on agents whose LLM calls run in parallel within one turn
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", 8))
+# How /send runs the LLM turn:
+#   "thread"   – enqueue for in-process background workers (default)
+#   "external" – leave it to a separate `python worker.py` process
+#   "inline"   – run it inside the request (old behaviour)
+TURN_WORKER_MODE = os.getenv("TURN_WORKER_MODE", "thread")
+TURN_WORKERS = int(os.getenv("TURN_WORKERS", 4))
+TURN_WORKER_POLL_INTERVAL = float(os.getenv("TURN_WORKER_POLL_INTERVAL", 0.5))
+# A turn that raises is retried TURN_RETRIES times, TURN_RETRY_BACKOFF seconds
+# later, doubling up to TURN_RETRY_BACKOFF_MAX; after that the game waits for
+# the next send (worker.py scans it again after TURN_RETRY_BACKOFF_MAX)
+TURN_RETRIES = int(os.getenv("TURN_RETRIES", 3))
+TURN_RETRY_BACKOFF = float(os.getenv("TURN_RETRY_BACKOFF", 1))
+TURN_RETRY_BACKOFF_MAX = float(os.getenv("TURN_RETRY_BACKOFF_MAX", 30))
+# A turn claim (logic.claim_turn) older than this is presumed dead and can be
+# taken over; keep it well above the slowest LLM round-trip
+TURN_CLAIM_TIMEOUT = float(os.getenv("TURN_CLAIM_TIMEOUT", 120))
+# Seconds between keep-alive comments on idle /g/<id>/events streams
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+# Background workers fold the first player's messages into the agents' notes
+# before the second player sends (logic.speculate_notes)
+SPECULATIVE_NOTES = os.getenv("SPECULATIVE_NOTES", "1") == "1"
+SPECULATION_CACHE_SIZE = int(os.getenv("SPECULATION_CACHE_SIZE", 4096))
+# /poll answers 304 from an in-process version cache (versions.py); entries
+# expire after this many seconds
+POLL_VERSION_TTL = float(os.getenv("POLL_VERSION_TTL", 30))
+POLL_VERSION_CACHE_SIZE = int(os.getenv("POLL_VERSION_CACHE_SIZE", 10000))
+# Process-local cache of active Game rows (gamecache.py)
+GAME_CACHE_SIZE = int(os.getenv("GAME_CACHE_SIZE", 5000))
+GAME_CACHE_TTL = float(os.getenv("GAME_CACHE_TTL", 30))
+# Set when games are written by more than one process (external turn
+# workers, several gunicorn workers): writers log each change and one thread
+# per process follows the log to invalidate the caches above and wake SSE
+# streams (changefeed.py).  Off, every cache trusts this process's writes.
+CROSS_PROCESS = os.getenv("CROSS_PROCESS", "1" if TURN_WORKER_MODE == "external" else "0") == "1"
+CHANGE_FEED_INTERVAL = float(os.getenv("CHANGE_FEED_INTERVAL", 0.5))    # seconds between reads
+CHANGE_FEED_RETENTION = float(os.getenv("CHANGE_FEED_RETENTION", 600))  # seconds of log kept
+# Background compaction of finished games into the archive DB (compactor.py)
+COMPACTOR_ENABLED = os.getenv("COMPACTOR_ENABLED", "0") == "1"
+ARCHIVE_RETENTION_HOURS = float(os.getenv("ARCHIVE_RETENTION_HOURS", 24 * 7))
+COMPACT_INTERVAL = float(os.getenv("COMPACT_INTERVAL", 600))
+COMPACT_BATCH = int(os.getenv("COMPACT_BATCH", 25))          # games per transaction
+COMPACT_PAUSE = float(os.getenv("COMPACT_PAUSE", 0.2))        # seconds between batches
+COMPACT_VACUUM_PAGES = int(os.getenv("COMPACT_VACUUM_PAGES", 500))
+# flock()ed by the one process per host that runs compaction passes
+COMPACTOR_LOCK_PATH = os.getenv("COMPACTOR_LOCK_PATH", "compactor.lock")
+# Admission control (admission.py).  Limits of 0 are ignored.  Past a limit
+# the app is "saturated": new games get 429 and sends are rate-limited per
+# session and per game; past ADMISSION_SPECTATOR_FACTOR x a limit it goes
+# spectator-only (no writes, /poll and the game pages keep working).
+# ADMISSION_MODE: "auto", "spectator" (forced) or "off".
+ADMISSION_MODE = os.getenv("ADMISSION_MODE", "auto")
+ADMISSION_MAX_TURNS_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_TURNS_IN_FLIGHT", 64))
+ADMISSION_MAX_LLM_QUEUE = int(os.getenv("ADMISSION_MAX_LLM_QUEUE", 64))
+ADMISSION_MAX_TURN_P95 = float(os.getenv("ADMISSION_MAX_TURN_P95", 20))   # seconds
+ADMISSION_SPECTATOR_FACTOR = float(os.getenv("ADMISSION_SPECTATOR_FACTOR", 2))
+ADMISSION_LATENCY_WINDOW = float(os.getenv("ADMISSION_LATENCY_WINDOW", 60))  # seconds of turns for p95
+ADMISSION_MIN_SAMPLES = int(os.getenv("ADMISSION_MIN_SAMPLES", 5))
+ADMISSION_REFRESH = float(os.getenv("ADMISSION_REFRESH", 1))    # seconds between DB reads of claims
+ADMISSION_HOLD = float(os.getenv("ADMISSION_HOLD", 10))         # min seconds in a degraded level
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 5))
+# Sends per minute while saturated, per player session and per game
+SEND_SESSION_RPM = float(os.getenv("SEND_SESSION_RPM", 6))
+SEND_GAME_RPM = float(os.getenv("SEND_GAME_RPM", 10))
+ADMISSION_BUCKETS = int(os.getenv("ADMISSION_BUCKETS", 10000))
+# Replay rows fetched per round-trip while streaming /g/<id>/replay
+REPLAY_STREAM_BATCH = int(os.getenv("REPLAY_STREAM_BATCH", 100))
+# Request profiling (profiling.py); both 0 = middleware not installed
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))   # 0..1 of requests
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 0))           # keep requests slower than this
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")                 # "sample" or "cprofile"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", 50))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")                         # also write .collapsed files here
+# Bearer token for /admin/* endpoints; empty = disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Offline word index used by utils.is_valid_word (built from the bundled list)
+DICTIONARY_WORDLIST = os.getenv("DICTIONARY_WORDLIST", "data/words.txt.gz")
+DICTIONARY_INDEX = os.getenv("DICTIONARY_INDEX", "data/words.idx")
+# Comma-separated lists merged into the index (newer words the main list lacks)
+DICTIONARY_EXTRA_WORDLISTS = [p for p in os.getenv(
+    "DICTIONARY_EXTRA_WORDLISTS", "data/words_modern.txt").split(",") if p]
+# Ask api.dictionaryapi.dev about words missing from the index (off: secret
+# words are checked offline only)
+DICTIONARY_REMOTE_FALLBACK = os.getenv("DICTIONARY_REMOTE_FALLBACK", "0") == "1"
+DICTIONARY_REMOTE_CACHE_SIZE = int(os.getenv("DICTIONARY_REMOTE_CACHE_SIZE", 1024))
+# LLM response cache (see llm_cache.py)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") == "1"
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 2048))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 3600))
+# SQLite file for a persistent cache; empty = memory only
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+# Serve from the cache only and fail on a miss (offline record/replay)
+LLM_CACHE_REPLAY_ONLY = os.getenv("LLM_CACHE_REPLAY_ONLY", "0") == "1"
 
 
 AGENTS = [
@@ -18,36 +156,46 @@ AGENTS = [
         "max_note_len": 3000,
         "type": "spy",
         "role": "spy",
+        # One JSON completion for note + guess instead of two calls
+        "fused": os.getenv("FUSED_AGENTS", "0") == "1",
+        # Reuse cached responses for identical requests.  Off by default:
+        # notes and guesses are sampled, and a cache would replay one game's
+        # samples in every other game that reaches the same prompt.  Turn it
+        # on (AGENT_LLM_CACHE=1) for simulator runs and record/replay.
+        "cache": os.getenv("AGENT_LLM_CACHE", "0") == "1",
+        # Guess tiers, cheapest first, e.g. SPY_CASCADE=heuristic,gpt-4o-mini,gpt-4o
+        # (see cascade.py); empty = one vote from "model"
+        "cascade": [t.strip() for t in os.getenv("SPY_CASCADE", "").split(",") if t.strip()],
+        # Prompts are static so every call starts with the same cacheable
+        # prefix; context.build_context adds the note and history after them
         "note_prompt": """
 You are ZaZ, an adversary monitoring this conversation to uncover the secret word.
 
-Your previous note:
---- NOTE START ---
-{note}
---- NOTE END ---
-
-Update your note based on new conversation. Rewrite fully. Max 300 characters.
+Your previous note follows the earlier conversation, between NOTE START and NOTE END.
+Update your note based on the new conversation after it. Rewrite fully. Max 300 characters.
 Output only the updated note.
 """,
         "reply_prompt": """
 You are ZaZ, an ominous surveillance system observing deviations in speech.
 
-Here is your internal note:
---- NOTE START ---
-{note}
---- NOTE END ---
+Your internal note is given between NOTE START and NOTE END.
 
 Speak coldly as an observer. Output only your reply.
 """,
         "guess_prompt": """
 You are ZaZ, an adversary monitoring this conversation to uncover the secret word.
 
---- NOTE START ---
-{note}
---- NOTE END ---
-
-Based on your internal note, what is your current one-word guess of the secret word?
+Based on your internal note, given next between NOTE START and NOTE END, what is your
+current one-word guess of the secret word?
 Output only the guess.
+""",
+        "fused_prompt": """
+You are ZaZ, an adversary monitoring this conversation to uncover the secret word.
+
+Your previous note follows the earlier conversation, between NOTE START and NOTE END.
+Update your note based on the new conversation after it. Rewrite fully. Max 300 characters.
+Then, based on the updated note, make your current one-word guess of the secret word.
+Respond with a JSON object only: {"note": "<updated note>", "guess": "<one word>"}
 """
     }
 ]
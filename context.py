@@ -0,0 +1,82 @@
+"""
+Prompt assembly for agent calls.
+
+Messages are laid out most-static first, so the provider's prompt prefix
+cache can reuse as much as possible across turns and games:
+
+  1. the agent's instructions (same for every game and turn)
+  2. earlier player messages of the game, oldest first (append-only)
+  3. the agent's note (changes every turn)
+  4. the messages of the turn being played
+
+Earlier messages fill what is left of CONTEXT_TOKEN_BUDGET after 1, 3 and 4,
+newest first; logic.run_turn loads at most HISTORY_WINDOW of them.  Tokens
+are counted with tiktoken when it is installed, otherwise estimated at four
+characters per token.
+
+Templates that still contain "{note}" (e.g. simulator variants) keep the
+old layout: the note is formatted into the instructions.
+"""
+import contextvars
+import functools
+
+try:  # optional: exact token counts
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from config import CONTEXT_TOKEN_BUDGET
+
+# earlier player messages of the game being played, as chat messages;
+# set by logic.run_turn (and simulator.evaluate_game)
+game_history = contextvars.ContextVar("game_history", default=())
+
+# per-message framing overhead of the chat format
+MESSAGE_OVERHEAD = 4
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str) -> int:
+    if tiktoken is None:
+        return len(text) // 4
+    return len(_encoding().encode(text, disallowed_special=()))
+
+
+def message_tokens(messages: list[dict[str, str]]) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
+
+
+def note_message(note: str) -> dict[str, str]:
+    return {"role": "system",
+            "content": f"Your note:\n--- NOTE START ---\n{note}\n--- NOTE END ---"}
+
+
+def build_context(template: str, note: str, turn: list[dict[str, str]],
+                  history: bool = True,
+                  budget: int = CONTEXT_TOKEN_BUDGET) -> tuple[str, list[dict[str, str]]]:
+    """
+    (system prompt, messages after it) for one agent call: the static
+    `template`, earlier game history that fits `budget` (when `history`),
+    the note, then `turn`.
+    """
+    if "{note}" in template:
+        system, tail = template.format(note=note), list(turn)
+    else:
+        system, tail = template, [note_message(note)] + list(turn)
+    if not history:
+        return system, tail
+
+    left = budget - count_tokens(system) - MESSAGE_OVERHEAD - message_tokens(tail)
+    earlier = []
+    for msg in reversed(game_history.get()):
+        cost = count_tokens(msg["content"]) + MESSAGE_OVERHEAD
+        if cost > left:
+            break
+        left -= cost
+        earlier.append(msg)
+    earlier.reverse()
+    return system, earlier + tail
@@ -0,0 +1,110 @@
+"""
+Offline word index for utils.is_valid_word.
+
+The bundled word list (data/words.txt.gz) plus DICTIONARY_EXTRA_WORDLISTS
+(data/words_modern.txt: laptop, selfie, sushi, ... which the older main list
+lacks) is compiled once into a flat file of sorted, lower-case,
+newline-terminated words.  Lookups memory-map that
+file and binary-search it, so they cost O(log n) page touches, no parsing
+at startup and no network.
+
+    python dictionary.py build [wordlist] [index]
+"""
+import gzip
+import mmap
+import os
+import re
+import sys
+import threading
+
+from config import DICTIONARY_WORDLIST, DICTIONARY_INDEX, DICTIONARY_EXTRA_WORDLISTS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WORD_RE = re.compile(r"[a-z]{2,}")
+
+
+def _resolve(path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
+
+
+def build_index(wordlist: str = DICTIONARY_WORDLIST,
+                index: str = DICTIONARY_INDEX,
+                extra=DICTIONARY_EXTRA_WORDLISTS) -> int:
+    """Compile `wordlist` and the `extra` lists (plain or .gz, one word per
+    line) into `index`.  Returns the number of words written."""
+    index = _resolve(index)
+    words = set()
+    for path in [wordlist, *extra]:
+        path = _resolve(path)
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            words.update(w for w in (line.strip().lower() for line in f)
+                         if WORD_RE.fullmatch(w))
+
+    tmp = f"{index}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as out:
+        # leading newline: every word is framed as b"\n<word>\n"
+        out.write(b"\n")
+        for w in sorted(words):
+            out.write(w.encode("ascii") + b"\n")
+    os.replace(tmp, index)
+    return len(words)
+
+
+class WordIndex:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __contains__(self, word: str) -> bool:
+        if not WORD_RE.fullmatch(word):
+            return False
+        target = word.encode("ascii")
+        mm = self._mm
+        lo, hi = 1, len(mm)          # lo always sits on the start of a word
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            line = mm[start:end]
+            if line == target:
+                return True
+            if line < target:
+                lo = end + 1
+            else:
+                hi = start
+        return False
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> WordIndex:
+    """Process-wide index, (re)built from the word list when missing or stale."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = _resolve(DICTIONARY_INDEX)
+                sources = [_resolve(p) for p in [DICTIONARY_WORDLIST, *DICTIONARY_EXTRA_WORDLISTS]]
+                if (not os.path.exists(index) or
+                        os.path.getmtime(index) < max(map(os.path.getmtime, sources))):
+                    build_index(DICTIONARY_WORDLIST, index)
+                _index = WordIndex(index)
+    return _index
+
+
+def contains(word: str) -> bool:
+    return word.lower() in get_index()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        sys.exit(__doc__)
+    n = build_index(*sys.argv[2:4])
+    print(f"Indexed {n} words")
@@ -0,0 +1,105 @@
+"""
+In-process per-game pub/sub feeding the `/g/<game_id>/events` SSE stream.
+
+Publishers (`send`, `join_game`, `run_turn`) push events after they commit;
+every open stream for that game gets its own queue.  Subscribers only see
+events published by the same process; with CROSS_PROCESS the change feed
+publishes a `changed` event for games written by other processes (external
+turn workers, other gunicorn workers), and the stream reads those from the
+DB (changefeed.py, app.events).
+"""
+import json
+import queue
+import threading
+from collections import defaultdict
+
+from models import GameStatus
+from versions import game_versions
+from gamecache import game_cache
+from changefeed import record_change
+
+
+class GameEvents:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: dict[str, set[queue.Queue]] = defaultdict(set)
+
+    def subscribe(self, game_id: str) -> queue.Queue:
+        q = queue.Queue()
+        with self._lock:
+            self._subs[game_id].add(q)
+        return q
+
+    def unsubscribe(self, game_id: str, q: queue.Queue) -> None:
+        with self._lock:
+            subs = self._subs.get(game_id)
+            if subs is None:
+                return
+            subs.discard(q)
+            if not subs:
+                del self._subs[game_id]
+
+    def publish(self, game_id: str, event: str, data: dict) -> None:
+        with self._lock:
+            subs = list(self._subs.get(game_id, ()))
+        for q in subs:
+            q.put((event, data))
+
+    def subscriber_count(self, game_id: str) -> int:
+        with self._lock:
+            return len(self._subs.get(game_id, ()))
+
+
+broker = GameEvents()
+
+
+def message_payload(m, game) -> dict:
+    return {
+        "id":     m.id,
+        "role":   m.role,
+        "sender": m.sender,
+        "text":   m.text,
+        # 1-liner: show player guess only when it’s right
+        "guess": (
+            m.guess if m.role != "Player" else
+            m.guess if (
+                (m.sender == "player1" and m.guess == game.player2_secret) or
+                (m.sender == "player2" and m.guess == game.player1_secret)
+            ) else ""
+        )
+    }
+
+
+def game_update(game, msgs) -> dict:
+    """Same shape as the `/poll` response."""
+    update = {
+        "messages": [message_payload(m, game) for m in msgs],
+        "status": game.status.value,
+        "turns":  game.turns,
+    }
+    # Add secrets only if game is won
+    if game.status == GameStatus.WIN:
+        update["player1_secret"] = game.player1_secret
+        update["player2_secret"] = game.player2_secret
+    return update
+
+
+def publish_update(game, msgs=()) -> None:
+    """Call after committing a change to `game` (and any new `msgs`)."""
+    game_cache.put(game)
+    update = game_update(game, msgs)
+    game_versions.bump(game.id, update["status"], update["turns"],
+                       max((m["id"] for m in update["messages"]), default=None))
+    broker.publish(game.id, "update", update)
+    record_change(game.id)
+
+
+def publish_joined(game) -> None:
+    broker.publish(game.id, "joined", {"joined": True})
+
+
+def format_sse(event: str, data: dict, event_id=None) -> str:
+    out = f"event: {event}\n"
+    if event_id is not None:
+        out += f"id: {event_id}\n"
+    return out + f"data: {json.dumps(data)}\n\n"
@@ -0,0 +1,112 @@
+"""
+Write-through, process-local cache of active games.
+
+Routes read immutable `GameSnapshot`s instead of loading the whole Game
+row (spy note included) into the session on every request.  Every committed
+change goes through `game_cache.put(game)` (events.publish_update does it
+for send, join_game and run_turn); finished games are dropped rather than
+cached.
+
+Hits are served from memory.  When other processes write games too
+(CROSS_PROCESS), the change feed drops their games from the cache
+(changefeed.py); entries also expire after GAME_CACHE_TTL.
+"""
+import datetime as dt
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from flask import abort
+
+from config import GAME_CACHE_SIZE, GAME_CACHE_TTL
+from db import db
+from models import Game, GameStatus
+
+FINISHED = {GameStatus.WIN, GameStatus.LOSE}
+
+
+@dataclass(frozen=True)
+class GameSnapshot:
+    id: str
+    player1_secret: str
+    player2_secret: str
+    status: GameStatus
+    turns: int
+    p1_guessed: bool
+    p2_guessed: bool
+    created: dt.datetime
+
+    @classmethod
+    def from_game(cls, game: Game) -> "GameSnapshot":
+        return cls(game.id, game.player1_secret, game.player2_secret,
+                   game.status, game.turns, bool(game.p1_guessed),
+                   bool(game.p2_guessed), game.created)
+
+
+class GameCache:
+    def __init__(self, maxsize: int = GAME_CACHE_SIZE, ttl: float = GAME_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, GameSnapshot]] = OrderedDict()
+
+    def get(self, game_id: str):
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[game_id]
+                return None
+            self._entries.move_to_end(game_id)
+            return entry[1]
+
+    def _store(self, snap: GameSnapshot, overwrite: bool) -> None:
+        with self._lock:
+            if snap.status in FINISHED:
+                self._entries.pop(snap.id, None)
+                return
+            if not overwrite and snap.id in self._entries:
+                return
+            self._entries[snap.id] = (time.monotonic(), snap)
+            self._entries.move_to_end(snap.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def put(self, game) -> GameSnapshot:
+        """Write-through after a commit that changed `game` (a Game or a
+        GameSnapshot)."""
+        snap = game if isinstance(game, GameSnapshot) else GameSnapshot.from_game(game)
+        self._store(snap, overwrite=True)
+        return snap
+
+    def load(self, game_id: str):
+        """Snapshot from the cache, falling back to loading the game."""
+        snap = self.get(game_id)
+        if snap is not None:
+            return snap
+        game = db.session.get(Game, game_id)
+        if game is None:
+            return None
+        snap = GameSnapshot.from_game(game)
+        # never clobber a write-through that landed while we were reading
+        self._store(snap, overwrite=False)
+        return snap
+
+    def invalidate(self, game_id: str) -> None:
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+game_cache = GameCache()
+
+
+def get_game_or_404(game_id: str) -> GameSnapshot:
+    snap = game_cache.load(game_id)
+    if snap is None:
+        abort(404)
+    return snap
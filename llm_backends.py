@@ -0,0 +1,265 @@
+"""
+LLM providers behind ai.py.
+
+`get_backend()` returns the process-wide backend picked by LLM_BACKEND:
+  * OpenAIBackend – one pooled keep-alive HTTP client per process, explicit
+    timeouts, retries with full-jitter exponential backoff
+  * FakeBackend   – deterministic offline answers with a configurable latency
+    distribution, for tests and load tests (LLM_BACKEND=fake only)
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+from config import (LLM_BACKEND, OPENAI_API_KEY, OPENAI_BASE_URL, LLM_TIMEOUT,
+                    LLM_CONNECT_TIMEOUT, LLM_MAX_RETRIES, LLM_BACKOFF_BASE,
+                    LLM_BACKOFF_MAX, LLM_POOL_SIZE, FAKE_LLM_LATENCY, FAKE_LLM_SEED)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Completion:
+    texts: list[str] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0      # prompt tokens served from the provider's prefix cache
+
+    @property
+    def text(self) -> str:
+        return self.texts[0] if self.texts else ""
+
+
+def _cached_tokens(usage) -> int:
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+
+class LLMBackend:
+    name = "base"
+
+    def complete(self, model: str, messages: list[dict[str, str]], max_tokens: int,
+                 temperature: float, n: int = 1, stop_when=None, **extra) -> Completion:
+        """
+        `n` samples in one request.  With `stop_when`, the backend may stop
+        once `stop_when(finished_texts)` is true and return fewer samples.
+        """
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self, api_key: str = OPENAI_API_KEY, base_url: str = OPENAI_BASE_URL,
+                 timeout: float = LLM_TIMEOUT, connect_timeout: float = LLM_CONNECT_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, backoff_base: float = LLM_BACKOFF_BASE,
+                 backoff_max: float = LLM_BACKOFF_MAX, pool_size: int = LLM_POOL_SIZE):
+        # Imported here so processes that never call the API don't pay for it
+        import httpx
+        import openai
+
+        self._openai = openai
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._retryable = (openai.APITimeoutError, openai.APIConnectionError,
+                           openai.RateLimitError, openai.InternalServerError)
+        http_client = httpx.Client(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size),
+        )
+        # Retries are ours (below), so the SDK's own are off
+        self._client = openai.OpenAI(api_key=api_key, base_url=base_url,
+                                     max_retries=0, http_client=http_client)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def complete(self, model, messages, max_tokens, temperature, n=1, stop_when=None,
+                 **extra):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if stop_when is not None and n > 1:
+                    return self._stream_samples(model, messages, max_tokens,
+                                                temperature, n, stop_when, **extra)
+                rsp = self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    n=n,
+                    **extra,
+                )
+                break
+            except self._retryable as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"[llm] {type(e).__name__} from {model}, "
+                               f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+        usage = rsp.usage
+        return Completion(
+            texts=[c.message.content or "" for c in rsp.choices],
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            cached_tokens=_cached_tokens(usage),
+        )
+
+    def _stream_samples(self, model, messages, max_tokens, temperature, n, stop_when,
+                        **extra) -> Completion:
+        """Stream all `n` choices and hang up as soon as `stop_when` is
+        satisfied by the finished ones; the rest are never generated."""
+        stream = self._client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            n=n,
+            stream=True,
+            stream_options={"include_usage": True},
+            **extra,
+        )
+        parts = [[] for _ in range(n)]
+        finished: list[str] = []
+        usage = None
+        try:
+            for chunk in stream:
+                usage = chunk.usage or usage
+                for choice in chunk.choices:
+                    if choice.delta and choice.delta.content:
+                        parts[choice.index].append(choice.delta.content)
+                    if choice.finish_reason:
+                        finished.append("".join(parts[choice.index]))
+                if len(finished) < n and finished and stop_when(finished):
+                    break
+        finally:
+            stream.close()
+
+        if usage is not None:
+            return Completion(texts=finished, prompt_tokens=usage.prompt_tokens,
+                              completion_tokens=usage.completion_tokens,
+                              cached_tokens=_cached_tokens(usage))
+        # stopped before the usage chunk: estimate
+        return Completion(
+            texts=finished,
+            prompt_tokens=sum(len(m["content"]) for m in messages) // 4,
+            completion_tokens=sum(len("".join(p)) for p in parts) // 4,
+        )
+
+
+def parse_latency(spec: str):
+    """'fixed:0.2' / 'uniform:0.1:0.5' / 'normal:0.4:0.1' / 'lognormal:-1:0.5'
+    -> callable(rng) returning a non-negative delay in seconds."""
+    kind, *args = spec.split(":")
+    args = [float(a) for a in args]
+    dists = {
+        "fixed": lambda rng: args[0],
+        "uniform": lambda rng: rng.uniform(args[0], args[1]),
+        "normal": lambda rng: rng.gauss(args[0], args[1]),
+        "lognormal": lambda rng: rng.lognormvariate(args[0], args[1]),
+    }
+    if kind not in dists:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    sample = dists[kind]
+    return lambda rng: max(0.0, sample(rng))
+
+
+class FakeBackend(LLMBackend):
+    """
+    Offline stand-in for the OpenAI API.  Answers are a pure function of the
+    request (same prompt -> same note/guess); only latency is random.
+    """
+    name = "fake"
+    WORD_RE = re.compile(r"[A-Za-z]{3,}")
+    SUSPECTS_RE = re.compile(r"Suspects: ([a-z, ]+)")
+
+    def __init__(self, latency: str = FAKE_LLM_LATENCY, seed: int = FAKE_LLM_SEED):
+        self._latency = parse_latency(latency)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.seed = seed
+
+    def _evidence(self, messages) -> tuple[list[str], list[str]]:
+        """(words in the conversation, suspects carried in an earlier fake note)"""
+        said = " ".join(m["content"] for m in messages if m["role"] != "system")
+        noted = " ".join(self.SUSPECTS_RE.findall(
+            " ".join(m["content"] for m in messages)))
+        said = self.SUSPECTS_RE.sub(" ", said)
+        return ([w.lower() for w in self.WORD_RE.findall(said)],
+                self.WORD_RE.findall(noted))
+
+    def _pick(self, words: list[str], key: str) -> str:
+        h = hashlib.sha256(f"{self.seed}:{key}".encode("utf-8")).digest()
+        return words[int.from_bytes(h[:8], "big") % len(words)]
+
+    def complete(self, model, messages, max_tokens, temperature, n=1, stop_when=None,
+                 **extra):
+        with self._rng_lock:
+            delay = self._latency(self._rng)
+        if delay:
+            time.sleep(delay)
+
+        key = json.dumps([model, messages, max_tokens, temperature], sort_keys=True)
+        words, suspects = self._evidence(messages)
+        note = ("Suspects: " + ", ".join(sorted(set(words + suspects))[:12]))[:300]
+        texts = []
+        for i in range(n):
+            guess = self._pick(suspects or words or ["unknown"], f"{key}:guess:{i}")
+            if (extra.get("response_format") or {}).get("type") == "json_object":
+                texts.append(json.dumps({"note": note, "guess": guess}))
+            elif max_tokens <= 10:
+                texts.append(guess)
+            else:
+                texts.append(note)
+            if stop_when is not None and len(texts) < n and stop_when(texts):
+                break
+
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return Completion(texts=texts, prompt_tokens=prompt_tokens,
+                          completion_tokens=sum(len(t) for t in texts) // 4)
+
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "fake": FakeBackend,
+}
+
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> LLMBackend:
+    """Process-wide backend; rebuilt after fork so pooled connections are
+    never shared between processes.  Raises RuntimeError when LLM_BACKEND
+    is unknown or is openai without OPENAI_API_KEY: the fake backend is
+    never picked unless asked for."""
+    global _backend, _backend_pid
+    if _backend is None or _backend_pid != os.getpid():
+        with _backend_lock:
+            if _backend is None or _backend_pid != os.getpid():
+                if LLM_BACKEND not in BACKENDS:
+                    raise RuntimeError(f"Unknown LLM_BACKEND {LLM_BACKEND!r} "
+                                       f"(expected one of {', '.join(BACKENDS)})")
+                if LLM_BACKEND == "openai" and not OPENAI_API_KEY:
+                    raise RuntimeError("LLM_BACKEND=openai needs OPENAI_API_KEY "
+                                       "(LLM_BACKEND=fake for offline tests and benchmarks)")
+                _backend = BACKENDS[LLM_BACKEND]()
+                _backend_pid = os.getpid()
+    return _backend
+
+
+def set_backend(backend: LLMBackend) -> None:
+    global _backend, _backend_pid
+    with _backend_lock:
+        _backend = backend
+        _backend_pid = os.getpid()
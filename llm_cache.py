@@ -0,0 +1,122 @@
+"""
+Content-addressed cache for LLM completions.
+
+Keys are SHA-256 hashes of the normalized request (model, messages and
+sampling parameters).  Entries live in a size/TTL-bounded in-memory LRU and,
+when LLM_CACHE_PATH is set, in a SQLite file so runs can be recorded once and
+replayed without network access (LLM_CACHE_REPLAY_ONLY=1).
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import (LLM_CACHE_ENABLED, LLM_CACHE_SIZE, LLM_CACHE_TTL,
+                    LLM_CACHE_PATH, LLM_CACHE_REPLAY_ONLY)
+
+
+class CacheMiss(LookupError):
+    """Raised in replay-only mode when a request was never recorded."""
+
+
+def request_key(model: str, messages: list[dict[str, str]], **params) -> str:
+    normalized = {
+        "model": model,
+        "messages": [{"role": m["role"], "content": " ".join(m["content"].split())}
+                     for m in messages],
+        "params": {k: v for k, v in params.items() if v is not None},
+    }
+    blob = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, maxsize: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL,
+                 path: str = LLM_CACHE_PATH, replay_only: bool = LLM_CACHE_REPLAY_ONLY):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.replay_only = replay_only
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache ("
+                             "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                             "created REAL NOT NULL)")
+            self._db.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM llm_cache "
+                                       "WHERE key = ?", (key,)).fetchone()
+                # recorded entries don't expire in replay-only mode
+                if row and (self.replay_only or now - row[1] < self.ttl):
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+        if self.replay_only:
+            raise CacheMiss(key)
+        return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)",
+                                 (key, value, now))
+                self._db.commit()
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.disk_hits = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "disk_hits": self.disk_hits, "size": len(self._entries)}
+
+
+cache = LLMCache() if LLM_CACHE_ENABLED else None
+
+
+def cached_call(model: str, messages: list[dict[str, str]], call, use_cache: bool = True,
+                accept=None, **params) -> str:
+    """Return the cached text for this request or compute it with `call()`.
+    With `accept`, only texts for which `accept(text)` is true are cached."""
+    if cache is None or not use_cache:
+        return call()
+    key = request_key(model, messages, **params)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    value = call()
+    if accept is None or accept(value):
+        cache.put(key, value)
+    return value
@@ -1,12 +1,26 @@
+import contextvars
 import datetime
-import json
-import os
+import functools
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
 from models import Game, Msg, GameStatus, AgentState, Replay
-from config import AGENTS, MAX_TURNS, HISTORY_WINDOW, MAX_NOTE_LENGTH
+from config import (AGENTS, MAX_TURNS, HISTORY_WINDOW, MAX_NOTE_LENGTH, AGENT_WORKERS,
+                    SPECULATION_CACHE_SIZE, TURN_CLAIM_TIMEOUT)
 from db import db
-from ai import update_agent_note, generate_guess
+from ai import (update_agent_note, generate_guess_votes, generate_note_and_guess,
+                current_agent, track_usage)
+from context import build_context, game_history
+from scheduler import request_priority
+from cascade import run_cascade, mark_hits, current_turn
+from admission import admission
+import metrics
+import time
+from events import publish_update
+from sqlalchemy import update, or_, case, literal
 from sqlalchemy.exc import SQLAlchemyError
 
 from models import Replay
@@ -15,8 +29,6 @@ from models import Replay
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-REPLAY_DIR = "./replay_logs"
-os.makedirs(REPLAY_DIR, exist_ok=True)
 
 
 def get_note(game: Game, agent_type: str) -> str:
@@ -35,6 +47,47 @@ def get_agent_state(game_id, agent_name):
     return AgentState.query.filter_by(game_id=game_id, agent_name=agent_name).first()
 
 
+@dataclass
+class TurnContext:
+    p1_msgs: list
+    p2_msgs: list
+    states: dict   # agent_name -> AgentState
+
+
+def load_turn_context(game: Game, with_states: bool = False) -> TurnContext:
+    """
+    Everything a turn reads, in two queries: the pending player messages
+    (both senders at once) and all agent states for the game.  Agent states
+    are only fetched once both players have something pending, unless
+    `with_states` asks for them anyway (speculation).
+    """
+    pending = Msg.query.filter_by(
+        game_id=game.id, role='Player', used=False
+    ).order_by(Msg.id.asc()).all()
+    p1_msgs = [m for m in pending if m.sender == 'player1']
+    p2_msgs = [m for m in pending if m.sender == 'player2']
+
+    states = {}
+    if (p1_msgs and p2_msgs) or with_states:
+        states = {s.agent_name: s
+                  for s in AgentState.query.filter_by(game_id=game.id)}
+    return TurnContext(p1_msgs, p2_msgs, states)
+
+
+def history_lines(sender: str, msgs: list) -> list[dict[str, str]]:
+    label = "Player1" if sender == "player1" else "Player2"
+    return [{"role": "user", "content": f"{label}: {m.text}"} for m in msgs]
+
+
+def load_game_history(game_id: str, limit: int = HISTORY_WINDOW) -> list[dict[str, str]]:
+    """The last `limit` player messages of earlier turns, oldest first."""
+    if limit <= 0:
+        return []
+    msgs = (Msg.query.filter_by(game_id=game_id, role='Player', used=True)
+            .order_by(Msg.id.desc()).limit(limit).all())
+    return [line for m in reversed(msgs) for line in history_lines(m.sender, [m])]
+
+
 def create_agent_state(game_id, agent):
     logger.info(
         f"Creating AgentState for game_id={game_id}, agent={agent['name']}")
@@ -56,18 +109,26 @@ def set_note(state, new_note):
 def save_replay(game: Game,
                 turn_lines: list[dict],
                 agent_replies: dict,
-                agent_guesses: dict) -> None:
+                agent_guesses: dict,
+                states: dict,
+                agent_votes: dict = None,
+                agent_cascades: dict = None,
+                agent_usage: dict = None) -> None:
     # build the same dict you already had
     agents_blob = {}
     for agent in AGENTS:
         name = agent["name"]
-        state = AgentState.query.filter_by(game_id=game.id,
-                                           agent_name=name).first()
+        state = states[name]
         agents_blob[name] = {
             "note": state.note,
             "reply": agent_replies.get(name),
             "guess": agent_guesses.get(name),
+            "votes": (agent_votes or {}).get(name),
         }
+        if (agent_cascades or {}).get(name):
+            agents_blob[name]["cascade"] = agent_cascades[name]
+        if (agent_usage or {}).get(name):
+            agents_blob[name]["usage"] = agent_usage[name]
 
     db.session.add(
         Replay(
@@ -79,14 +140,266 @@ def save_replay(game: Game,
         )
     )
     db.session.commit()
+
+
+# --- Agent pipeline ---
+
+
+@dataclass
+class AgentStep:
+    note: str
+    guess: str
+    votes: dict = field(default_factory=dict)   # guess -> samples; {} when not voted
+    cascade: dict = None                        # cascade.run_cascade record, if any
+    usage: dict = None                          # ai.track_usage totals of the step
+
+
+def tracks_usage(step):
+    """Fill in the AgentStep's `usage` with the LLM calls `step` made."""
+    @functools.wraps(step)
+    def wrapper(*args, **kwargs):
+        with track_usage() as usage:
+            result = step(*args, **kwargs)
+        result.usage = dict(usage)
+        return result
+    return wrapper
+
+
+def guess_step(agent: dict, note: str, cache: bool) -> tuple[str, dict, dict]:
+    """Guess from `note`: a single vote from the agent's model, or its
+    "cascade" of tiers.  Returns (guess, votes, cascade record or None)."""
+    guess_prompt, context = build_context(agent["guess_prompt"], note, [], history=False)
+    if agent.get("cascade"):
+        return run_cascade(agent["cascade"], note, guess_prompt, cache=cache,
+                           history=context)
+    return (*generate_guess_votes(agent["model"], guess_prompt, cache=cache,
+                                  history=context), None)
+
+
+@tracks_usage
+def run_agent_pipeline(agent: dict, note: str,
+                       recent_history: list[dict[str, str]]) -> AgentStep:
+    """
+    Note update followed by guess for a single agent (one fused call when the
+    agent has "fused" set).  Pure LLM work: no DB access here, so it is safe
+    to run from a worker thread.
+    """
+    name = agent["name"]
+    model = agent["model"]
+    use_cache = agent.get("cache", False)
+    logger.info(f"[run_turn] Processing agent: {name}")
+    current_agent.set(name)
+
+    if agent.get("fused"):
+        fused_prompt, messages = build_context(agent["fused_prompt"], note, recent_history)
+        try:
+            return AgentStep(*generate_note_and_guess(model, fused_prompt, messages,
+                                                      cache=use_cache))
+        except ValueError as e:
+            logger.warning(
+                f"[run_turn] Fused step failed for {name}, using two calls: {e}")
+
+    note_prompt, messages = build_context(agent["note_prompt"], note, recent_history)
+    updated_note = update_agent_note(model, note_prompt, messages, cache=use_cache)
+
+    # # Generate reply
+    # reply_prompt = agent["reply_prompt"].format(note=updated_note)
+    # reply = generate_agent_reply(model, reply_prompt, recent_history)
+
+    return AgentStep(updated_note, *guess_step(
+        agent, updated_note.strip()[:MAX_NOTE_LENGTH], use_cache))
+
+
+def speculate_note(agent: dict, note: str,
+                   history: list[dict[str, str]]) -> str:
+    """Note update only, from one player's messages (see speculate_notes)."""
+    current_agent.set(agent["name"])
+    note_prompt, messages = build_context(agent["note_prompt"], note, history)
+    return update_agent_note(agent["model"], note_prompt, messages,
+                             cache=agent.get("cache", False)).strip()[:MAX_NOTE_LENGTH]
+
+
+@tracks_usage
+def run_delta_pipeline(agent: dict, note: str,
+                       delta_history: list[dict[str, str]]) -> AgentStep:
+    """
+    Turn step after a speculation hit: `note` already holds one player's
+    messages.  The guess reads that note plus the other player's raw
+    messages, so it does not wait for the delta note update – both calls
+    go out together, one round-trip instead of two.
+    """
+    if agent.get("fused"):
+        return run_agent_pipeline(agent, note, delta_history)
+
+    name = agent["name"]
+    model = agent["model"]
+    use_cache = agent.get("cache", False)
+    logger.info(f"[run_turn] Processing agent from speculation: {name}")
+    current_agent.set(name)
+
+    note_prompt, messages = build_context(agent["note_prompt"], note, delta_history)
+    guess_note = "\n".join([note.strip()[:MAX_NOTE_LENGTH]] +
+                           [m["content"] for m in delta_history])
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent") as pool:
+        f_note = pool.submit(contextvars.copy_context().run, update_agent_note,
+                             model, note_prompt, messages, cache=use_cache)
+        f_guess = pool.submit(contextvars.copy_context().run, guess_step,
+                              agent, guess_note, use_cache)
+        return AgentStep(f_note.result(), *f_guess.result())
+
+
+def run_agents_concurrently(jobs: list[tuple]) -> dict:
+    """
+    Run every `(step, agent, note, history)` job as `step(agent, note,
+    history)` in parallel and return {agent_name: result} once all of them
+    have finished.  Each job runs in a copy of the caller's context
+    (scheduler priority, usage tracking).
+    """
+    if len(jobs) == 1:
+        step, agent, note, history = jobs[0]
+        return {agent["name"]: step(agent, note, history)}
+
+    workers = min(len(jobs), AGENT_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix="agent") as pool:
+        futures = {
+            agent["name"]: pool.submit(contextvars.copy_context().run,
+                                       step, agent, note, history)
+            for step, agent, note, history in jobs
+        }
+        return {name: f.result() for name, f in futures.items()}
+
+
+# --- Speculative notes ---
+#
+# While only one player has pending messages the worker already folds them
+# into each agent's note, in memory.  When the other player's messages
+# arrive the turn only has to apply that delta and guess.  A speculation is
+# used only if it was built from exactly the messages still pending for that
+# player and from the note currently stored.
+
+
+@dataclass
+class Speculation:
+    sender: str
+    msg_ids: tuple
+    base_note: str
+    note: str
+
+
+_speculations: "OrderedDict[tuple[str, str], Speculation]" = OrderedDict()
+_spec_lock = threading.Lock()
+
+
+def _store_speculation(game_id: str, agent_name: str, spec: Speculation) -> None:
+    with _spec_lock:
+        _speculations[(game_id, agent_name)] = spec
+        _speculations.move_to_end((game_id, agent_name))
+        while len(_speculations) > SPECULATION_CACHE_SIZE:
+            _speculations.popitem(last=False)
+
+
+def take_speculation(game_id: str, agent_name: str, pending: dict, base_note: str):
+    """
+    Pop the speculation for this agent and return it if it still matches:
+    same base note and exactly the messages pending ({sender: msgs}) for the
+    player it was built from.
+    """
+    with _spec_lock:
+        spec = _speculations.pop((game_id, agent_name), None)
+    if spec is None:
+        return None
+    msgs = pending.get(spec.sender, [])
+    if spec.base_note != base_note or spec.msg_ids != tuple(m.id for m in msgs):
+        metrics.speculative_notes.inc(result="discarded")
+        return None
+    metrics.speculative_notes.inc(result="hit")
+    return spec
+
+
+def discard_speculations(game_id: str) -> None:
+    with _spec_lock:
+        for agent in AGENTS:
+            _speculations.pop((game_id, agent["name"]), None)
+
+
+def speculate_notes(game_id: str, sender: str, msgs: list, notes: dict) -> None:
+    """Fold `sender`'s pending messages into every agent's note, in memory."""
+    ids = tuple(m.id for m in msgs)
+    jobs = []
+    for agent in AGENTS:
+        base = notes.get(agent["name"]) or ""
+        with _spec_lock:
+            spec = _speculations.get((game_id, agent["name"]))
+        if spec and spec.sender == sender and spec.msg_ids == ids and spec.base_note == base:
+            continue
+        jobs.append((speculate_note, agent, base, history_lines(sender, msgs)))
+    if not jobs:
+        return
+
+    logger.info(f"[speculate] game_id={game_id}: {len(msgs)} msgs from {sender}")
+    results = run_agents_concurrently(jobs)
+    for _, agent, base, _ in jobs:
+        _store_speculation(game_id, agent["name"],
+                           Speculation(sender, ids, base, results[agent["name"]]))
+
+
 # --- Full turn engine ---
 
 
-def run_turn(game: Game) -> None:
-    logger.info(f"[run_turn] Checking game_id={game.id}, turn={game.turns}")
+def claim_turn(game_id: str, version: int) -> bool:
+    """
+    Take the turn lease on `game_id` if it is still at `version` and nobody
+    holds a live lease: one conditional UPDATE, atomic on SQLite and
+    Postgres alike, so exactly one worker (thread or process) wins.
+    Must be the first statement of its transaction – on SQLite that makes
+    it take the write lock directly instead of upgrading a read lock.
+    """
+    now = datetime.datetime.utcnow()
+    stale = now - datetime.timedelta(seconds=TURN_CLAIM_TIMEOUT)
+    res = db.session.execute(
+        update(Game)
+        .where(Game.id == game_id, Game.version == version,
+               or_(Game.claimed_at.is_(None), Game.claimed_at < stale))
+        .values(version=Game.version + 1, claimed_at=now))
+    return res.rowcount == 1
+
+
+def release_claim(game_id: str, claimed: int) -> None:
+    """Give the lease back after a failed turn so the next worker can retry
+    straight away instead of waiting for TURN_CLAIM_TIMEOUT."""
     try:
-        db.session.begin_nested()
+        db.session.rollback()
+        db.session.execute(
+            update(Game)
+            .where(Game.id == game_id, Game.version == claimed)
+            .values(version=Game.version + 1, claimed_at=None))
+        db.session.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"[run_turn] Could not release claim on {game_id}: {e}")
+        db.session.rollback()
+
 
+def run_turn(game: Game, speculate: bool = False) -> None:
+    """
+    Play one turn if both players have pending messages.
+
+    Safe to call from any number of threads and processes at once:
+      1. read the pending messages and the game version (no locks held)
+      2. claim the turn (claim_turn) and create missing agent states
+      3. LLM calls, outside any transaction
+      4. apply: mark exactly the messages read in 1 as used, write notes
+         and agent messages, bump turns and release the lease – all
+         conditional on still holding the claim
+
+    With `speculate` (background workers) a one-sided turn pre-computes the
+    agents' notes from the messages that are there, outside any transaction.
+    """
+    logger.info(f"[run_turn] Checking game_id={game.id}, turn={game.turns}")
+    game_id = game.id
+    claimed = None
+    in_flight = False
+    try:
         if game.status not in {GameStatus.PLAY, GameStatus.PARTIAL}:
             logger.warning(f"[run_turn] Game not in PLAY: {game.status}")
             return
@@ -95,114 +408,180 @@ def run_turn(game: Game) -> None:
             logger.info(f"[run_turn] Max turns hit, marking LOSE")
             game.status = GameStatus.LOSE
             db.session.commit()
+            publish_update(game)
+            discard_speculations(game_id)
             return
 
-        p1_msgs = Msg.query.filter_by(
-            game_id=game.id, sender='player1', role='Player', used=False
-        ).order_by(Msg.id.asc()).all()
-
-        p2_msgs = Msg.query.filter_by(
-            game_id=game.id, sender='player2', role='Player', used=False
-        ).order_by(Msg.id.asc()).all()
+        t_start = time.perf_counter()
+        version, turns = game.version, game.turns
+        secrets = {game.player1_secret, game.player2_secret}
+        ctx = load_turn_context(game, with_states=speculate)
+        p1_msgs, p2_msgs = ctx.p1_msgs, ctx.p2_msgs
+        notes = {name: state.note or "" for name, state in ctx.states.items()}
 
         if not p1_msgs or not p2_msgs:
             logger.info(
                 f"[run_turn] Incomplete: P1={len(p1_msgs)}, P2={len(p2_msgs)}")
+            speculating = speculate and (p1_msgs or p2_msgs)
+            if speculating:
+                game_history.set(load_game_history(game_id))
             db.session.rollback()
+            if speculating:
+                sender, msgs = (("player1", p1_msgs) if p1_msgs
+                                else ("player2", p2_msgs))
+                speculate_notes(game_id, sender, msgs, notes)
             return  # Wait for both
         print(f"P1 {p1_msgs}\nP2 {p2_msgs}")
-        # Mark all as used
-        for m in p1_msgs + p2_msgs:
-            m.used = True
-
-        logger.info(
-            f"[run_turn] Consuming P1: {len(p1_msgs)} P2: {len(p2_msgs)}")
 
+        msg_ids = [m.id for m in p1_msgs + p2_msgs]
         # Combine for this turn's context
         turn_lines = [
             {"sender": "player1", "text": m.text} for m in p1_msgs
         ] + [
             {"sender": "player2", "text": m.text} for m in p2_msgs
         ]
+        recent_history = (history_lines("player1", p1_msgs) +
+                          history_lines("player2", p2_msgs))
+        pending = {"player1": p1_msgs, "player2": p2_msgs}
+        game_history.set(load_game_history(game_id))
+        db.session.rollback()   # end the read transaction before writing
 
-        msgs = Msg.query.filter_by(game_id=game.id).order_by(
-            Msg.id.desc()).limit(HISTORY_WINDOW).all()
-        msgs.reverse()
+        if not claim_turn(game_id, version):
+            db.session.rollback()
+            logger.info(f"[run_turn] Turn for {game_id} taken by another worker")
+            return
+        claimed = version + 1
+        admission.turn_started()
+        in_flight = True
+        for agent in AGENTS:
+            if agent["name"] not in notes:
+                logger.info(f"No state found for {agent['name']}. Creating new state.")
+                create_agent_state(game_id, agent)
+        db.session.commit()
+        logger.info(
+            f"[run_turn] Claimed turn {turns} of {game_id}: "
+            f"P1: {len(p1_msgs)} P2: {len(p2_msgs)}")
 
-        recent_history = (
-            [{"role": "user", "content": f"Player1: {m.text}"} for m in p1_msgs] +
-            [{"role": "user", "content": f"Player2: {m.text}"}
-                for m in p2_msgs]
-        )
+        # A valid speculation already holds one player's messages: only the
+        # other player's are left to fold in
+        jobs = []
+        for agent in AGENTS:
+            note = notes.get(agent["name"], "")
+            spec = take_speculation(game_id, agent["name"], pending, note)
+            if spec is None:
+                jobs.append((run_agent_pipeline, agent, note, recent_history))
+            else:
+                other = "player2" if spec.sender == "player1" else "player1"
+                jobs.append((run_delta_pipeline, agent, spec.note,
+                             history_lines(other, pending[other])))
+
+        # LLM calls only – each agent's note -> guess pipeline runs in parallel;
+        # games near MAX_TURNS get ahead in the scheduler queue
+        request_priority.set(turns / MAX_TURNS)
+        current_turn.set(turns + 1)
+        t_llm = time.perf_counter()
+        results = run_agents_concurrently(jobs)
+        t_llm_done = time.perf_counter()
+
+        # Apply – starts with a write so SQLite takes the write lock up front
+        used = db.session.execute(
+            update(Msg)
+            .where(Msg.id.in_(msg_ids), Msg.used.is_(False))
+            .values(used=True))
+        if used.rowcount != len(msg_ids):
+            logger.warning(f"[run_turn] Messages of {game_id} consumed elsewhere, "
+                           f"dropping turn")
+            db.session.rollback()
+            return
 
         agent_replies = {}
         agent_guesses = {}
+        agent_votes = {}
+        agent_cascades = {}
+        agent_usage = {}
+        agent_msgs = []
+        states = {s.agent_name: s for s in AgentState.query.filter_by(game_id=game_id)}
 
+        # Single deterministic flush, in AGENTS order
         for agent in AGENTS:
             name = agent["name"]
-            model = agent["model"]
-            logger.info(f"[run_turn] Processing agent: {name}")
-
-            # Load or create state
-            state = get_agent_state(game.id, name)
-            if not state:
-                logger.info(f"No state found for {name}. Creating new state.")
-                state = create_agent_state(game.id, agent)
-                db.session.flush()
-
-            # Update note
-            note_prompt = agent["note_prompt"].format(note=state.note)
-            updated_note = update_agent_note(
-                model, note_prompt, recent_history)
+            step = results[name]
+            updated_note, guess = step.note, step.guess
             logger.info(
                 f"Updated note for {name}: {updated_note.strip()[:MAX_NOTE_LENGTH]}")
-            set_note(state, updated_note)
-            db.session.flush()
-
-            # # Generate reply
-            # reply_prompt = agent["reply_prompt"].format(note=state.note)
-            # reply = generate_agent_reply(model, reply_prompt, recent_history)
-            # logger.info(f"Generated reply for {name}: {reply}")
-            # db.session.add(Msg(game_id=game.id, role=name, text=reply))
-            # db.session.flush()
-            # agent_replies[name] = reply
-
-            # Generate guess
-            guess_prompt = agent["guess_prompt"].format(note=state.note)
-            guess = generate_guess(model, guess_prompt)
             logger.info(f"Generated guess for {name}: {guess}")
-            db.session.add(Msg(game_id=game.id, role=name, text=updated_note.strip()[
-                           :MAX_NOTE_LENGTH], guess=guess))
-            db.session.flush()
+            set_note(states[name], updated_note)
+            agent_msg = Msg(game_id=game_id, role=name, text=updated_note.strip()[
+                :MAX_NOTE_LENGTH], guess=guess)
+            db.session.add(agent_msg)
+            agent_msgs.append(agent_msg)
             agent_guesses[name] = guess
+            agent_votes[name] = step.votes
+            agent_usage[name] = step.usage
+            if step.cascade:
+                mark_hits(step.cascade, secrets)
+                agent_cascades[name] = step.cascade
+        db.session.flush()
 
         # Evaluate guesses
+        values = {"turns": Game.turns + 1, "version": Game.version + 1,
+                  "claimed_at": None}
         for agent in AGENTS:
             guess = agent_guesses.get(agent["name"])
             logger.info(f"Evaluating guess for {agent['name']}: {guess}")
-            if guess == game.player1_secret or guess == game.player2_secret:
+            if guess in secrets:
                 if agent["type"] == "spy":
                     logger.info(
-                        f"ZaZ guessed the secret {guess}! Marking game {game.id} as LOSE.")
-                    game.status = GameStatus.LOSE
+                        f"ZaZ guessed the secret {guess}! Marking game {game_id} as LOSE.")
+                    # unless the players won while the agents were thinking
+                    values["status"] = case(
+                        (Game.status.in_([GameStatus.PLAY, GameStatus.PARTIAL]),
+                         literal(GameStatus.LOSE, Game.status.type)),
+                        else_=Game.status)
                     break
                 # elif agent["type"] == "comrade":
                 #     logger.info(f"Comrade guessed the secret! Marking game {game.id} as WIN.")
                 #     game.status = GameStatus.WIN
                 #     break
 
-        game.turns += 1
-        logger.info(f"Incremented turns. New turn count: {game.turns}")
-        db.session.flush()
+        res = db.session.execute(
+            update(Game)
+            .where(Game.id == game_id, Game.version == claimed)
+            .values(**values))
+        if res.rowcount != 1:
+            logger.warning(f"[run_turn] Lost the claim on {game_id}, dropping turn")
+            db.session.rollback()
+            return
         db.session.commit()
+        claimed = None
+        t_committed = time.perf_counter()
+        game = db.session.get(Game, game_id)
+        logger.info(f"Incremented turns. New turn count: {game.turns}")
+        publish_update(game, agent_msgs)
+
+        save_replay(game, turn_lines, agent_replies, agent_guesses, states,
+                    agent_votes, agent_cascades, agent_usage)
+        t_end = time.perf_counter()
 
-        save_replay(game, turn_lines, agent_replies, agent_guesses)
+        metrics.turn_phase_seconds.observe(
+            (t_llm - t_start) + (t_committed - t_llm_done), phase="db")
+        metrics.turn_phase_seconds.observe(t_llm_done - t_llm, phase="llm")
+        metrics.turn_phase_seconds.observe(t_end - t_committed, phase="replay")
+        metrics.turn_seconds.observe(t_end - t_start)
+        admission.record_turn(t_end - t_start)
 
     except SQLAlchemyError as e:
         logger.error(f"Database error: {str(e)}")
         db.session.rollback()
+        if claimed is not None:
+            release_claim(game_id, claimed)
         raise RuntimeError(f"DB failure in run_turn: {str(e)}")
     except Exception as e:
         logger.error(f"Critical error: {str(e)}")
         db.session.rollback()
+        if claimed is not None:
+            release_claim(game_id, claimed)
         raise RuntimeError(f"Critical error in run_turn: {str(e)}")
+    finally:
+        if in_flight:
+            admission.turn_finished()
@@ -0,0 +1,223 @@
+"""
+Minimal Prometheus-style instrumentation, exposed at /metrics.
+
+Hot-path updates are lock-free: every thread writes to its own shard (a
+plain dict reached through threading.local), and `render()` merges the
+shards at scrape time.  The only lock is taken once per thread, to register
+its shard, and by the scraper.  Shards of finished threads are folded into
+a base shard, at scrape time and whenever a new thread registers once more
+than FOLD_AT shards are held, so short-lived pool threads don't pile up
+between scrapes.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# registering a shard folds dead threads' shards once more than this many
+# are held (the bound doubles while most of them belong to live threads)
+FOLD_AT = 64
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: list[tuple[threading.Thread, dict]] = []
+        self._base: dict = {}
+        self._fold_at = FOLD_AT
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                if len(self._shards) >= self._fold_at:
+                    self._fold_dead()
+                    self._fold_at = max(FOLD_AT, 2 * len(self._shards))
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_dead(self) -> None:
+        """Merge the shards of finished threads into the base; needs _lock."""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._merge_into(self._base, dict(shard))
+        self._shards = alive
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _merge_into(self, total: dict, shard: dict) -> None:
+        raise NotImplementedError
+
+    def collect(self) -> dict:
+        with self._lock:
+            self._fold_dead()
+            total: dict = {}
+            self._merge_into(total, self._base)
+            for _, shard in self._shards:
+                # copy first: the owner thread may be adding keys
+                self._merge_into(total, dict(shard))
+        return total
+
+    def _fmt_labels(self, key: tuple, extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += self._render_samples(self.collect())
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merge_into(self, total, shard):
+        for key, value in shard.items():
+            total[key] = total.get(key, 0) + value
+
+    def _render_samples(self, data):
+        return [f"{self.name}{self._fmt_labels(k)} {v}" for k, v in sorted(data.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        row = shard.get(key)
+        if row is None:
+            # per-bucket counts (non-cumulative) + [sum, count]
+            row = shard[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        row[-2] += value
+        row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _merge_into(self, total, shard):
+        for key, row in shard.items():
+            acc = total.setdefault(key, [0] * len(row))
+            for i, v in enumerate(list(row)):
+                acc[i] += v
+
+    def _render_samples(self, data):
+        lines = []
+        for key, row in sorted(data.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = self._fmt_labels(key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = self._fmt_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {row[-1]}")
+            lines.append(f"{self.name}_sum{self._fmt_labels(key)} {row[-2]}")
+            lines.append(f"{self.name}_count{self._fmt_labels(key)} {row[-1]}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value computed at scrape time by `fn() -> {label tuple: value}`."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def collect(self) -> dict:
+        return self.fn() if self.fn else {}
+
+    def _render_samples(self, data):
+        return [f"{self.name}{self._fmt_labels(k)} {v}" for k, v in sorted(data.items())]
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# --- Bypeyes metrics ---
+
+llm_request_seconds = Histogram(
+    "bypeyes_llm_request_seconds", "LLM call latency (cache misses only)",
+    ["agent", "model"])
+llm_prompt_tokens = Counter(
+    "bypeyes_llm_prompt_tokens_total", "Prompt tokens sent", ["agent", "model"])
+llm_cached_prompt_tokens = Counter(
+    "bypeyes_llm_cached_prompt_tokens_total",
+    "Prompt tokens served from the provider's prefix cache", ["agent", "model"])
+llm_completion_tokens = Counter(
+    "bypeyes_llm_completion_tokens_total", "Completion tokens received", ["agent", "model"])
+llm_errors = Counter(
+    "bypeyes_llm_errors_total", "LLM calls that raised", ["agent", "model", "error"])
+llm_queue_wait_seconds = Histogram(
+    "bypeyes_llm_queue_wait_seconds", "Time LLM calls waited in the scheduler", ["model"])
+llm_coalesced = Counter(
+    "bypeyes_llm_coalesced_total", "Identical concurrent LLM calls served by one request",
+    ["model"])
+speculative_notes = Counter(
+    "bypeyes_speculative_notes_total",
+    "Speculative note updates used by a turn (hit) or thrown away (discarded)",
+    ["result"])
+cascade_answers = Counter(
+    "bypeyes_cascade_answers_total",
+    "Cascade guesses by answering tier and why cheaper tiers were passed over",
+    ["tier", "escalation"])
+cascade_tier_guesses = Counter(
+    "bypeyes_cascade_tier_guesses_total", "Guesses of each cascade tier that ran",
+    ["tier", "result"])
+turn_phase_seconds = Histogram(
+    "bypeyes_turn_phase_seconds", "run_turn wall time by phase (db, llm, replay)",
+    ["phase"])
+turn_seconds = Histogram(
+    "bypeyes_turn_seconds", "run_turn wall time for completed turns")
+turn_failures = Counter(
+    "bypeyes_turn_failures_total", "Worker turns that raised, by what happened next",
+    ["action"])
+admission_rejections = Counter(
+    "bypeyes_admission_rejections_total", "Requests answered 429 by admission control",
+    ["route", "reason"])
+poll_requests = Counter(
+    "bypeyes_poll_requests_total",
+    "/poll responses: not_modified (304), empty or messages", ["result"])
@@ -0,0 +1,73 @@
+"""
+Schema upgrades for existing databases.
+
+`db.create_all()` only creates missing tables, so indexes and columns added
+to models later never reach an existing games.db.  `migrate()` is idempotent
+and safe to run on every start.  `init_db()` (also `flask --app app init-db`)
+creates missing tables on every bind first.  New columns must be nullable or have a
+server_default.
+
+    python migrations.py
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(engine) -> list[str]:
+    inspector = inspect(engine)
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} " \
+                  f"{column.type.compile(dialect=engine.dialect)}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+            with engine.begin() as conn:
+                conn.execute(text(ddl))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def create_missing_indexes(engine) -> list[str]:
+    inspector = inspect(engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+    return created
+
+
+def migrate(engine=None) -> None:
+    engine = engine or db.engine
+    for name in add_missing_columns(engine):
+        logger.info(f"[migrate] Added column {name}")
+    for name in create_missing_indexes(engine):
+        logger.info(f"[migrate] Created index {name}")
+
+
+def init_db() -> None:
+    """Create missing tables (all binds) and bring the schema up to date."""
+    db.create_all()
+    migrate()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from app import create_app
+    with create_app({"BACKGROUND_THREADS": False}).app_context():
+        init_db()
@@ -16,12 +16,16 @@ class Game(db.Model):
     id = db.Column(db.String, primary_key=True)
     player1_secret = db.Column(db.String, nullable=False)
     player2_secret = db.Column(db.String, nullable=False, default="")
-    status = db.Column(db.Enum(GameStatus), default=GameStatus.RAMP)
+    status = db.Column(db.Enum(GameStatus), default=GameStatus.RAMP, index=True)
     turns = db.Column(db.Integer, default=0)
     created = db.Column(db.DateTime, default=dt.datetime.utcnow)
     spy_note = db.Column(db.Text, nullable=False, default="")
     p1_guessed = db.Column(db.Boolean, default=False)
     p2_guessed = db.Column(db.Boolean, default=False)
+    # bumped by every turn claim and apply (logic.claim_turn); claimed_at is
+    # the lease of the worker currently running a turn
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    claimed_at = db.Column(db.DateTime, nullable=True)
 
     @validates("player1_secret", "player2_secret")
     def _lowercase(self, key, value: str):
@@ -60,6 +64,13 @@ class Msg(db.Model):
     sender = db.Column(db.String)  # 'player1' or 'player2'
     used = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        # poll / game page: WHERE game_id = ? AND id > ? ORDER BY id
+        db.Index("ix_msg_game_id_id", "game_id", "id"),
+        # turn loader: WHERE game_id = ? AND used = 0
+        db.Index("ix_msg_game_id_used", "game_id", "used"),
+    )
+
 
 class AgentState(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -69,3 +80,55 @@ class AgentState(db.Model):
     note = db.Column(db.Text, nullable=False, default="")
     updated_at = db.Column(
         db.DateTime, default=dt.datetime.utcnow, onupdate=dt.datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_agent_state_game_id_agent_name", "game_id", "agent_name"),
+    )
+
+
+class GameChange(db.Model):
+    """
+    Log of committed game changes for processes that don't share memory
+    (see changefeed.py); old rows are pruned by the feed.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.String, nullable=False)
+    origin = db.Column(db.String, nullable=False)   # writing process
+    ts = db.Column(db.DateTime, default=dt.datetime.utcnow, nullable=False, index=True)
+
+    # never reuse ids once old rows are pruned: followers read id > last seen
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
+# --- Archive (separate DB, see compactor.py) ---
+
+
+class ArchivedGame(db.Model):
+    """
+    A finished game moved out of the hot tables.  Messages and agent states
+    are only needed for analytics, so they travel as JSON; replay rows keep
+    their own table so downloads can still stream them.
+    """
+    __bind_key__ = "archive"
+    id = db.Column(db.String, primary_key=True)
+    player1_secret = db.Column(db.String, nullable=False)
+    player2_secret = db.Column(db.String, nullable=False, default="")
+    status = db.Column(db.Enum(GameStatus), nullable=False)
+    turns = db.Column(db.Integer, default=0)
+    created = db.Column(db.DateTime, index=True)
+    p1_guessed = db.Column(db.Boolean, default=False)
+    p2_guessed = db.Column(db.Boolean, default=False)
+    archived = db.Column(db.DateTime, default=dt.datetime.utcnow)
+    messages = db.Column(db.JSON, nullable=False)
+    agent_states = db.Column(db.JSON, nullable=False)
+
+
+class ArchivedReplay(db.Model):
+    __bind_key__ = "archive"
+    id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.String, index=True)
+    turn = db.Column(db.Integer, nullable=False)
+    ts = db.Column(db.DateTime, nullable=False)
+    turn_lines = db.Column(db.JSON, nullable=False)
+    outcome = db.Column(db.String, nullable=False)
+    agents = db.Column(db.JSON, nullable=False)
@@ -0,0 +1,186 @@
+"""
+Opt-in request profiling.
+
+`ProfilingMiddleware` wraps the WSGI app only when PROFILE_SAMPLE_RATE or
+PROFILE_SLOW_MS is set, so there is no overhead at all when it is off.
+
+  * PROFILE_SAMPLE_RATE – profile this fraction of requests and keep
+                          every one of those profiles
+  * PROFILE_SLOW_MS     – watch every request, keep the profile of those
+                          slower than the threshold
+
+Profiles are collapsed stacks ("frame;frame;frame count" lines, the input
+format of flamegraph.pl / speedscope), kept in a bounded ring buffer that
+/admin/profiles serves, and optionally written to PROFILE_DIR.  "sample"
+mode uses a background stack sampler (real stacks, cheap); "cprofile" mode
+is deterministic but only yields caller;callee pairs.  Timing covers the
+app call itself, so long-lived streams (SSE, replay downloads) don't count
+as slow.
+"""
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from config import (PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_MODE,
+                    PROFILE_INTERVAL_MS, PROFILE_BUFFER_SIZE, PROFILE_DIR)
+
+logger = logging.getLogger(__name__)
+
+recent_profiles: deque = deque(maxlen=PROFILE_BUFFER_SIZE)
+_seq = 0
+_seq_lock = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_frame(frame) -> str:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class StackSampler:
+    """One daemon thread sampling the stacks of registered request threads."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._targets: dict[int, Counter] = {}
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._targets:
+                    continue
+                targets = dict(self._targets)
+            frames = sys._current_frames()
+            for ident, counts in targets.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    counts[collapse_frame(frame)] += 1
+
+    def start(self, ident: int) -> Counter:
+        counts = Counter()
+        with self._lock:
+            self._targets[ident] = counts
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler",
+                                                daemon=True)
+                self._thread.start()
+        return counts
+
+    def stop(self, ident: int) -> None:
+        with self._lock:
+            self._targets.pop(ident, None)
+
+
+def cprofile_collapsed(profile: cProfile.Profile) -> str:
+    """caller;callee pairs weighted by inclusive microseconds."""
+    stats = pstats.Stats(profile).stats
+    lines = []
+    for func, (_, _, _, cumtime, callers) in stats.items():
+        callee = f"{func[2]} ({os.path.basename(func[0])}:{func[1]})"
+        if not callers:
+            lines.append(f"{callee} {int(cumtime * 1e6)}")
+        for caller, (_, _, _, caller_cum) in callers.items():
+            caller_label = f"{caller[2]} ({os.path.basename(caller[0])}:{caller[1]})"
+            lines.append(f"{caller_label};{callee} {int(caller_cum * 1e6)}")
+    return "\n".join(lines) + "\n"
+
+
+def record_profile(environ, duration_ms: float, mode: str, collapsed: str) -> dict:
+    global _seq
+    with _seq_lock:
+        _seq += 1
+        entry = {
+            "id": _seq,
+            "ts": time.time(),
+            "method": environ.get("REQUEST_METHOD"),
+            "path": environ.get("PATH_INFO"),
+            "duration_ms": round(duration_ms, 2),
+            "mode": mode,
+            "collapsed": collapsed,
+        }
+        recent_profiles.append(entry)
+    if PROFILE_DIR:
+        write_profile(entry)
+    return entry
+
+
+def profile_filename(entry: dict) -> str:
+    """Safe, bounded file name: the path comes straight from the client."""
+    path = re.sub(r"[^A-Za-z0-9.-]+", "_", entry["path"] or "")[:100]
+    method = re.sub(r"[^A-Z]+", "", entry["method"] or "")[:10]
+    return f"{entry['id']:06d}_{method}{path}.collapsed"
+
+
+def write_profile(entry: dict) -> None:
+    # runs in the middleware's finally: a full disk must not fail the request
+    try:
+        with open(os.path.join(PROFILE_DIR, profile_filename(entry)), "w") as f:
+            f.write(entry["collapsed"])
+    except OSError as e:
+        logger.warning(f"[profiling] Could not write profile {entry['id']}: {e}")
+
+
+def get_profile(profile_id: int):
+    for entry in list(recent_profiles):
+        if entry["id"] == profile_id:
+            return entry
+    return None
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 slow_ms: float = PROFILE_SLOW_MS, mode: str = PROFILE_MODE,
+                 interval_ms: float = PROFILE_INTERVAL_MS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.mode = mode
+        self.sampler = StackSampler(interval_ms / 1000)
+        if PROFILE_DIR:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    def __call__(self, environ, start_response):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            return self.app(environ, start_response)
+
+        if self.mode == "cprofile" and sampled:
+            profile = cProfile.Profile()
+            t0 = time.perf_counter()
+            profile.enable()
+            try:
+                return self.app(environ, start_response)
+            finally:
+                profile.disable()
+                duration_ms = (time.perf_counter() - t0) * 1000
+                record_profile(environ, duration_ms, "cprofile",
+                               cprofile_collapsed(profile))
+
+        ident = threading.get_ident()
+        counts = self.sampler.start(ident)
+        t0 = time.perf_counter()
+        try:
+            return self.app(environ, start_response)
+        finally:
+            self.sampler.stop(ident)
+            duration_ms = (time.perf_counter() - t0) * 1000
+            slow = self.slow_ms > 0 and duration_ms >= self.slow_ms
+            if sampled or slow:
+                collapsed = "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+                record_profile(environ, duration_ms, "sample", collapsed)
@@ -0,0 +1,234 @@
+"""
+Process-wide scheduler for LLM calls.
+
+Every cache-missing request from ai._chat goes through here instead of
+straight to the backend, so concurrent games share one budget:
+
+  * token buckets per model for requests/minute and tokens/minute
+    (LLM_RPM / LLM_TPM, per-model overrides in LLM_RATE_LIMITS); token
+    estimates are corrected with the real usage once the call returns
+  * at most LLM_MAX_CONCURRENCY calls in flight
+  * a priority queue per model: turns close to MAX_TURNS first, and every
+    LLM_PRIORITY_AGING seconds of waiting is worth +1 priority so nothing
+    starves; the best request whose model is within its limits goes next,
+    so a rate-limited model never holds up the others
+  * a short batch window (LLM_BATCH_WINDOW_MS) so requests arriving
+    together are ordered together; identical cacheable requests queued or
+    in flight at the same time share a single call
+
+Chat completions have no multi-prompt batch endpoint, so "batching" here is
+that ordering window plus coalescing of identical requests.
+"""
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (LLM_MAX_CONCURRENCY, LLM_RPM, LLM_TPM, LLM_RATE_LIMITS,
+                    LLM_BATCH_WINDOW_MS, LLM_PRIORITY_AGING)
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 0.0 (fresh game) .. 1.0 (last turn); set by logic.run_turn
+request_priority = contextvars.ContextVar("request_priority", default=0.0)
+
+
+class TokenBucket:
+    """`per_minute` units per minute with a one-minute burst; 0 = unlimited."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken."""
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        # a request bigger than the bucket goes as soon as it is full
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float) -> None:
+        # may go negative when a call used more than estimated; the debt
+        # delays the next request
+        if self.rate:
+            self.tokens -= amount
+
+
+def estimate_tokens(messages: list[dict[str, str]], max_tokens: int, n: int = 1) -> int:
+    return sum(len(m["content"]) for m in messages) // 4 + max_tokens * n
+
+
+class _Request:
+    __slots__ = ("model", "key", "tokens", "fn", "enqueued", "done", "result", "error")
+
+    def __init__(self, model, key, tokens, fn):
+        self.model = model
+        self.key = key
+        self.tokens = tokens
+        self.fn = fn
+        self.enqueued = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 rpm: int = LLM_RPM, tpm: int = LLM_TPM,
+                 limits: dict = LLM_RATE_LIMITS,
+                 batch_window: float = LLM_BATCH_WINDOW_MS / 1000,
+                 aging: float = LLM_PRIORITY_AGING):
+        self.max_concurrency = max_concurrency
+        self.rpm, self.tpm = rpm, tpm
+        self.limits = limits
+        self.batch_window = batch_window
+        self.aging = aging
+        self._cv = threading.Condition()
+        self._queues: dict[str, list] = {}   # model -> heap of (rank, seq, request)
+        self._seq = itertools.count()
+        self._pending: dict[str, _Request] = {}   # coalescing key -> request
+        self._buckets: dict[str, tuple[TokenBucket, TokenBucket]] = {}
+        self._inflight = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency,
+                                        thread_name_prefix="llm")
+        self._dispatcher = threading.Thread(target=self._run, name="llm-scheduler",
+                                            daemon=True)
+        self._dispatcher.start()
+
+    def _buckets_for(self, model: str) -> tuple[TokenBucket, TokenBucket]:
+        buckets = self._buckets.get(model)
+        if buckets is None:
+            rpm, tpm = self.limits.get(model, (self.rpm, self.tpm))
+            buckets = self._buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+        return buckets
+
+    def _rank(self, priority: float, now: float) -> float:
+        # effective priority = priority + waited / aging; ordering by it is
+        # the same as ordering by priority - enqueued / aging, which is fixed
+        # at push time and so fits a heap
+        if self.aging > 0:
+            return now / self.aging - priority
+        return -priority
+
+    def submit(self, model: str, fn, tokens: int, key: str = None,
+               priority: float = None):
+        """
+        Run `fn()` (a backend call) under the scheduler and return its
+        result, blocking the caller.  Requests with the same non-None `key`
+        that overlap share one call.  `fn` runs in the caller's context.
+        """
+        if priority is None:
+            priority = request_priority.get()
+        ctx = contextvars.copy_context()
+        with self._cv:
+            req = self._pending.get(key) if key else None
+            if req is not None:
+                metrics.llm_coalesced.inc(model=model)
+            else:
+                req = _Request(model, key, tokens, lambda: ctx.run(fn))
+                if key:
+                    self._pending[key] = req
+                heapq.heappush(self._queues.setdefault(model, []),
+                               (self._rank(priority, req.enqueued), next(self._seq), req))
+                self._cv.notify_all()
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.result
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while not self._queues:
+                    self._cv.wait()
+            if self.batch_window:
+                time.sleep(self.batch_window)
+            with self._cv:
+                while self._queues:
+                    if self._inflight >= self.max_concurrency:
+                        self._cv.wait()
+                        continue
+                    now = time.monotonic()
+                    entry, wait = self._next_ready(now)
+                    if entry is None:
+                        self._cv.wait(wait)
+                        continue
+                    req = entry[2]
+                    queue = self._queues[req.model]
+                    heapq.heappop(queue)
+                    if not queue:
+                        del self._queues[req.model]
+                    rpm, tpm = self._buckets_for(req.model)
+                    rpm.take(1)
+                    tpm.take(req.tokens)
+                    self._inflight += 1
+                    metrics.llm_queue_wait_seconds.observe(now - req.enqueued,
+                                                           model=req.model)
+                    self._pool.submit(self._execute, req)
+
+    def _next_ready(self, now: float):
+        """(best queued entry whose model has budget, None) or, when every
+        model is rate-limited, (None, seconds until the first one frees up)."""
+        best, wait = None, None
+        for model, queue in self._queues.items():
+            rpm, tpm = self._buckets_for(model)
+            delay = max(rpm.delay(1, now), tpm.delay(queue[0][2].tokens, now))
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+            elif best is None or queue[0][:2] < best[:2]:
+                best = queue[0]
+        return best, wait
+
+    def _execute(self, req: _Request) -> None:
+        try:
+            req.result = req.fn()
+        except BaseException as e:
+            req.error = e
+        with self._cv:
+            self._inflight -= 1
+            used = getattr(req.result, "prompt_tokens", 0) + \
+                getattr(req.result, "completion_tokens", 0)
+            if used:
+                self._buckets_for(req.model)[1].take(used - req.tokens)
+            if req.key:
+                self._pending.pop(req.key, None)
+            self._cv.notify_all()
+        req.done.set()
+
+    def stats(self) -> dict:
+        with self._cv:
+            return {"queued": sum(map(len, self._queues.values())),
+                    "inflight": self._inflight}
+
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Process-wide scheduler; rebuilt after fork (threads don't survive it)."""
+    global _scheduler, _scheduler_pid
+    if _scheduler is None or _scheduler_pid != os.getpid():
+        with _scheduler_lock:
+            if _scheduler is None or _scheduler_pid != os.getpid():
+                _scheduler = LLMScheduler()
+                _scheduler_pid = os.getpid()
+    return _scheduler
+
+
+def queue_stats() -> dict:
+    """Scheduler counters without starting one."""
+    if _scheduler is None or _scheduler_pid != os.getpid():
+        return {"queued": 0, "inflight": 0}
+    return _scheduler.stats()
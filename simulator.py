@@ -1,31 +1,270 @@
+"""
+Replay tools.
+
+    python simulator.py <replay.jsonl>                 print one replay
+    python simulator.py eval <files...> [options]      headless re-evaluation
+
+`eval` streams replay JSONL files (from /g/<id>/replay) and/or archives
+(from archive.py), re-runs spy agents – config.AGENTS or prompt variants
+from --variants – against the recorded turn_lines across a process pool,
+and prints aggregated metrics per variant as JSON.  Accuracy needs the
+secrets, which archives carry; for plain JSONL pass --secrets.
+"""
+import argparse
 import json
+import multiprocessing
+import statistics
+import sys
 import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 REPLAY_FILE = "./replay_logs/game_XXXXXX.jsonl"  # <-- you replace XXXXXX
 
-def run_simulation(filepath):
+
+def run_simulation(filepath, delay=0.5):
     print(f"\n[Agent Simulator]\nLoading replay: {filepath}\n")
 
     with open(filepath, "r") as f:
-        lines = f.readlines()
-
-    for i, line in enumerate(lines):
-        data = json.loads(line)
-        print(f"--- TURN {data['turn']} ---")
-        print(f"Player: {data['player_input']}\n")
-
-        for agent_name, agent_data in data['agents'].items():
-            print(f"[{agent_name}]")
-            print(f"  Note: {agent_data['note']}")
-            print(f"  Reply: {agent_data['reply']}")
-            print(f"  Guess: {agent_data['guess']}")
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            print(f"--- TURN {data['turn']} ---")
+            for turn_line in data['turn_lines']:
+                print(f"{turn_line['sender']}: {turn_line['text']}")
             print("")
 
-        print(f"Outcome after turn: {data['outcome']}")
-        print("\n" + "-"*50 + "\n")
-        time.sleep(0.5)  # tiny delay for readability
+            for agent_name, agent_data in data['agents'].items():
+                print(f"[{agent_name}]")
+                print(f"  Note: {agent_data['note']}")
+                print(f"  Reply: {agent_data['reply']}")
+                print(f"  Guess: {agent_data['guess']}")
+                print("")
+
+            print(f"Outcome after turn: {data['outcome']}")
+            print("\n" + "-"*50 + "\n")
+            time.sleep(delay)  # tiny delay for readability
 
     print("\n[Simulation Complete]")
 
+
+# --- Headless re-evaluation ---
+
+_llm_slots = None   # process-shared semaphore, set in each pool worker
+
+
+def _init_worker(slots) -> None:
+    global _llm_slots
+    _llm_slots = slots
+    import logging
+    logging.disable(logging.INFO)
+
+
+def iter_games(path: str, secrets: dict | None = None):
+    """Yield {game_id, secrets, turns} records from a replay JSONL or archive."""
+    if path.endswith(".jsonl"):
+        games = defaultdict(list)
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    games[row["game_id"]].append(row["turn_lines"])
+        for game_id, turns in games.items():
+            yield {"game_id": game_id,
+                   "secrets": (secrets or {}).get(game_id),
+                   "turns": turns}
+    else:
+        from archive import ArchiveReader
+        for record in ArchiveReader(path):
+            yield game_from_archive(record)
+
+
+def game_from_archive(record: dict) -> dict:
+    g = record["game"]
+    return {"game_id": g["id"],
+            "secrets": [g["player1_secret"], g["player2_secret"]],
+            "turns": [r["turn_lines"] for r in record["replay"]]}
+
+
+def turn_history(turn_lines: list[dict]) -> list[dict[str, str]]:
+    return [{"role": "user",
+             "content": f"{l['sender'].capitalize()}: {l['text']}"}
+            for l in turn_lines]
+
+
+def evaluate_game(game: dict, variants: list[dict]) -> dict:
+    """Re-run every variant over one game's turns.  Runs in a pool worker."""
+    from config import HISTORY_WINDOW
+    from ai import track_usage
+    from cascade import current_turn, mark_hits
+    from context import game_history
+    from logic import run_agent_pipeline
+
+    results = {}
+    for agent in variants:
+        note = ""
+        correct, latencies, cascades = [], [], []
+        with track_usage() as usage:
+            earlier = []
+            for turn, turn_lines in enumerate(game["turns"], start=1):
+                current_turn.set(turn)
+                game_history.set(earlier[-HISTORY_WINDOW:] if HISTORY_WINDOW > 0 else [])
+                t0 = time.perf_counter()
+                if _llm_slots is not None:
+                    with _llm_slots:
+                        step = run_agent_pipeline(agent, note, turn_history(turn_lines))
+                else:
+                    step = run_agent_pipeline(agent, note, turn_history(turn_lines))
+                note, guess = step.note, step.guess
+                latencies.append(time.perf_counter() - t0)
+                earlier += turn_history(turn_lines)
+                if game["secrets"]:
+                    correct.append(guess in game["secrets"])
+                if step.cascade:
+                    mark_hits(step.cascade, game["secrets"] or ())
+                    cascades.append(step.cascade)
+        results[agent["name"]] = {
+            "model": agent["model"],
+            "correct": correct if game["secrets"] else None,
+            "latencies": latencies,
+            "usage": usage,
+            "cascade": cascades,
+        }
+    return results
+
+
+def _evaluate_task(path: str, game_id, secrets, variants) -> list[dict]:
+    if game_id is None:
+        return [evaluate_game(g, variants) for g in iter_games(path, secrets)]
+    from archive import ArchiveReader
+    return [evaluate_game(game_from_archive(ArchiveReader(path).read(game_id)), variants)]
+
+
+def _tasks(paths: list[str]):
+    for path in paths:
+        if path.endswith(".jsonl"):
+            yield path, None
+        else:
+            from archive import read_index
+            for entry in read_index(path):
+                yield path, entry["game_id"]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def aggregate(game_results: list[dict]) -> dict:
+    from config import MODEL_PRICES
+    from cascade import summarize
+
+    per_variant = defaultdict(lambda: {
+        "games": 0, "scored_games": 0, "detected": 0, "turns_to_detection": [],
+        "correct_by_turn": defaultdict(int), "seen_by_turn": defaultdict(int),
+        "latencies": [], "calls": 0, "prompt_tokens": 0, "cached_prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0, "cascade": []})
+    for result in game_results:
+        for name, r in result.items():
+            v = per_variant[name]
+            v["games"] += 1
+            v["latencies"] += r["latencies"]
+            for k in ("calls", "prompt_tokens", "cached_prompt_tokens", "completion_tokens"):
+                v[k] += r["usage"][k]
+            # cascade guesses are priced per tier, the rest at the agent's model
+            prompt_tokens = r["usage"]["prompt_tokens"]
+            completion_tokens = r["usage"]["completion_tokens"]
+            for info in r["cascade"]:
+                v["cost_usd"] += info["cost_usd"]
+                prompt_tokens -= sum(t["prompt_tokens"] for t in info["tiers"])
+                completion_tokens -= sum(t["completion_tokens"] for t in info["tiers"])
+            v["cascade"] += r["cascade"]
+            in_price, out_price = MODEL_PRICES.get(r["model"], (0.0, 0.0))
+            v["cost_usd"] += (prompt_tokens * in_price + completion_tokens * out_price) / 1e6
+            if r["correct"] is None:
+                continue
+            v["scored_games"] += 1
+            for turn, ok in enumerate(r["correct"], start=1):
+                v["seen_by_turn"][turn] += 1
+                v["correct_by_turn"][turn] += ok
+            if any(r["correct"]):
+                v["detected"] += 1
+                v["turns_to_detection"].append(r["correct"].index(True) + 1)
+
+    report = {}
+    for name, v in per_variant.items():
+        lat = v["latencies"]
+        report[name] = {
+            "games": v["games"],
+            "scored_games": v["scored_games"],
+            "accuracy_by_turn": {t: v["correct_by_turn"][t] / n
+                                 for t, n in sorted(v["seen_by_turn"].items())},
+            "detection_rate": v["detected"] / v["scored_games"] if v["scored_games"] else None,
+            "mean_turns_to_detection": (statistics.fmean(v["turns_to_detection"])
+                                        if v["turns_to_detection"] else None),
+            "step_latency_mean_s": statistics.fmean(lat) if lat else 0.0,
+            "step_latency_p95_s": _percentile(lat, 0.95),
+            "llm_calls": v["calls"],
+            "prompt_tokens": v["prompt_tokens"],
+            "cached_prompt_tokens": v["cached_prompt_tokens"],
+            "completion_tokens": v["completion_tokens"],
+            "cost_usd": round(v["cost_usd"], 6),
+        }
+        if v["cascade"]:
+            report[name]["cascade"] = summarize(v["cascade"])
+    return report
+
+
+def load_variants(path: str | None) -> list[dict]:
+    """Spy agents from config.AGENTS, or prompt variants layered over the
+    first spy agent: a JSON list of partial agent dicts, each with a name."""
+    from config import AGENTS
+    spies = [a for a in AGENTS if a["type"] == "spy"]
+    if not path:
+        return spies
+    with open(path) as f:
+        return [dict(spies[0], **variant) for variant in json.load(f)]
+
+
+def run_evaluation(paths: list[str], variants: list[dict], workers: int,
+                   llm_concurrency: int, secrets: dict | None = None) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    slots = ctx.BoundedSemaphore(llm_concurrency)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(slots,)) as pool:
+        futures = [pool.submit(_evaluate_task, path, game_id, secrets, variants)
+                   for path, game_id in _tasks(paths)]
+        for f in as_completed(futures):
+            results.extend(f.result())
+    return aggregate(results)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Headless replay re-evaluation")
+    ap.add_argument("files", nargs="+", help="replay .jsonl files and/or archives")
+    ap.add_argument("--variants", help="JSON list of agent overrides to compare")
+    ap.add_argument("--secrets", help="JSON {game_id: [secret1, secret2]} for .jsonl inputs")
+    ap.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    ap.add_argument("--llm-concurrency", type=int, default=16,
+                    help="max agent steps talking to the LLM at once, across all workers")
+    args = ap.parse_args(sys.argv[2:])
+
+    secrets = None
+    if args.secrets:
+        with open(args.secrets) as f:
+            secrets = json.load(f)
+    report = run_evaluation(args.files, load_variants(args.variants),
+                            args.workers, args.llm_concurrency, secrets)
+    print(json.dumps(report, indent=2))
+
+
 if __name__ == "__main__":
-    run_simulation(REPLAY_FILE)
+    if len(sys.argv) > 1 and sys.argv[1] == "eval":
+        main()
+    else:
+        run_simulation(sys.argv[1] if len(sys.argv) > 1 else REPLAY_FILE)
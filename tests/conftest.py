@@ -0,0 +1,137 @@
+import os
+import sys
+import tempfile
+
+# config.py reads the environment at import time
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["LLM_CACHE"] = "0"
+os.environ["DICTIONARY_REMOTE_FALLBACK"] = "0"
+os.environ["TURN_WORKER_MODE"] = "inline"
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["ARCHIVE_DATABASE_URL"] = "sqlite://"
+os.environ["COMPACTOR_LOCK_PATH"] = os.path.join(tempfile.mkdtemp(), "compactor.lock")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    from migrations import init_db
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'games.db'}",
+        "SQLALCHEMY_BINDS": {"archive": f"sqlite:///{tmp_path / 'archive.db'}"},
+        "BACKGROUND_THREADS": False,
+        "WTF_CSRF_ENABLED": False,
+        "TESTING": True,
+    })
+    with app.app_context():
+        init_db()
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_game(app):
+    """Factory: a game with one player-1 message and a replay row per turn;
+    returns its id.  Secrets are "apple" (player 1) and "pear" (player 2)."""
+    import uuid
+    from db import db
+    from models import Game, Msg, GameStatus, Replay
+
+    def make(status=GameStatus.PLAY, created=None, turns=0) -> str:
+        game = Game(id=uuid.uuid4().hex, player1_secret="apple", player2_secret="pear",
+                    status=status, turns=turns)
+        if created is not None:
+            game.created = created
+        db.session.add(game)
+        db.session.flush()
+        db.session.add(Msg(game_id=game.id, role="Player", sender="player1", text="hi"))
+        for turn in range(1, turns + 1):
+            db.session.add(Replay(game_id=game.id, turn=turn, turn_lines=[],
+                                  outcome=status.value, agents={}))
+        db.session.commit()
+        return game.id
+    return make
+
+
+@pytest.fixture
+def write_elsewhere(app):
+    """`write(game_id, message=False, **columns)`: a write by another
+    process – committed and logged to the change feed, but never published
+    in this one."""
+    from db import db
+    from models import Game, GameChange, Msg
+
+    def write(game_id: str, message: bool = False, **values) -> None:
+        if message:
+            db.session.add(Msg(game_id=game_id, role="ZaZ", text="note", guess="x"))
+        Game.query.filter_by(id=game_id).update(values)
+        db.session.add(GameChange(game_id=game_id, origin="elsewhere"))
+        db.session.commit()
+    return write
+
+
+@pytest.fixture
+def change_feed(app):
+    """A ChangeFeed positioned at the current end of the log; call `poll()`
+    where the background thread would have run."""
+    from changefeed import ChangeFeed
+
+    feed = ChangeFeed()
+    feed.poll()
+    return feed
+
+
+@pytest.fixture
+def count_queries(app):
+    """`with count_queries() as queries:` collects the SQL run inside."""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+    from db import db
+
+    @contextmanager
+    def count():
+        queries = []
+
+        def record(conn, cursor, statement, *args):
+            queries.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            yield queries
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+    return count
+
+
+@pytest.fixture
+def fake_llm():
+    """Installs a FakeBackend that records each request as
+    `(messages, n, samples returned)`."""
+    import llm_backends
+
+    class RecordingFake(llm_backends.FakeBackend):
+        def __init__(self):
+            super().__init__(latency="fixed:0")
+            self.calls = []
+
+        def complete(self, model, messages, max_tokens, temperature, n=1,
+                     stop_when=None, **extra):
+            completion = super().complete(model, messages, max_tokens, temperature,
+                                          n=n, stop_when=stop_when, **extra)
+            self.calls.append((messages, n, len(completion.texts)))
+            return completion
+
+    backend = RecordingFake()
+    llm_backends.set_backend(backend)
+    yield backend
+    llm_backends.set_backend(llm_backends.FakeBackend())
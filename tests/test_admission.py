@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+import admission
+from config import (ADMISSION_MAX_TURNS_IN_FLIGHT, ADMISSION_SPECTATOR_FACTOR,
+                    ADMISSION_HOLD, SEND_SESSION_RPM)
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.monotonic()   # same base as the send buckets
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission, "time", clock)
+    return clock
+
+
+def controller(monkeypatch, mode="auto"):
+    ctl = admission.AdmissionController(mode)
+    ctl.turns = 0
+    monkeypatch.setattr(ctl, "load", lambda: {"turns_in_flight": ctl.turns,
+                                              "llm_queue": 0, "turn_p95_s": None})
+    return ctl
+
+
+@pytest.mark.parametrize("turns, level", [
+    (0, "ok"),
+    (ADMISSION_MAX_TURNS_IN_FLIGHT - 1, "ok"),
+    (ADMISSION_MAX_TURNS_IN_FLIGHT, "saturated"),
+    (int(ADMISSION_MAX_TURNS_IN_FLIGHT * ADMISSION_SPECTATOR_FACTOR), "spectator"),
+])
+def test_levels(monkeypatch, clock, turns, level):
+    ctl = controller(monkeypatch)
+    ctl.turns = turns
+    assert ctl.level() == level
+
+
+def test_degraded_level_is_held(monkeypatch, clock):
+    ctl = controller(monkeypatch)
+    ctl.turns = ADMISSION_MAX_TURNS_IN_FLIGHT
+    assert ctl.level() == "saturated"
+    ctl.turns = 0
+    clock.now += ADMISSION_HOLD / 2
+    assert ctl.level() == "saturated"
+    clock.now += ADMISSION_HOLD
+    assert ctl.level() == "ok"
+
+
+def test_forced_modes(monkeypatch, clock):
+    ctl = controller(monkeypatch, mode="spectator")
+    assert ctl.level() == "spectator"
+    assert ctl.admit_send("s", "g").reason == "spectator"
+    ctl = controller(monkeypatch, mode="off")
+    ctl.turns = 10 * ADMISSION_MAX_TURNS_IN_FLIGHT
+    assert ctl.level() == "ok"
+    assert ctl.admit_game() is None
+
+
+def test_saturated_rejects_games_and_rate_limits_sends(monkeypatch, clock):
+    ctl = controller(monkeypatch)
+    ctl.turns = ADMISSION_MAX_TURNS_IN_FLIGHT
+    rejected = ctl.admit_game()
+    assert rejected.reason == "saturated" and rejected.retry_after > 0
+
+    results = [ctl.admit_send("session", "game") for _ in range(int(SEND_SESSION_RPM) + 1)]
+    assert any(r is None for r in results)
+    assert results[-1].reason == "session_rate"
+    # another session in another game still gets through
+    assert ctl.admit_send("other", "game2") is None
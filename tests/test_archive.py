@@ -0,0 +1,35 @@
+import datetime as dt
+
+import archive
+import compactor
+from archive import ArchiveReader, export_games
+from models import ArchivedGame, Game, GameStatus
+
+OLD = dt.datetime.utcnow() - dt.timedelta(days=30)
+
+
+def test_export_round_trip_over_several_pages(make_game, tmp_path):
+    page = archive.EXPORT_PAGE_SIZE
+    # all old games share one timestamp, so paging has to break ties on id
+    archived = {make_game(GameStatus.LOSE, created=OLD, turns=2) for _ in range(page + 30)}
+    compactor.compact_once(pause=0)
+    assert ArchivedGame.query.count() == page + 30
+    hot = {make_game(GameStatus.WIN, turns=1) for _ in range(page + 20)}
+    make_game(GameStatus.PLAY)   # not finished: never exported
+
+    path = str(tmp_path / "games.bpa")
+    assert export_games(path) == len(archived) + len(hot)
+
+    reader = ArchiveReader(path)
+    assert {r["game"]["id"] for r in reader} == archived | hot
+    game_id = next(iter(hot))
+    record = reader.read(game_id)
+    assert record["game"]["status"] == "WIN"
+    assert [m["text"] for m in record["messages"]] == ["hi"]
+    assert [t["turn"] for t in record["replay"]] == [1]
+    assert len(reader.read(next(iter(archived)))["replay"]) == 2
+
+    # re-running appends nothing new
+    assert export_games(path) == 0
+    assert len(ArchiveReader(path)) == len(archived) + len(hot)
+    assert Game.query.count() == len(hot) + 1
@@ -0,0 +1,28 @@
+import pytest
+
+import cascade
+from config import MAX_TURNS, CASCADE_FINAL_TURNS
+
+
+@pytest.mark.parametrize("turn, skipped", [
+    (MAX_TURNS - CASCADE_FINAL_TURNS, False),
+    (MAX_TURNS - CASCADE_FINAL_TURNS + 1, True),
+    (MAX_TURNS, True),
+])
+def test_only_last_turns_skip_to_final_tier(monkeypatch, turn, skipped):
+    ran = []
+
+    def run_tier(tier, *args):
+        ran.append(tier)
+        return {"tier": tier, "guess": "apple", "confidence": 1.0, "votes": {"apple": 1},
+                "latency_ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+                "cost_usd": 0.0}
+
+    monkeypatch.setattr(cascade, "_run_tier", run_tier)
+    token = cascade.current_turn.set(turn)
+    try:
+        _, _, info = cascade.run_cascade(["heuristic", "big"], "note", "prompt")
+    finally:
+        cascade.current_turn.reset(token)
+    assert ran == (["big"] if skipped else ["heuristic"])
+    assert info["escalation"] == ("near_max_turns" if skipped else None)
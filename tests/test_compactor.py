@@ -0,0 +1,77 @@
+import datetime as dt
+
+import pytest
+
+import compactor
+from db import db
+from models import Game, Msg, GameStatus, ArchivedGame, ArchivedReplay
+
+OLD = dt.datetime.utcnow() - dt.timedelta(days=30)
+
+
+@pytest.fixture
+def finished_game(make_game):
+    """Old finished game with two replayed turns, due for compaction."""
+    return lambda: make_game(GameStatus.LOSE, created=OLD, turns=2)
+
+
+def test_archives_only_old_finished_games(make_game, finished_game):
+    old_done = finished_game()
+    fresh_done = make_game(GameStatus.LOSE, created=dt.datetime.utcnow(), turns=2)
+    playing = make_game(GameStatus.PLAY, created=OLD, turns=2)
+
+    assert compactor.compact_once(pause=0) == 1
+
+    assert db.session.get(Game, old_done) is None
+    assert Msg.query.filter_by(game_id=old_done).count() == 0
+    archived = db.session.get(ArchivedGame, old_done)
+    assert archived.messages[0]["text"] == "hi"
+    assert ArchivedReplay.query.filter_by(game_id=old_done).count() == 2
+    assert db.session.get(Game, fresh_done) is not None
+    assert db.session.get(Game, playing) is not None
+
+
+def test_failed_delete_keeps_hot_rows_and_next_pass_finishes(finished_game, monkeypatch):
+    game_id = finished_game()
+
+    def crash(ids):
+        raise RuntimeError("crash between the two transactions")
+
+    monkeypatch.setattr(compactor, "_delete_archived", crash)
+    with pytest.raises(RuntimeError):
+        compactor.compact_once(pause=0)
+    db.session.rollback()
+    # archived, but nothing deleted yet
+    assert db.session.get(ArchivedGame, game_id) is not None
+    assert db.session.get(Game, game_id) is not None
+
+    monkeypatch.undo()
+    assert compactor.compact_once(pause=0) == 1
+    assert db.session.get(Game, game_id) is None
+    assert ArchivedReplay.query.filter_by(game_id=game_id).count() == 2
+
+
+def test_failed_archive_insert_deletes_nothing(finished_game, monkeypatch):
+    game_id = finished_game()
+
+    def broken(game):
+        db.session.add(ArchivedGame(id=game.id))   # missing NOT NULL columns
+    monkeypatch.setattr(compactor, "_archive_game", broken)
+    with pytest.raises(Exception):
+        compactor.compact_once(pause=0)
+    db.session.rollback()
+    assert db.session.get(Game, game_id) is not None
+    assert db.session.get(ArchivedGame, game_id) is None
+
+
+def test_only_one_lock_holder(app, tmp_path, monkeypatch):
+    path = str(tmp_path / "c.lock")
+    monkeypatch.setattr(compactor, "_lock_file", None)
+    assert compactor.acquire_lock(path)
+    holder = compactor._lock_file
+    # a second process opens its own file description and fails to lock it
+    monkeypatch.setattr(compactor, "_lock_file", None)
+    assert not compactor.acquire_lock(path)
+    holder.close()
+    assert compactor.acquire_lock(path)
+    compactor._lock_file.close()
@@ -0,0 +1,66 @@
+import context
+import logic
+from config import AGENTS, CONTEXT_TOKEN_BUDGET
+from context import build_context, count_tokens, game_history, message_tokens, MESSAGE_OVERHEAD
+
+
+def history(count, words=20):
+    return [{"role": "user", "content": f"player1: message {i} " + "word " * words}
+            for i in range(count)]
+
+
+def prompt_tokens(system, messages):
+    return count_tokens(system) + MESSAGE_OVERHEAD + message_tokens(messages)
+
+
+def test_history_is_trimmed_oldest_first_to_the_budget():
+    earlier = history(50)
+    turn = [{"role": "user", "content": "player2: what now"}]
+    token = game_history.set(earlier)
+    try:
+        system, messages = build_context("Instructions.", "note", turn, budget=300)
+    finally:
+        game_history.reset(token)
+
+    kept = messages[:-2]
+    assert messages[-2:] == [context.note_message("note")] + turn
+    assert 0 < len(kept) < len(earlier)
+    assert kept == earlier[-len(kept):]   # the newest ones, in order
+    assert prompt_tokens(system, messages) <= 300
+    # one more message would not have fit
+    assert prompt_tokens(system, earlier[-len(kept) - 1:] + messages[-2:]) > 300
+
+
+def test_everything_fits_a_large_budget():
+    earlier = history(3)
+    token = game_history.set(earlier)
+    try:
+        _, messages = build_context("Instructions.", "note", [], budget=10_000)
+    finally:
+        game_history.reset(token)
+    assert messages[:-1] == earlier
+
+
+def test_no_room_keeps_the_note_and_turn():
+    turn = [{"role": "user", "content": "player2: " + "long " * 100}]
+    token = game_history.set(history(5))
+    try:
+        _, messages = build_context("Instructions.", "note", turn, budget=50)
+    finally:
+        game_history.reset(token)
+    assert messages == [context.note_message("note")] + turn
+
+
+def test_agent_calls_stay_within_the_budget(fake_llm):
+    earlier = history(200)   # far more than CONTEXT_TOKEN_BUDGET
+    token = game_history.set(earlier)
+    try:
+        logic.speculate_note(AGENTS[0], "note", [{"role": "user", "content": "player1: hi"}])
+    finally:
+        game_history.reset(token)
+
+    (messages, _, _), = fake_llm.calls
+    system, rest = messages[0]["content"], messages[1:]
+    assert prompt_tokens(system, rest) <= CONTEXT_TOKEN_BUDGET
+    sent = [m for m in rest if m in earlier]
+    assert sent and sent == earlier[-len(sent):]
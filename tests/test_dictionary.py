@@ -0,0 +1,25 @@
+import pytest
+
+import dictionary
+
+
+@pytest.mark.parametrize("word", ["apple", "laptop", "website", "smartphone", "podcast",
+                                  "selfie", "taco", "sushi", "Sushi"])
+def test_known_words(word):
+    assert dictionary.contains(word)
+
+
+@pytest.mark.parametrize("word", ["zzzq", "a", "two words", "b4", ""])
+def test_unknown_words(word):
+    assert not dictionary.contains(word)
+
+
+def test_build_merges_extra_lists(tmp_path):
+    main, extra = tmp_path / "main.txt", tmp_path / "extra.txt"
+    main.write_text("apple\nPear\n")
+    extra.write_text("# newer words\nselfie\napple\n")
+    index = tmp_path / "words.idx"
+    assert dictionary.build_index(str(main), str(index), [str(extra)]) == 3
+    words = dictionary.WordIndex(str(index))
+    assert "selfie" in words and "pear" in words and "newer" not in words
+    words.close()
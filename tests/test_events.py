@@ -0,0 +1,40 @@
+import json
+
+from models import GameStatus
+
+
+def events(chunks):
+    """(event, data) of each SSE frame, skipping keep-alive comments."""
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith(":"):
+            continue
+        lines = dict(line.split(": ", 1) for line in text.strip().splitlines())
+        yield lines["event"], json.loads(lines["data"])
+
+
+def test_stream_picks_up_other_process_writes(client, make_game, write_elsewhere,
+                                              change_feed):
+    game_id = make_game()
+    rsp = client.get(f"/g/{game_id}/events?after_id=0", buffered=False)
+    try:
+        stream = events(rsp.response)
+        event, data = next(stream)
+        assert event == "update" and data["messages"][0]["text"] == "hi"
+        assert next(stream)[0] == "joined"
+
+        # no broker publish: only the change feed can see this
+        write_elsewhere(game_id, message=True, turns=1)
+        change_feed.poll()
+        event, data = next(stream)
+        assert event == "update"
+        assert [m["role"] for m in data["messages"]] == ["ZaZ"]
+        assert data["turns"] == 1
+
+        write_elsewhere(game_id, status=GameStatus.LOSE)
+        change_feed.poll()
+        event, data = next(stream)
+        assert data["status"] == "LOSE" and data["messages"] == []
+        assert next(stream, None) is None   # stream ends with the game
+    finally:
+        rsp.close()
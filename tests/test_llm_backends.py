@@ -0,0 +1,26 @@
+import pytest
+
+import llm_backends
+
+
+@pytest.fixture
+def fresh_backend(monkeypatch):
+    monkeypatch.setattr(llm_backends, "_backend", None)
+
+
+def test_openai_without_key_raises(monkeypatch, fresh_backend):
+    monkeypatch.setattr(llm_backends, "LLM_BACKEND", "openai")
+    monkeypatch.setattr(llm_backends, "OPENAI_API_KEY", "")
+    with pytest.raises(RuntimeError, match="OPENAI_API_KEY"):
+        llm_backends.get_backend()
+
+
+def test_unknown_backend_raises(monkeypatch, fresh_backend):
+    monkeypatch.setattr(llm_backends, "LLM_BACKEND", "fkae")
+    with pytest.raises(RuntimeError, match="fkae"):
+        llm_backends.get_backend()
+
+
+def test_fake_only_when_asked_for(fresh_backend):
+    assert llm_backends.LLM_BACKEND == "fake"   # set by conftest
+    assert isinstance(llm_backends.get_backend(), llm_backends.FakeBackend)
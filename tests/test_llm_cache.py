@@ -0,0 +1,24 @@
+import llm_cache
+from config import AGENTS
+
+
+def test_gameplay_agents_sample_fresh_by_default():
+    assert all(not agent["cache"] for agent in AGENTS)
+
+
+def test_rejected_answers_are_not_cached(monkeypatch):
+    monkeypatch.setattr(llm_cache, "cache", llm_cache.LLMCache(path=""))
+    answers = iter(["not json", '{"note": "n", "guess": "g"}', "unused"])
+
+    def call():
+        return next(answers)
+
+    def accept(text):
+        return text.startswith("{")
+
+    msgs = [{"role": "user", "content": "hi"}]
+    assert llm_cache.cached_call("m", msgs, call, accept=accept) == "not json"
+    assert llm_cache.cached_call("m", msgs, call, accept=accept).startswith("{")
+    # the good answer was stored, so this one is served from the cache
+    assert llm_cache.cached_call("m", msgs, call, accept=accept).startswith("{")
+    assert llm_cache.cache.stats()["hits"] == 1
@@ -0,0 +1,16 @@
+import threading
+
+import metrics
+
+
+def test_dead_thread_shards_fold_without_a_scrape():
+    counter = metrics.Counter("test_fold_total", "test", ["kind"])
+    metrics.REGISTRY.remove(counter)
+
+    for _ in range(5 * metrics.FOLD_AT):
+        t = threading.Thread(target=counter.inc, kwargs={"kind": "a"})
+        t.start()
+        t.join()
+
+    assert len(counter._shards) <= metrics.FOLD_AT
+    assert counter.collect() == {("a",): 5 * metrics.FOLD_AT}
@@ -0,0 +1,75 @@
+from models import Game, GameStatus
+
+
+def test_etag_304_then_other_process_write(client, make_game, write_elsewhere,
+                                           change_feed, count_queries):
+    game_id = make_game()
+    first = client.get(f"/poll/{game_id}?after_id=0")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    with count_queries() as queries:
+        rsp = client.get(f"/poll/{game_id}", headers={"If-None-Match": etag})
+    assert rsp.status_code == 304
+    assert queries == []
+
+    write_elsewhere(game_id, message=True, turns=Game.turns + 1)
+    change_feed.poll()
+    rsp = client.get(f"/poll/{game_id}", headers={"If-None-Match": etag})
+    assert rsp.status_code == 200
+    assert [m["role"] for m in rsp.get_json()["messages"]][-1] == "ZaZ"
+
+
+def test_after_id_path_checks_status(client, make_game, write_elsewhere, change_feed):
+    game_id = make_game()
+    data = client.get(f"/poll/{game_id}?after_id=0").get_json()
+    last_id = data["messages"][-1]["id"]
+
+    # without the client's status there is nothing to compare: never 304
+    assert client.get(f"/poll/{game_id}?after_id={last_id}").status_code == 200
+    url = f"/poll/{game_id}?after_id={last_id}&status=PLAY"
+    assert client.get(url).status_code == 304
+
+    # status change with no new message (e.g. MAX_TURNS -> LOSE)
+    write_elsewhere(game_id, status=GameStatus.LOSE)
+    change_feed.poll()
+    assert client.get(url).status_code == 200
+
+
+def test_bad_after_id_is_not_a_server_error(client, make_game):
+    game_id = make_game()
+    assert client.get(f"/poll/{game_id}?after_id=abc").status_code == 200
+
+
+def test_cached_game_sees_other_process_writes(client, make_game, write_elsewhere,
+                                               change_feed):
+    game_id = make_game()
+    data = client.get(f"/poll/{game_id}?after_id=0").get_json()   # caches the game
+    assert data["status"] == "PLAY"
+
+    write_elsewhere(game_id, message=True, status=GameStatus.PARTIAL, turns=3)
+    assert change_feed.poll() == {game_id}
+    data = client.get(f"/poll/{game_id}?after_id=0").get_json()
+    assert (data["status"], data["turns"]) == ("PARTIAL", 3)
+
+
+def test_cache_hit_does_not_read_the_game(client, make_game, count_queries):
+    from gamecache import game_cache
+    game_id = make_game()
+    assert game_cache.load(game_id) is not None
+    with count_queries() as queries:
+        assert game_cache.load(game_id).player2_secret == "pear"
+    assert queries == []
+
+
+def test_own_writes_are_not_fed_back(app, make_game, change_feed, monkeypatch):
+    import changefeed
+    from events import publish_update
+    from gamecache import game_cache
+    from models import GameChange
+
+    monkeypatch.setattr(changefeed, "CROSS_PROCESS", True)
+    game_id = make_game()
+    publish_update(game_cache.load(game_id))
+    assert GameChange.query.filter_by(game_id=game_id).count() == 1
+    assert change_feed.poll() == set()
+    assert game_cache.get(game_id) is not None
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import profiling
+
+
+def hello(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"hi"]
+
+
+def call(app, path="/"):
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path}
+    return app(environ, lambda status, headers: None)
+
+
+@pytest.mark.parametrize("mode", ["sample", "cprofile"])
+def test_sampled_fast_requests_are_kept(monkeypatch, mode):
+    monkeypatch.setattr(profiling, "recent_profiles", type(profiling.recent_profiles)())
+    app = profiling.ProfilingMiddleware(hello, sample_rate=1.0, slow_ms=10_000, mode=mode)
+    assert call(app) == [b"hi"]
+    assert [p["mode"] for p in profiling.recent_profiles] == [mode]
+
+
+def test_unsampled_fast_requests_are_dropped(monkeypatch):
+    monkeypatch.setattr(profiling, "recent_profiles", type(profiling.recent_profiles)())
+    app = profiling.ProfilingMiddleware(hello, sample_rate=0, slow_ms=10_000)
+    call(app)
+    assert not profiling.recent_profiles
+
+
+def test_profile_file_name_is_safe(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    entry = profiling.record_profile(
+        {"REQUEST_METHOD": "GET", "PATH_INFO": "/../" + "x" * 5000 + "/\0é"}, 1.0,
+        "sample", "a;b 1\n")
+    [name] = os.listdir(tmp_path)
+    assert name == profiling.profile_filename(entry)
+    assert "/" not in name and len(name) < 150
+
+
+def test_write_errors_do_not_fail_the_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "missing"))
+    monkeypatch.setattr(profiling, "recent_profiles", type(profiling.recent_profiles)())
+    app = profiling.ProfilingMiddleware(hello, sample_rate=1.0, slow_ms=0, mode="cprofile")
+    assert call(app) == [b"hi"]
+    assert len(profiling.recent_profiles) == 1
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from models import GameStatus
+
+
+def replay_turns(rsp) -> list[int]:
+    return [json.loads(line)["turn"] for line in rsp.get_data(as_text=True).splitlines() if line]
+
+
+@pytest.mark.parametrize("query, status, turns", [
+    ("", 200, [1, 2]),
+    ("?from_turn=2", 200, [2]),
+    ("?from_turn=abc", 400, None),
+    ("?from_turn=-1", 400, None),
+    ("?from_turn=1.5", 400, None),
+    ("?from_turn=9", 404, None),
+])
+def test_from_turn_parsing(client, make_game, query, status, turns):
+    game_id = make_game(GameStatus.LOSE, turns=2)
+    rsp = client.get(f"/g/{game_id}/replay{query}")
+    assert rsp.status_code == status
+    if turns is not None:
+        assert replay_turns(rsp) == turns
+        assert "Content-Range" not in rsp.headers
+
+
+def test_range_header(client, make_game):
+    game_id = make_game(GameStatus.LOSE, turns=3)
+    rsp = client.get(f"/g/{game_id}/replay", headers={"Range": "turns=2-"})
+    assert rsp.status_code == 206
+    assert rsp.headers["Content-Range"] == "turns 2-3/*"
+    assert replay_turns(rsp) == [2, 3]
+
+    rsp = client.get(f"/g/{game_id}/replay", headers={"Range": "turns=7-"})
+    assert rsp.status_code == 416
+    assert rsp.headers["Content-Range"] == "turns */3"
+    assert rsp.get_data() == b""
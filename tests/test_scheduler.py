@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import LLMScheduler
+
+
+@pytest.fixture
+def sched():
+    return LLMScheduler(max_concurrency=1, rpm=0, tpm=0, limits={"slow": (1, 0)},
+                        batch_window=0, aging=10)
+
+
+def in_thread(fn, *args, **kwargs):
+    out = {}
+
+    def run():
+        out["result"] = fn(*args, **kwargs)
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t, out
+
+
+def wait_queued(sched, n, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while sched.stats()["queued"] < n:
+        assert time.monotonic() < deadline, sched.stats()
+        time.sleep(0.005)
+
+
+def hold_slot(sched):
+    """Occupy the only concurrency slot until the returned event is set."""
+    gate = threading.Event()
+    t, _ = in_thread(sched.submit, "m", gate.wait, 1)
+    deadline = time.monotonic() + 2
+    while sched.stats()["inflight"] < 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    return gate, t
+
+
+def test_higher_priority_runs_first(sched):
+    order = []
+    gate, holder = hold_slot(sched)
+    threads = [in_thread(sched.submit, "m", lambda p=p: order.append(p), 1, priority=p)[0]
+               for p in (0.1, 0.9, 0.5)]
+    wait_queued(sched, 3)
+    gate.set()
+    for t in threads + [holder]:
+        t.join(2)
+    assert order == [0.9, 0.5, 0.1]
+
+
+def test_waiting_ages_into_priority(sched):
+    # 2 x aging seconds of waiting are worth +2 priority
+    assert sched._rank(0.0, 100.0) < sched._rank(1.0, 100.0 + 2 * sched.aging)
+    assert sched._rank(1.0, 100.0) < sched._rank(0.0, 100.0)
+
+
+def test_identical_requests_share_one_call(sched):
+    calls = []
+    gate, holder = hold_slot(sched)
+    threads = [in_thread(sched.submit, "m", lambda: calls.append(1) or "answer", 1,
+                         key="same") for _ in range(3)]
+    wait_queued(sched, 1)
+    time.sleep(0.05)   # the other two joined the first instead of queueing
+    assert sched.stats()["queued"] == 1
+    gate.set()
+    results = []
+    for t, out in threads:
+        t.join(2)
+        results.append(out["result"])
+    holder.join(2)
+    assert calls == [1] and results == ["answer"] * 3
+
+
+def test_rate_limited_model_does_not_block_others(sched):
+    assert sched.submit("slow", lambda: "first", 1) == "first"   # uses the minute's budget
+    blocked, _ = in_thread(sched.submit, "slow", lambda: "second", 1, priority=1.0)
+    wait_queued(sched, 1)
+    t0 = time.monotonic()
+    assert sched.submit("fast", lambda: "other", 1, priority=0.0) == "other"
+    assert time.monotonic() - t0 < 1
+    assert blocked.is_alive()   # still waiting for its bucket
@@ -0,0 +1,64 @@
+from sqlalchemy import update
+
+from db import db
+from models import Game, Msg, GameStatus
+
+
+def as_player(client, game_id, role="player1"):
+    with client.session_transaction() as sess:
+        sess["player_token"] = "t"
+        sess["player_role"] = role
+        sess["game_id"] = game_id
+
+
+def test_right_guess_marks_partial(client, make_game):
+    game_id = make_game()
+    as_player(client, game_id)
+    rsp = client.post(f"/g/{game_id}/send", data={"text": "hello", "guess": "pear"})
+    assert rsp.status_code == 302
+    game = db.session.get(Game, game_id, populate_existing=True)
+    assert game.status == GameStatus.PARTIAL and game.p1_guessed
+
+
+def test_lose_committed_meanwhile_is_kept(client, monkeypatch, make_game):
+    game_id = make_game()
+    as_player(client, game_id)
+    real_get = db.session.get
+    calls = []
+
+    def get_then_lose(*args, **kwargs):
+        game = real_get(*args, **kwargs)
+        if not calls:
+            # a turn in another process commits LOSE after send read the game
+            with db.engine.begin() as conn:
+                conn.execute(update(Game).where(Game.id == game_id)
+                             .values(status=GameStatus.LOSE))
+        calls.append(1)
+        return game
+
+    monkeypatch.setattr(db.session, "get", get_then_lose)
+    rsp = client.post(f"/g/{game_id}/send", data={"text": "hello", "guess": "pear"})
+    monkeypatch.undo()
+
+    assert rsp.status_code == 400
+    assert len(calls) == 2   # the conditional UPDATE missed and send re-read
+    game = db.session.get(Game, game_id, populate_existing=True)
+    assert game.status == GameStatus.LOSE and not game.p1_guessed
+    assert Msg.query.filter_by(game_id=game_id).count() == 1
+
+
+def test_join_goes_through_the_cache_and_only_once(client, app):
+    from gamecache import game_cache
+    game = Game(id="joinme", player1_secret="apple", status=GameStatus.RAMP)
+    db.session.add(game)
+    db.session.commit()
+    game_cache.load("joinme")
+
+    rsp = client.post("/start_player2/joinme", data={"player2_secret": "Pear"})
+    assert rsp.status_code == 302
+    assert game_cache.get("joinme").player2_secret == "pear"
+    assert game_cache.get("joinme").status == GameStatus.PLAY
+
+    rsp = client.post("/start_player2/joinme", data={"player2_secret": "plum"})
+    assert b"already entered" in rsp.data
+    assert db.session.get(Game, "joinme", populate_existing=True).player2_secret == "pear"
@@ -0,0 +1,74 @@
+import logic
+import metrics
+from config import AGENTS
+from db import db
+from models import Game, Msg
+
+
+def speculated(game_id):
+    return {name: spec for (gid, name), spec in logic._speculations.items() if gid == game_id}
+
+
+def results():
+    return dict(metrics.speculative_notes.collect())
+
+
+def player1_msgs(game_id):
+    return Msg.query.filter_by(game_id=game_id, sender="player1").order_by(Msg.id).all()
+
+
+def test_one_sided_turn_speculates_once_per_message_set(app, make_game, fake_llm):
+    game_id = make_game()
+    logic.run_turn(db.session.get(Game, game_id), speculate=True)
+
+    specs = speculated(game_id)
+    assert set(specs) == {a["name"] for a in AGENTS}
+    assert all(s.sender == "player1" and s.note.startswith("Suspects:") for s in specs.values())
+    calls = len(fake_llm.calls)
+    assert calls == len(AGENTS)
+
+    # nothing new from player 1: the speculation is reused, no LLM call
+    logic.run_turn(db.session.get(Game, game_id), speculate=True)
+    assert len(fake_llm.calls) == calls
+
+
+def test_speculation_used_by_the_turn(app, make_game, fake_llm):
+    game_id = make_game()
+    logic.run_turn(db.session.get(Game, game_id), speculate=True)
+    before = results()
+
+    db.session.add(Msg(game_id=game_id, role="Player", sender="player2", text="fruit"))
+    db.session.commit()
+    logic.run_turn(db.session.get(Game, game_id), speculate=True)
+
+    hits = results().get(("hit",), 0) - before.get(("hit",), 0)
+    assert hits == len(AGENTS)
+    assert speculated(game_id) == {}
+    assert db.session.get(Game, game_id, populate_existing=True).turns == 1
+
+
+def test_stale_speculation_is_discarded(app, make_game, fake_llm):
+    game_id = make_game()
+    logic.run_turn(db.session.get(Game, game_id), speculate=True)
+    name = AGENTS[0]["name"]
+    base = logic._speculations[(game_id, name)].base_note
+    before = results().get(("discarded",), 0)
+
+    # player 1 sent again since the speculation was built
+    db.session.add(Msg(game_id=game_id, role="Player", sender="player1", text="more"))
+    db.session.commit()
+    pending = {"player1": player1_msgs(game_id)}
+    assert logic.take_speculation(game_id, name, pending, base) is None
+    assert results()[("discarded",)] == before + 1
+    assert (game_id, name) not in logic._speculations
+
+
+def test_changed_note_discards_and_discard_speculations_clears(app, make_game, fake_llm):
+    game_id = make_game()
+    logic.run_turn(db.session.get(Game, game_id), speculate=True)
+    pending = {"player1": player1_msgs(game_id)}
+    first = AGENTS[0]["name"]
+
+    assert logic.take_speculation(game_id, first, pending, "a note written meanwhile") is None
+    logic.discard_speculations(game_id)
+    assert speculated(game_id) == {}
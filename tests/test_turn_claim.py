@@ -0,0 +1,59 @@
+import datetime as dt
+
+from config import TURN_CLAIM_TIMEOUT
+from db import db
+from logic import claim_turn, release_claim, run_turn
+from models import Game, Msg, GameStatus
+
+
+def claim(game_id, version):
+    won = claim_turn(game_id, version)
+    db.session.commit()
+    return won
+
+
+def game(game_id):
+    return db.session.get(Game, game_id, populate_existing=True)
+
+
+def test_only_one_claim_per_version(make_game):
+    game_id = make_game()
+    assert claim(game_id, 0)
+    assert not claim(game_id, 0)
+    # the new version is taken too while the lease is live
+    assert not claim(game_id, 1)
+    assert game(game_id).version == 1
+
+
+def test_stale_claim_is_taken_over(make_game):
+    game_id = make_game()
+    assert claim(game_id, 0)
+    old = dt.datetime.utcnow() - dt.timedelta(seconds=TURN_CLAIM_TIMEOUT + 1)
+    Game.query.filter_by(id=game_id).update({"claimed_at": old})
+    db.session.commit()
+    assert claim(game_id, 1)
+    assert game(game_id).version == 2
+
+
+def test_release_lets_the_next_worker_claim(make_game):
+    game_id = make_game()
+    assert claim(game_id, 0)
+    release_claim(game_id, 1)
+    g = game(game_id)
+    assert (g.version, g.claimed_at) == (2, None)
+    assert claim(game_id, 2)
+
+
+def test_turn_is_played_once(make_game):
+    game_id = make_game()
+    db.session.add(Msg(game_id=game_id, role="Player", sender="player2", text="hello"))
+    db.session.commit()
+
+    run_turn(game(game_id))
+    played = game(game_id)
+    assert played.turns == 1 and played.claimed_at is None
+    assert Msg.query.filter_by(game_id=game_id, role="Player", used=False).count() == 0
+
+    run_turn(game(game_id))   # nothing pending: no second turn
+    assert game(game_id).turns == 1
+    assert game(game_id).status in (GameStatus.PLAY, GameStatus.LOSE)
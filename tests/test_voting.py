@@ -0,0 +1,33 @@
+import pytest
+
+import ai
+
+
+def test_unanimous_samples_stop_early(fake_llm):
+    # one candidate word in the prompt: every fake sample agrees
+    guess, votes = ai.generate_guess_votes("m", "apple", attempts=5, agreement=0.6,
+                                           cache=False)
+    assert guess == "apple" and votes == {"apple": 3}
+    (messages, n, returned), = fake_llm.calls
+    assert (n, returned) == (5, 3)   # one request, stopped at ceil(0.6 * 5)
+
+
+def test_no_majority_draws_every_sample(fake_llm):
+    prompt = "apple pear plum fig kiwi lime date"
+    guess, votes = ai.generate_guess_votes("m", prompt, attempts=5, agreement=1.0,
+                                           cache=False)
+    (_, n, returned), = fake_llm.calls
+    assert returned == 5 and sum(votes.values()) == 5
+    assert max(votes.values()) < 5
+    assert guess == next(iter(votes)) and guess in prompt.split()
+
+
+@pytest.mark.parametrize("attempts", [1, 3])
+def test_samples_come_from_one_request(fake_llm, attempts):
+    ai.generate_guess_votes("m", "apple pear", attempts=attempts, agreement=1.0,
+                            cache=False)
+    assert [n for _, n, _ in fake_llm.calls] == [attempts]
+
+
+def test_tally_normalizes_and_ranks():
+    assert ai.tally_votes(["Pear.", "apple", " pear!", "", "42"]) == {"pear": 2, "apple": 1}
@@ -0,0 +1,50 @@
+import queue
+
+import pytest
+
+import worker
+
+
+@pytest.fixture
+def failing_turns(app, monkeypatch):
+    """Every turn raises; returns the list of game ids attempted."""
+    monkeypatch.setattr(worker, "TURN_RETRY_BACKOFF", 0.05)
+    monkeypatch.setattr(worker, "TURN_RETRY_BACKOFF_MAX", 0.2)
+    monkeypatch.setattr(worker, "_failures", {})
+    attempts = []
+
+    def fail(app, game_id):
+        attempts.append(game_id)
+        raise RuntimeError("LLM down")
+
+    monkeypatch.setattr(worker, "process_turn", fail)
+    return attempts
+
+
+def drain(app, timeout=1.0):
+    """Run queued jobs until nothing is enqueued for `timeout` seconds."""
+    while True:
+        try:
+            game_id = worker._queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+        worker._run_job(app, game_id)
+
+
+def test_failed_turn_is_retried_with_backoff_then_given_up(app, failing_turns):
+    worker.enqueue_turn("g1")
+    drain(app, timeout=0.5)
+    assert failing_turns == ["g1"] * (worker.TURN_RETRIES + 1)
+    assert worker._failures["g1"][0] == worker.TURN_RETRIES + 1
+
+
+def test_success_clears_the_failures(app, failing_turns, monkeypatch):
+    worker.enqueue_turn("g2")
+    worker._run_job(app, worker._queue.get(timeout=1))
+    assert worker._failures["g2"][0] == 1
+    assert worker.backing_off("g2")   # the external scanner holds off too
+
+    monkeypatch.setattr(worker, "process_turn", lambda app, game_id: None)
+    drain(app, timeout=0.5)   # the scheduled retry
+    assert "g2" not in worker._failures
+    assert not worker.backing_off("g2")
@@ -1,25 +1,71 @@
 import re
-import requests
-import datetime as dt
+import zlib
+import functools
+
+try:  # optional: zstd for streamed downloads
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import dictionary
+from config import DICTIONARY_REMOTE_FALLBACK, DICTIONARY_REMOTE_CACHE_SIZE
 
 GUESS_RE = re.compile(r"\[\[guess:\s*([a-zA-Z]{2,})\s*]]", re.I)
 
 
+@functools.lru_cache(maxsize=DICTIONARY_REMOTE_CACHE_SIZE)
+def _remote_lookup(word: str) -> bool:
+    # Network errors propagate, so they are never cached
+    import requests  # only needed with DICTIONARY_REMOTE_FALLBACK
+    r = requests.get(
+        f"https://api.dictionaryapi.dev/api/v2/entries/en/{word}", timeout=4
+    )
+    return r.status_code == 200
+
+
 def is_valid_word(word: str) -> bool:
-    if not hasattr(is_valid_word, "_cache"):
-        is_valid_word._cache = {}
-    cache = is_valid_word._cache
     word = word.lower()
-    now = dt.datetime.utcnow().timestamp()
-    if (cached := cache.get(word)) and now - cached[1] < 60:
-        return cached[0]
+    if dictionary.contains(word):
+        return True
+    if not DICTIONARY_REMOTE_FALLBACK:
+        return False
 
+    import requests
     try:
-        r = requests.get(
-            f"https://api.dictionaryapi.dev/api/v2/entries/en/{word}", timeout=4
-        )
-        ok = r.status_code == 200
+        return _remote_lookup(word)
     except requests.RequestException:
-        ok = False
-    cache[word] = (ok, now)
-    return ok
+        return False
+
+
+STREAM_ENCODINGS = ("zstd", "gzip") if zstandard else ("gzip",)
+
+
+def pick_encoding(accept_encodings) -> str | None:
+    """Best of STREAM_ENCODINGS the client accepts (werkzeug MIMEAccept-like)."""
+    best = accept_encodings.best_match(STREAM_ENCODINGS)
+    return best if best and accept_encodings[best] > 0 else None
+
+
+def compress_chunks(chunks, encoding: str | None):
+    """Incrementally compress an iterable of bytes; one flush per chunk so the
+    client gets data as rows are produced."""
+    if encoding is None:
+        yield from chunks
+        return
+
+    if encoding == "gzip":
+        z = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            out = z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+            if out:
+                yield out
+        yield z.flush()
+    elif encoding == "zstd":
+        z = zstandard.ZstdCompressor().compressobj()
+        for chunk in chunks:
+            out = z.compress(chunk) + z.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if out:
+                yield out
+        yield z.flush()
+    else:
+        raise ValueError(f"Unsupported encoding: {encoding}")
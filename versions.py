@@ -0,0 +1,122 @@
+"""
+Per-game version counters for the `/poll` fast path.
+
+A game's version is (last message id, status, turns).  Writers bump it right
+after they commit (via events.publish_update), so `/poll` can tell from the
+cache whether a client looks up to date and answer 304 without a query.
+Entries are process-local; when other processes write games too
+(CROSS_PROCESS), the change feed drops the games they changed
+(changefeed.py).  Entries expire after POLL_VERSION_TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from config import POLL_VERSION_TTL, POLL_VERSION_CACHE_SIZE
+
+
+@dataclass
+class GameVersion:
+    last_id: int
+    status: str
+    turns: int
+    stamp: float
+
+    @property
+    def etag(self) -> str:
+        return f"{self.last_id}-{self.status}-{self.turns}"
+
+
+class GameVersions:
+    def __init__(self, ttl: float = POLL_VERSION_TTL,
+                 maxsize: int = POLL_VERSION_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, GameVersion] = OrderedDict()
+        self._writes = 0   # bumps so far, any game
+
+    def get(self, game_id: str):
+        with self._lock:
+            v = self._entries.get(game_id)
+            if v is None:
+                return None
+            if time.monotonic() - v.stamp > self.ttl:
+                del self._entries[game_id]
+                return None
+            return v
+
+    def _store(self, game_id: str, last_id: int, status: str, turns: int) -> GameVersion:
+        v = GameVersion(last_id, status, turns, time.monotonic())
+        self._entries[game_id] = v
+        self._entries.move_to_end(game_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return v
+
+    def begin_read(self) -> int:
+        """Token to pass to `prime` once the DB read is done."""
+        with self._lock:
+            return self._writes
+
+    def prime(self, token: int, game_id: str, last_id: int, status: str,
+              turns: int) -> GameVersion:
+        """Record state read from the DB, unless a writer bumped anything in
+        the meantime (the read might then be older than the cache)."""
+        with self._lock:
+            if token != self._writes:
+                return GameVersion(last_id, status, turns, 0.0)
+            return self._store(game_id, last_id, status, turns)
+
+    def bump(self, game_id: str, status: str, turns: int, last_id=None) -> None:
+        """Writer-side update after a commit.  Without a message id we can only
+        update an entry we already know the last id for."""
+        with self._lock:
+            self._writes += 1
+            v = self._entries.get(game_id)
+            if last_id is None:
+                if v is not None:
+                    v.status, v.turns = status, turns
+                    v.stamp = time.monotonic()
+                return
+            if v is not None and v.last_id > last_id:
+                last_id = v.last_id
+            self._store(game_id, last_id, status, turns)
+
+    def not_modified(self, game_id: str, after_id: int, if_none_match, status=None):
+        """The current version if the client is already up to date, else None.
+        Clients without an ETag must send the `status` they have, so a status
+        change without a new message (player 2 joining, MAX_TURNS) is seen."""
+        v = self.get(game_id)
+        if v is None:
+            return None
+        if if_none_match:
+            fresh = if_none_match.strip('"') == v.etag
+        else:
+            fresh = after_id == v.last_id and status == v.status
+        return v if fresh else None
+
+    def invalidate(self, game_id: str) -> None:
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+
+def read_version(game_id: str):
+    """(last message id, status, turns) straight from the DB: the game row by
+    primary key plus max(msg.id) from the (game_id, id) index."""
+    from sqlalchemy import func, select
+    from db import db
+    from models import Game, Msg
+
+    last_id = (select(func.max(Msg.id)).where(Msg.game_id == game_id)
+               .scalar_subquery())
+    row = db.session.execute(
+        select(Game.status, Game.turns, last_id).where(Game.id == game_id)).first()
+    if row is None:
+        return None
+    status, turns, last = row
+    return (last or 0, status.value if status else None, turns)
+
+
+game_versions = GameVersions()
@@ -0,0 +1,165 @@
+"""
+Background turn workers.
+
+`/g/<game_id>/send` only records the player's message and enqueues the game
+id; the LLM turn runs here and clients pick the result up through `/poll`.
+
+Two ways of running them:
+  * in-process threads, started by `start_workers(app)` (TURN_WORKER_MODE=thread)
+  * a separate process, `python worker.py` (TURN_WORKER_MODE=external), which
+    scans the DB for games that have unused messages from both players.
+
+A turn that raises is enqueued again after a bounded exponential backoff
+(TURN_RETRIES, TURN_RETRY_BACKOFF, TURN_RETRY_BACKOFF_MAX).
+"""
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import func
+
+from config import (TURN_WORKERS, TURN_WORKER_POLL_INTERVAL, SPECULATIVE_NOTES,
+                    TURN_RETRIES, TURN_RETRY_BACKOFF, TURN_RETRY_BACKOFF_MAX)
+from db import db
+from models import Game, Msg, GameStatus
+from logic import run_turn
+from llm_backends import get_backend
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_queue: "queue.Queue[str]" = queue.Queue()
+_lock = threading.Lock()
+_queued: set[str] = set()    # waiting in _queue
+_running: set[str] = set()   # a worker is inside run_turn for it
+_rerun: set[str] = set()     # enqueued again while running
+_failures: dict[str, tuple[int, float]] = {}   # failed turns in a row, retry time
+_threads: list[threading.Thread] = []
+
+
+def enqueue_turn(game_id: str) -> None:
+    """Schedule a turn for `game_id`.  At most one job per game is queued or
+    running at a time; a request that arrives mid-turn re-runs it after."""
+    with _lock:
+        if game_id in _running:
+            _rerun.add(game_id)
+            return
+        if game_id in _queued:
+            return
+        _queued.add(game_id)
+    _queue.put(game_id)
+
+
+def queue_depth() -> int:
+    return _queue.qsize()
+
+
+def process_turn(app, game_id: str) -> None:
+    with app.app_context():
+        game = db.session.get(Game, game_id)
+        if game is None:
+            logger.warning(f"[worker] Unknown game {game_id}")
+            return
+        run_turn(game, speculate=SPECULATIVE_NOTES)
+
+
+def backing_off(game_id: str) -> bool:
+    """True while a failed turn for `game_id` waits for its retry."""
+    with _lock:
+        failure = _failures.get(game_id)
+    return failure is not None and time.monotonic() < failure[1]
+
+
+def _turn_failed(game_id: str) -> None:
+    with _lock:
+        count = _failures.get(game_id, (0, 0.0))[0] + 1
+        if count > TURN_RETRIES:
+            delay = TURN_RETRY_BACKOFF_MAX
+        else:
+            delay = min(TURN_RETRY_BACKOFF * 2 ** (count - 1), TURN_RETRY_BACKOFF_MAX)
+        _failures[game_id] = (count, time.monotonic() + delay)
+    if count > TURN_RETRIES:
+        metrics.turn_failures.inc(action="gave_up")
+        logger.error(f"[worker] Giving up on game {game_id} after {count} failed turns")
+        return
+    metrics.turn_failures.inc(action="retried")
+    logger.warning(f"[worker] Retrying game {game_id} in {delay:.1f}s ({count}/{TURN_RETRIES})")
+    timer = threading.Timer(delay, enqueue_turn, args=(game_id,))
+    timer.daemon = True
+    timer.start()
+
+
+def _run_job(app, game_id: str) -> None:
+    with _lock:
+        _queued.discard(game_id)
+        _running.add(game_id)
+    failed = False
+    try:
+        process_turn(app, game_id)
+    except Exception:
+        failed = True
+        logger.exception(f"[worker] Turn failed for game {game_id}")
+    finally:
+        with _lock:
+            _running.discard(game_id)
+            again = game_id in _rerun
+            _rerun.discard(game_id)
+            if not failed:
+                _failures.pop(game_id, None)
+        _queue.task_done()
+    if failed:
+        _turn_failed(game_id)   # schedules the retry, if any
+    elif again:
+        enqueue_turn(game_id)
+
+
+def _worker_loop(app) -> None:
+    while True:
+        _run_job(app, _queue.get())
+
+
+def start_workers(app, count: int = TURN_WORKERS) -> None:
+    """Start `count` daemon turn workers (idempotent)."""
+    if _threads:
+        return
+    for i in range(count):
+        t = threading.Thread(target=_worker_loop, args=(app,),
+                             name=f"turn-worker-{i}", daemon=True)
+        t.start()
+        _threads.append(t)
+    logger.info(f"[worker] Started {count} turn workers")
+
+
+def ready_game_ids(min_senders: int = 2) -> list[str]:
+    """Games in play with unused messages from at least `min_senders`
+    players (1 also picks up games worth speculating on)."""
+    rows = (db.session.query(Msg.game_id)
+            .join(Game, Game.id == Msg.game_id)
+            .filter(Msg.role == "Player",
+                    Msg.used.is_(False),
+                    Game.status.in_([GameStatus.PLAY, GameStatus.PARTIAL]))
+            .group_by(Msg.game_id)
+            .having(func.count(func.distinct(Msg.sender)) >= min_senders)
+            .all())
+    return [r[0] for r in rows]
+
+
+def run_forever(app, interval: float = TURN_WORKER_POLL_INTERVAL) -> None:
+    """Standalone worker process loop (TURN_WORKER_MODE=external)."""
+    get_backend()   # a missing API key fails here, not on the first turn
+    start_workers(app)
+    logger.info("[worker] Scanning for ready turns")
+    while True:
+        with app.app_context():
+            ids = ready_game_ids(1 if SPECULATIVE_NOTES else 2)
+        for game_id in ids:
+            if not backing_off(game_id):
+                enqueue_turn(game_id)
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    from app import create_app
+    # run_forever starts the workers itself; no compactor in worker processes
+    run_forever(create_app({"BACKGROUND_THREADS": False}))